@@ -0,0 +1,388 @@
+"""
+Measures the throughput and the latency of the read and write endpoints. A separate database is created and seeded
+with the given numbers of services, settings per service and history entries per setting, then the requests are
+made to the application in the same process (through the ASGI transport of httpx) and to a uvicorn server started
+as a separate process. The results are written to a JSON file, the results of a previous run (of another commit) may
+be given to print the difference.
+
+Usage (from the root of the project, the database settings are taken from the environment or the .env file):
+    PYTHONPATH=src:. python benchmarks/bench_endpoints.py --services 50 --settings 100 --history 10 \\
+        --requests 2000 --concurrency 20 --output results.json --baseline previous-results.json
+"""
+import asyncio
+import datetime
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+import typing as t
+from contextlib import asynccontextmanager
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+import click
+import httpx
+from httpx import AsyncClient
+
+from runtime_config.config import Config, get_config
+from runtime_config.lib.db import close_db, init_db
+from runtime_config.lib.db_utils import apply_migrations, create_db, drop_db
+from runtime_config.main import app_factory
+from tests.db_utils import create_setting_history, create_settings
+
+ASGI_TARGET = 'asgi'
+UVICORN_TARGET = 'uvicorn'
+
+Call = t.Callable[[AsyncClient, int], t.Awaitable[httpx.Response]]
+
+
+@dataclass
+class SeedData:
+    service_names: list[str] = field(default_factory=list)
+    setting_ids: list[int] = field(default_factory=list)
+
+
+@dataclass(frozen=True)
+class Scenario:
+    # the endpoint is identified by its route template, so that the results of different runs can be matched
+    name: str
+    call: Call
+
+
+@dataclass(frozen=True)
+class Result:
+    target: str
+    scenario: str
+    requests: int
+    errors: int
+    rps: float
+    mean_ms: float
+    p50_ms: float
+    p99_ms: float
+
+
+def _generate_setting(service_name: str, number: int) -> dict[str, t.Any]:
+    if number % 2:
+        return {
+            'name': f'setting_{number}',
+            'value': '{"key": "value", "items": [1, 2, 3]}',
+            'value_type': 'json',
+            'service_name': service_name,
+        }
+    return {'name': f'setting_{number}', 'value': str(number), 'value_type': 'int', 'service_name': service_name}
+
+
+async def seed(config: Config, services: int, settings: int, history: int) -> SeedData:
+    seed_data = SeedData()
+    now = datetime.datetime.now()
+    db = await init_db(dsn=config.db_dsn)
+    try:
+        async with db.acquire() as conn:
+            for service_number in range(services):
+                service_name = f'bench-service-{service_number}'
+                created = await create_settings(
+                    conn, [_generate_setting(service_name, number) for number in range(settings)]
+                )
+                seed_data.service_names.append(service_name)
+                seed_data.setting_ids.extend(setting['id'] for setting in created)
+                if history and created:
+                    await create_setting_history(
+                        conn,
+                        [
+                            {
+                                'name': setting['name'],
+                                'value': setting['value'],
+                                'value_type': setting['value_type'],
+                                'is_disabled': False,
+                                'service_name': service_name,
+                                'created_by_db_user': 'bench',
+                                'updated_at': now - datetime.timedelta(hours=version),
+                            }
+                            for setting in created
+                            for version in range(1, history + 1)
+                        ],
+                    )
+    finally:
+        await close_db()
+    return seed_data
+
+
+def build_scenarios(seed_data: SeedData, target: str) -> list[Scenario]:
+    rng = random.Random(0)
+    # the settings created by the create scenario are deleted by the delete scenario
+    created_ids: list[int] = []
+
+    async def get_service_settings(client: AsyncClient, number: int) -> httpx.Response:
+        return await client.get(f'/get_settings/{rng.choice(seed_data.service_names)}')
+
+    async def search_settings(client: AsyncClient, number: int) -> httpx.Response:
+        return await client.get(
+            '/setting/search', params={'service_name': rng.choice(seed_data.service_names), 'name': 'setting_1'}
+        )
+
+    async def get_setting_with_history(client: AsyncClient, number: int) -> httpx.Response:
+        return await client.get(
+            f'/setting/get/{rng.choice(seed_data.setting_ids)}', params={'include_history': 'true'}
+        )
+
+    async def create_setting(client: AsyncClient, number: int) -> httpx.Response:
+        resp = await client.post(
+            '/setting/create',
+            json={
+                'name': f'{target}_created_{number}',
+                'value': str(number),
+                'value_type': 'int',
+                'service_name': rng.choice(seed_data.service_names),
+            },
+        )
+        if resp.status_code == 200:
+            created_ids.append(resp.json()['id'])
+        return resp
+
+    async def edit_setting(client: AsyncClient, number: int) -> httpx.Response:
+        return await client.post('/setting/edit', json={'id': rng.choice(seed_data.setting_ids), 'value': str(number)})
+
+    async def delete_setting(client: AsyncClient, number: int) -> httpx.Response:
+        # the missing setting makes the request fail if the setting has not been created
+        return await client.get(f'/setting/delete/{created_ids.pop() if created_ids else 0}')
+
+    return [
+        Scenario('GET /get_settings/{service_name}', get_service_settings),
+        Scenario('GET /setting/search', search_settings),
+        Scenario('GET /setting/get/{setting_id}?include_history=true', get_setting_with_history),
+        Scenario('POST /setting/create', create_setting),
+        Scenario('POST /setting/edit', edit_setting),
+        Scenario('GET /setting/delete/{setting_id}', delete_setting),
+    ]
+
+
+async def measure(client: AsyncClient, scenario: Scenario, requests: int, concurrency: int) -> tuple[int, list[float]]:
+    """
+    Makes the requests by the given number of concurrent clients, returns the number of failed requests and the
+    latencies of all requests in seconds
+    """
+    numbers = iter(range(requests))
+    latencies: list[float] = []
+    errors = 0
+
+    async def run_client() -> None:
+        nonlocal errors
+        # the iterator is shared, so each number is taken by one of the clients
+        for number in numbers:
+            started_at = time.perf_counter()
+            resp = await scenario.call(client, number)
+            latencies.append(time.perf_counter() - started_at)
+            if resp.status_code >= 400:
+                errors += 1
+
+    await asyncio.gather(*(run_client() for _ in range(concurrency)))
+    return errors, latencies
+
+
+async def run_scenarios(
+    client: AsyncClient, target: str, scenarios: list[Scenario], requests: int, concurrency: int, warmup: int
+) -> list[Result]:
+    results = []
+    # the numbers of the warmup requests follow the measured ones, so the created settings do not clash
+    for scenario in scenarios:
+        await measure(client, Scenario(scenario.name, _shift(scenario.call, requests)), warmup, concurrency)
+        started_at = time.perf_counter()
+        errors, latencies = await measure(client, scenario, requests, concurrency)
+        elapsed = time.perf_counter() - started_at
+        percentiles = statistics.quantiles(latencies, n=100, method='inclusive')
+        results.append(
+            Result(
+                target=target,
+                scenario=scenario.name,
+                requests=requests,
+                errors=errors,
+                rps=requests / elapsed,
+                mean_ms=statistics.fmean(latencies) * 1000,
+                p50_ms=percentiles[49] * 1000,
+                p99_ms=percentiles[98] * 1000,
+            )
+        )
+        click.echo(_format_result(results[-1]), err=True)
+    return results
+
+
+def _shift(call: Call, offset: int) -> Call:
+    return lambda client, number: call(client, number + offset)
+
+
+@asynccontextmanager
+async def asgi_client() -> t.AsyncIterator[AsyncClient]:
+    app = app_factory()
+    await app.router.startup()
+    try:
+        async with AsyncClient(app=app, base_url='http://bench') as client:
+            yield client
+    finally:
+        await app.router.shutdown()
+
+
+@asynccontextmanager
+async def uvicorn_client(
+    config: Config, port: int, workers: int, concurrency: int, start_timeout: float = 30
+) -> t.AsyncIterator[AsyncClient]:
+    command = [sys.executable, '-m', 'runtime_config.cli', 'serve', '--host', '127.0.0.1', '--port', str(port)]
+    command += ['--access_log', 'false', '--workers', str(workers)]
+    server = subprocess.Popen(command, env={**os.environ, 'DB_NAME': config.db_name}, stdout=subprocess.DEVNULL)
+    try:
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        async with AsyncClient(base_url=f'http://127.0.0.1:{port}', limits=limits) as client:
+            deadline = time.monotonic() + start_timeout
+            while True:
+                try:
+                    if (await client.get('/health-check')).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                if server.poll() is not None or time.monotonic() > deadline:
+                    raise click.ClickException('The uvicorn server has not started')
+                await asyncio.sleep(0.2)
+
+            yield client
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def _format_result(result: Result) -> str:
+    return (
+        f'{result.target:<9}{result.scenario:<52}{result.rps:>9.0f} req/s  p50 {result.p50_ms:>7.2f} ms  '
+        f'p99 {result.p99_ms:>7.2f} ms  errors {result.errors}'
+    )
+
+
+def _get_commit(project_dir: Path) -> str | None:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=project_dir, capture_output=True, check=True, text=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: list[Result], baseline: dict[str, t.Any]) -> None:
+    baseline_results = {(result['target'], result['scenario']): result for result in baseline['results']}
+    click.echo(f'Compared with {baseline.get("commit") or "the baseline"}:')
+    for result in results:
+        previous = baseline_results.get((result.target, result.scenario))
+        if previous is None:
+            continue
+        click.echo(
+            f'{result.target:<9}{result.scenario:<52}'
+            f'rps {(result.rps / previous["rps"] - 1) * 100:>+7.1f}%  '
+            f'p50 {(result.p50_ms / previous["p50_ms"] - 1) * 100:>+7.1f}%  '
+            f'p99 {(result.p99_ms / previous["p99_ms"] - 1) * 100:>+7.1f}%'
+        )
+
+
+async def run(
+    config: Config,
+    targets: t.Sequence[str],
+    seed_data: SeedData,
+    requests: int,
+    concurrency: int,
+    warmup: int,
+    port: int,
+    workers: int,
+) -> list[Result]:
+    results = []
+    for target in targets:
+        scenarios = build_scenarios(seed_data, target)
+        if target == ASGI_TARGET:
+            async with asgi_client() as client:
+                results += await run_scenarios(client, target, scenarios, requests, concurrency, warmup)
+        else:
+            async with uvicorn_client(config, port=port, workers=workers, concurrency=concurrency) as client:
+                results += await run_scenarios(client, target, scenarios, requests, concurrency, warmup)
+    return results
+
+
+@click.command()
+@click.option('--services', default=20, help='Number of the seeded services')
+@click.option('--settings', default=100, help='Number of the seeded settings of each service')
+@click.option('--history', default=5, help='Number of the seeded history entries of each setting')
+@click.option(
+    '--requests', default=1000, type=click.IntRange(min=2), help='Number of the measured requests to each endpoint'
+)
+@click.option('--concurrency', default=10, help='Number of the concurrent clients')
+@click.option('--warmup', default=50, help='Number of the requests to each endpoint made before measuring')
+@click.option(
+    '--target',
+    'targets',
+    multiple=True,
+    type=click.Choice([ASGI_TARGET, UVICORN_TARGET]),
+    default=[ASGI_TARGET, UVICORN_TARGET],
+)
+@click.option('--port', default=8765, help='Port of the uvicorn server')
+@click.option('--workers', default=1, help='Number of the uvicorn workers')
+@click.option('--output', default='benchmark-results.json', type=click.Path(dir_okay=False, writable=True))
+@click.option('--baseline', default=None, type=click.File(), help='Results of a previous run to compare with')
+@click.option('--keep-db', default=False, is_flag=True, help='Do not drop the seeded database')
+def main(
+    services: int,
+    settings: int,
+    history: int,
+    requests: int,
+    concurrency: int,
+    warmup: int,
+    targets: tuple[str, ...],
+    port: int,
+    workers: int,
+    output: str,
+    baseline: t.TextIO | None,
+    keep_db: bool,
+) -> None:
+    config = get_config()
+    config.db_name = f'{config.db_name}_bench'
+    server_dsn = str(config.db_dsn).replace(config.db_name, 'postgres')
+    create_db(dsn=server_dsn, db_name=config.db_name)
+    try:
+        apply_migrations(config.project_dir)
+        seed_data = asyncio.run(seed(config, services=services, settings=settings, history=history))
+        results = asyncio.run(
+            run(
+                config,
+                targets=targets,
+                seed_data=seed_data,
+                requests=requests,
+                concurrency=concurrency,
+                warmup=warmup,
+                port=port,
+                workers=workers,
+            )
+        )
+    finally:
+        if not keep_db:
+            drop_db(dsn=server_dsn, db_name=config.db_name)
+
+    report = {
+        'commit': _get_commit(config.project_dir),
+        'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'parameters': {
+            'services': services,
+            'settings': settings,
+            'history': history,
+            'requests': requests,
+            'concurrency': concurrency,
+            'warmup': warmup,
+            'workers': workers,
+        },
+        'results': [asdict(result) for result in results],
+    }
+    with open(output, 'w') as file:
+        json.dump(report, file, indent=2)
+    click.echo(f'Results written to {output}')
+
+    if baseline is not None:
+        compare(results, json.load(baseline))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Compares the throughput of GET /get_settings/{service_name} when the settings are serialized on every request (the
+way the endpoint worked before the pre-serialized snapshots) and when the pre-encoded body of the cached snapshot is
+returned. The database is not used, the settings are generated and put into the cache in advance.
+
+Usage:
+    python benchmarks/bench_get_service_settings.py --settings 300 --requests 2000
+"""
+import asyncio
+import datetime
+import time
+import typing as t
+
+import click
+from fastapi import APIRouter, FastAPI
+from httpx import AsyncClient
+
+from runtime_config.enums.settings import ValueType
+from runtime_config.lib.db import get_db_conn_acquirer
+from runtime_config.main import app_factory
+from runtime_config.repositories.db.entities import SettingData
+from runtime_config.services.settings_cache import (
+    ServiceSettingsSnapshot,
+    get_settings_cache,
+)
+from runtime_config.web.entities import GetServiceSettingsLegacyResponse
+
+SERVICE_NAME = 'bench-service'
+
+
+def generate_settings(count: int) -> list[SettingData]:
+    return [
+        SettingData(
+            id=i,
+            name=f'setting_{i}',
+            value='{"key": "value", "items": [1, 2, 3]}' if i % 2 else str(i),
+            value_type=ValueType.json if i % 2 else ValueType.int,
+            is_disabled=False,
+            service_name=SERVICE_NAME,
+            created_by_db_user='admin',
+            updated_at=datetime.datetime.now(),
+        )
+        for i in range(count)
+    ]
+
+
+def per_request_serialization_app(settings: list[SettingData]) -> FastAPI:
+    router = APIRouter()
+
+    @router.get('/get_settings/{service_name}', response_model=list[GetServiceSettingsLegacyResponse])
+    async def get_service_settings(service_name: str) -> list[dict[str, t.Any]]:
+        def rename_fields(setting_data: SettingData) -> dict[str, t.Any]:
+            data = setting_data.dict()
+            data['disable'] = data.pop('is_disabled')
+            return data
+
+        return [rename_fields(setting) for setting in settings]
+
+    app = FastAPI()
+    app.include_router(router)
+    return app
+
+
+def pre_serialized_app(settings: list[SettingData]) -> FastAPI:
+    def acquire_db_conn() -> t.NoReturn:
+        raise RuntimeError('The settings must be served from the cache')
+
+    app = app_factory(app_hooks=lambda *args, **kwargs: None)
+    app.dependency_overrides[get_db_conn_acquirer] = lambda: acquire_db_conn
+    get_settings_cache().set(
+        SERVICE_NAME, ServiceSettingsSnapshot.create(service_name=SERVICE_NAME, settings=settings)
+    )
+    return app
+
+
+async def measure(app: FastAPI, requests: int, headers: dict[str, str]) -> float:
+    async with AsyncClient(app=app, base_url='http://bench') as client:
+        url = f'/get_settings/{SERVICE_NAME}'
+        assert (await client.get(url, headers=headers)).status_code == 200
+
+        started_at = time.perf_counter()
+        for _ in range(requests):
+            await client.get(url, headers=headers)
+        return requests / (time.perf_counter() - started_at)
+
+
+@click.command()
+@click.option('--settings', 'settings_count', default=300)
+@click.option('--requests', default=2000)
+def main(settings_count: int, requests: int) -> None:
+    settings = generate_settings(settings_count)
+    identity = {'Accept-Encoding': 'identity'}
+    results = {
+        'per-request serialization': asyncio.run(measure(per_request_serialization_app(settings), requests, identity)),
+        'pre-serialized json': asyncio.run(measure(pre_serialized_app(settings), requests, identity)),
+        'pre-serialized gzip': asyncio.run(
+            measure(pre_serialized_app(settings), requests, {'Accept-Encoding': 'gzip'})
+        ),
+    }
+
+    click.echo(f'{settings_count} settings per service, {requests} requests')
+    for name, rps in results.items():
+        click.echo(f'{name:<28}{rps:>10.0f} req/s')
+
+
+if __name__ == '__main__':
+    main()
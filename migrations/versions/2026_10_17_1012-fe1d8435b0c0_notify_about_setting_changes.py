@@ -0,0 +1,64 @@
+"""notify_about_setting_changes
+
+Revision ID: fe1d8435b0c0
+Revises: 54e01496163a
+Create Date: 2026-10-17 10:12:41.209318
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'fe1d8435b0c0'
+down_revision = '54e01496163a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute(trigger_notify_setting_changed)
+
+
+def downgrade() -> None:
+    op.execute(
+        """
+        DROP TRIGGER trigger_notify_setting_truncated ON setting;
+        DROP TRIGGER trigger_notify_setting_changed ON setting;
+        DROP FUNCTION notify_setting_changed;
+        """
+    )
+
+
+# The payload of the notification is the name of the service whose settings have changed. An empty payload means
+# that the settings of all services have changed.
+trigger_notify_setting_changed = """
+    CREATE FUNCTION notify_setting_changed() RETURNS trigger AS
+    $$
+    BEGIN
+        IF TG_OP = 'TRUNCATE' THEN
+            PERFORM pg_notify('setting_changed', '');
+            RETURN NULL;
+        END IF;
+
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            PERFORM pg_notify('setting_changed', OLD.service_name);
+        END IF;
+
+        IF TG_OP = 'INSERT' OR (TG_OP = 'UPDATE' AND NEW.service_name <> OLD.service_name) THEN
+            PERFORM pg_notify('setting_changed', NEW.service_name);
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE 'plpgsql';
+
+    CREATE TRIGGER trigger_notify_setting_changed
+        AFTER INSERT OR UPDATE OR DELETE
+        ON setting
+        FOR EACH ROW
+    EXECUTE PROCEDURE notify_setting_changed();
+
+    CREATE TRIGGER trigger_notify_setting_truncated
+        AFTER TRUNCATE
+        ON setting
+        FOR EACH STATEMENT
+    EXECUTE PROCEDURE notify_setting_changed();
+"""
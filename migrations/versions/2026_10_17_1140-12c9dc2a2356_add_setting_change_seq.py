@@ -0,0 +1,91 @@
+"""add_setting_change_seq
+
+Revision ID: 12c9dc2a2356
+Revises: fe1d8435b0c0
+Create Date: 2026-10-17 11:40:03.518226
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '12c9dc2a2356'
+down_revision = 'fe1d8435b0c0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # The numbers are taken from one sequence, so the changes of the settings and the history entries (including
+    # the deletion entries) are ordered relative to each other. The existing rows are numbered by the default value.
+    op.execute('CREATE SEQUENCE setting_change_seq AS bigint;')
+    op.add_column(
+        'setting',
+        sa.Column(
+            'change_seq', sa.BigInteger(), server_default=sa.text("nextval('setting_change_seq')"), nullable=False
+        ),
+    )
+    op.add_column(
+        'setting_history',
+        sa.Column(
+            'change_seq', sa.BigInteger(), server_default=sa.text("nextval('setting_change_seq')"), nullable=False
+        ),
+    )
+    op.create_index('setting_service_name_change_seq_idx', 'setting', ['service_name', 'change_seq'])
+    op.create_index('setting_history_service_name_change_seq_idx', 'setting_history', ['service_name', 'change_seq'])
+
+    op.execute('DROP TRIGGER trigger_fill_user_in_setting_row ON setting;')
+    op.execute('DROP FUNCTION fill_user_in_setting_row;')
+    op.execute(upgrade_trigger_fill_user_in_setting_row)
+
+
+def downgrade() -> None:
+    op.execute('DROP TRIGGER trigger_fill_user_in_setting_row ON setting;')
+    op.execute('DROP FUNCTION fill_user_in_setting_row;')
+    op.execute(downgrade_trigger_fill_user_in_setting_row)
+
+    op.drop_index('setting_history_service_name_change_seq_idx', 'setting_history')
+    op.drop_index('setting_service_name_change_seq_idx', 'setting')
+    op.drop_column('setting_history', 'change_seq')
+    op.drop_column('setting', 'change_seq')
+    op.execute('DROP SEQUENCE setting_change_seq;')
+
+
+upgrade_trigger_fill_user_in_setting_row = """
+    CREATE FUNCTION fill_user_in_setting_row() RETURNS trigger AS
+    $$
+    BEGIN
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            NEW.created_by_db_user = session_user;
+            NEW.updated_at = current_timestamp;
+            NEW.change_seq = nextval('setting_change_seq');
+        END IF;
+        RETURN NEW;
+    END;
+    $$ LANGUAGE 'plpgsql' SECURITY DEFINER;
+
+    CREATE TRIGGER trigger_fill_user_in_setting_row
+        BEFORE INSERT OR UPDATE
+        ON setting
+        FOR EACH ROW
+    EXECUTE PROCEDURE fill_user_in_setting_row();
+"""
+
+downgrade_trigger_fill_user_in_setting_row = """
+    CREATE FUNCTION fill_user_in_setting_row() RETURNS trigger AS
+    $$
+    BEGIN
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            NEW.created_by_db_user = session_user;
+            NEW.updated_at = current_timestamp;
+        END IF;
+        RETURN NEW;
+    END;
+    $$ LANGUAGE 'plpgsql' SECURITY DEFINER;
+
+    CREATE TRIGGER trigger_fill_user_in_setting_row
+        BEFORE INSERT OR UPDATE
+        ON setting
+        FOR EACH ROW
+    EXECUTE PROCEDURE fill_user_in_setting_row();
+"""
@@ -0,0 +1,36 @@
+"""add_setting_name_search_indexes
+
+Revision ID: 96061a8b8aea
+Revises: 12c9dc2a2356
+Create Date: 2026-10-17 13:00:12.402117
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '96061a8b8aea'
+down_revision = '12c9dc2a2356'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # the unique constraint (name, service_name) already serves the exact search by name,
+    # text_pattern_ops allows the prefix search to use the index regardless of the collation of the database
+    op.create_index('setting_name_pattern_idx', 'setting', [sa.text('name text_pattern_ops')])
+
+    # the substring search uses the trigram index, the pg_trgm extension is not shipped with every build of
+    # PostgreSQL, without it the substring search keeps scanning the table
+    conn = op.get_bind()
+    if conn.execute(sa.text(is_pg_trgm_available)).scalar():
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm;')
+        op.execute('CREATE INDEX setting_name_trgm_idx ON setting USING gin (name gin_trgm_ops);')
+
+
+def downgrade() -> None:
+    op.execute('DROP INDEX IF EXISTS setting_name_trgm_idx;')
+    op.drop_index('setting_name_pattern_idx', 'setting')
+
+
+is_pg_trgm_available = "SELECT EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm');"
@@ -0,0 +1,23 @@
+"""add_setting_keyset_index
+
+Revision ID: 45916fa2274f
+Revises: 96061a8b8aea
+Create Date: 2026-10-17 14:00:37.815530
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '45916fa2274f'
+down_revision = '96061a8b8aea'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # the order of the pages of the settings, the next page is found by the index at the key of the previous one
+    op.create_index('setting_service_name_name_id_idx', 'setting', ['service_name', 'name', 'id'])
+
+
+def downgrade() -> None:
+    op.drop_index('setting_service_name_name_id_idx', 'setting')
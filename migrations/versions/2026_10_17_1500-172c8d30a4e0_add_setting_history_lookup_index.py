@@ -0,0 +1,28 @@
+"""add_setting_history_lookup_index
+
+Revision ID: 172c8d30a4e0
+Revises: 45916fa2274f
+Create Date: 2026-10-17 15:00:54.120349
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '172c8d30a4e0'
+down_revision = '45916fa2274f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # the change history of a setting is read from the newest entries, the id orders the entries made at the same time
+    op.create_index(
+        'setting_history_service_name_name_updated_at_idx',
+        'setting_history',
+        ['service_name', 'name', sa.text('updated_at DESC'), sa.text('id DESC')],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('setting_history_service_name_name_updated_at_idx', 'setting_history')
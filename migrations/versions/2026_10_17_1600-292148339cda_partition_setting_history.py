@@ -0,0 +1,115 @@
+"""partition_setting_history
+
+Revision ID: 292148339cda
+Revises: 172c8d30a4e0
+Create Date: 2026-10-17 16:00:19.683012
+
+"""
+import datetime
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '292148339cda'
+down_revision = '172c8d30a4e0'
+branch_labels = None
+depends_on = None
+
+# partitions created in advance, the further ones are created by the "manage-history-partitions" command
+PARTITIONS_AHEAD = 3
+
+
+def upgrade() -> None:
+    # The history is partitioned by months of updated_at, so the old entries are removed by dropping partitions.
+    # The entries that do not fall into any partition (older than the retention window, but kept as the last versions
+    # of the settings, or written when the partitions were not created in time) go to the default partition.
+    op.execute('ALTER TABLE setting_history RENAME TO setting_history_old;')
+    op.execute('ALTER TABLE setting_history_old DROP CONSTRAINT setting_history_pkey;')
+    op.drop_index('setting_history_service_name_change_seq_idx', 'setting_history_old')
+    op.drop_index('setting_history_service_name_name_updated_at_idx', 'setting_history_old')
+    op.execute('ALTER SEQUENCE setting_history_id_seq OWNED BY NONE;')
+
+    op.execute(create_setting_history_table.format(partition_by='PARTITION BY RANGE (updated_at)'))
+    op.execute('ALTER SEQUENCE setting_history_id_seq OWNED BY setting_history.id;')
+    op.execute('CREATE TABLE setting_history_default PARTITION OF setting_history DEFAULT;')
+
+    conn = op.get_bind()
+    first_month, now = conn.execute(sa.text(get_history_period)).one()
+    month = _month_start(first_month or now)
+    last_month = _add_months(_month_start(now), PARTITIONS_AHEAD)
+    while month <= last_month:
+        next_month = _add_months(month, 1)
+        op.execute(
+            f"CREATE TABLE setting_history_p{month:%Y%m} PARTITION OF setting_history "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{next_month.isoformat()}');"
+        )
+        month = next_month
+
+    op.create_index('setting_history_service_name_change_seq_idx', 'setting_history', ['service_name', 'change_seq'])
+    op.create_index(
+        'setting_history_service_name_name_updated_at_idx',
+        'setting_history',
+        ['service_name', 'name', sa.text('updated_at DESC'), sa.text('id DESC')],
+    )
+
+    op.execute(f'INSERT INTO setting_history ({history_columns}) SELECT {history_columns} FROM setting_history_old;')
+    op.execute('DROP TABLE setting_history_old;')
+
+
+def downgrade() -> None:
+    op.execute('ALTER TABLE setting_history RENAME TO setting_history_old;')
+    op.execute('ALTER TABLE setting_history_old DROP CONSTRAINT setting_history_pkey;')
+    op.drop_index('setting_history_service_name_change_seq_idx', 'setting_history_old')
+    op.drop_index('setting_history_service_name_name_updated_at_idx', 'setting_history_old')
+    op.execute('ALTER SEQUENCE setting_history_id_seq OWNED BY NONE;')
+
+    op.execute(
+        create_setting_history_table.format(partition_by='').replace(
+            'PRIMARY KEY (id, updated_at)', 'PRIMARY KEY (id)'
+        )
+    )
+    op.execute('ALTER SEQUENCE setting_history_id_seq OWNED BY setting_history.id;')
+    op.create_index('setting_history_service_name_change_seq_idx', 'setting_history', ['service_name', 'change_seq'])
+    op.create_index(
+        'setting_history_service_name_name_updated_at_idx',
+        'setting_history',
+        ['service_name', 'name', sa.text('updated_at DESC'), sa.text('id DESC')],
+    )
+
+    op.execute(f'INSERT INTO setting_history ({history_columns}) SELECT {history_columns} FROM setting_history_old;')
+    op.execute('DROP TABLE setting_history_old;')
+
+
+def _month_start(value: datetime.datetime) -> datetime.date:
+    return datetime.date(value.year, value.month, 1)
+
+
+def _add_months(month: datetime.date, months: int) -> datetime.date:
+    year, month_index = divmod(month.year * 12 + month.month - 1 + months, 12)
+    return datetime.date(year, month_index + 1, 1)
+
+
+history_columns = (
+    'id, name, value, value_type, is_disabled, service_name, created_by_db_user, updated_at, is_deleted, '
+    'deleted_by_db_user, change_seq'
+)
+
+get_history_period = 'SELECT min(updated_at), localtimestamp FROM setting_history_old;'
+
+create_setting_history_table = """
+    CREATE TABLE setting_history (
+        id integer NOT NULL DEFAULT nextval('setting_history_id_seq'),
+        name text NOT NULL,
+        value text,
+        value_type settingvaluetype NOT NULL,
+        is_disabled boolean NOT NULL,
+        service_name text NOT NULL,
+        created_by_db_user text NOT NULL,
+        updated_at timestamp without time zone NOT NULL,
+        is_deleted boolean NOT NULL DEFAULT false,
+        deleted_by_db_user text,
+        change_seq bigint NOT NULL DEFAULT nextval('setting_change_seq'),
+        PRIMARY KEY (id, updated_at)
+    ) {partition_by};
+"""
@@ -0,0 +1,81 @@
+"""replace_change_seq_with_change_xid
+
+Revision ID: 5b7e2d4c9a31
+Revises: 292148339cda
+Create Date: 2026-10-18 10:00:41.205637
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '5b7e2d4c9a31'
+down_revision = '292148339cda'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # The numbers of the sequence were taken before the commit, so a change committed after a change with a greater
+    # number could be missed by the clients of the delta sync. The changes are marked with the id of the transaction
+    # instead, the transactions in progress are known from the snapshot of the reader.
+    for table in ('setting', 'setting_history'):
+        op.add_column(
+            table,
+            sa.Column(
+                'change_xid',
+                sa.BigInteger(),
+                server_default=sa.text('pg_current_xact_id()::text::bigint'),
+                nullable=False,
+            ),
+        )
+        op.create_index(f'{table}_service_name_change_xid_idx', table, ['service_name', 'change_xid'])
+        op.drop_index(f'{table}_service_name_change_seq_idx', table)
+        op.drop_column(table, 'change_seq')
+    op.execute('DROP SEQUENCE setting_change_seq;')
+
+    op.execute('DROP TRIGGER trigger_fill_user_in_setting_row ON setting;')
+    op.execute('DROP FUNCTION fill_user_in_setting_row;')
+    op.execute(fill_user_in_setting_row.format(change="NEW.change_xid = pg_current_xact_id()::text::bigint;"))
+
+
+def downgrade() -> None:
+    op.execute('DROP TRIGGER trigger_fill_user_in_setting_row ON setting;')
+    op.execute('DROP FUNCTION fill_user_in_setting_row;')
+    op.execute(fill_user_in_setting_row.format(change="NEW.change_seq = nextval('setting_change_seq');"))
+
+    op.execute('CREATE SEQUENCE setting_change_seq AS bigint;')
+    for table in ('setting', 'setting_history'):
+        op.add_column(
+            table,
+            sa.Column(
+                'change_seq',
+                sa.BigInteger(),
+                server_default=sa.text("nextval('setting_change_seq')"),
+                nullable=False,
+            ),
+        )
+        op.create_index(f'{table}_service_name_change_seq_idx', table, ['service_name', 'change_seq'])
+        op.drop_index(f'{table}_service_name_change_xid_idx', table)
+        op.drop_column(table, 'change_xid')
+
+
+fill_user_in_setting_row = """
+    CREATE FUNCTION fill_user_in_setting_row() RETURNS trigger AS
+    $$
+    BEGIN
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            NEW.created_by_db_user = session_user;
+            NEW.updated_at = current_timestamp;
+            {change}
+        END IF;
+        RETURN NEW;
+    END;
+    $$ LANGUAGE 'plpgsql' SECURITY DEFINER;
+
+    CREATE TRIGGER trigger_fill_user_in_setting_row
+        BEFORE INSERT OR UPDATE
+        ON setting
+        FOR EACH ROW
+    EXECUTE PROCEDURE fill_user_in_setting_row();
+"""
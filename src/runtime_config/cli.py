@@ -1,6 +1,26 @@
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+import typing as t
+from contextlib import contextmanager
+
 import click
+import psycopg2
 import uvicorn
 
+from runtime_config.config import get_config
+from runtime_config.enums.settings import SettingsFileFormat
+from runtime_config.lib.db import close_db, init_db
+from runtime_config.lib.metrics import (
+    MULTIPROC_DIR_ENV,
+    is_multiprocess,
+    prepare_multiprocess_dir,
+)
+from runtime_config.repositories.db import history_partitions, transfer
+
 
 @click.group()
 def cli() -> None:
@@ -14,16 +34,153 @@ def cli() -> None:
 @click.option('--workers', default=None, type=int)
 @click.option('--access_log', default=True, type=bool)
 def serve(host: str, port: int, reload: bool, workers: int | None, access_log: bool) -> None:
-    uvicorn.run(
-        'runtime_config.wsgi:app',
-        host=host,
-        port=port,
-        reload=reload,
-        workers=workers,
-        log_config={'version': 1, 'disable_existing_loggers': False},
-        access_log=access_log,
+    metrics_dir = None
+    if workers is not None and workers > 1:
+        # each worker collects its own metrics, they are shared through files to be exposed by any of the workers
+        if is_multiprocess():
+            prepare_multiprocess_dir(os.environ[MULTIPROC_DIR_ENV])
+        else:
+            metrics_dir = tempfile.mkdtemp(prefix='runtime-config-metrics-')
+            prepare_multiprocess_dir(metrics_dir)
+
+    try:
+        uvicorn.run(
+            'runtime_config.wsgi:app',
+            host=host,
+            port=port,
+            reload=reload,
+            workers=workers,
+            log_config={'version': 1, 'disable_existing_loggers': False},
+            access_log=access_log,
+        )
+    finally:
+        if metrics_dir is not None:
+            shutil.rmtree(metrics_dir, ignore_errors=True)
+
+
+@cli.command()
+@click.option(
+    '--months-ahead', default=None, type=int, help='Number of months to create the partitions for in advance'
+)
+@click.option('--retention-days', default=None, type=int, help='Age of the entries after which they are removed')
+@click.option('--keep-versions', default=None, type=int, help='Number of the last versions of each setting to keep')
+@click.option('--detach-only', default=False, is_flag=True, help='Detach the expired partitions without dropping them')
+def manage_history_partitions(
+    months_ahead: int | None, retention_days: int | None, keep_versions: int | None, detach_only: bool
+) -> None:
+    """
+    Creates the partitions of the change history for the coming months and removes the expired ones
+    """
+    config = get_config()
+    asyncio.run(
+        _manage_history_partitions(
+            months_ahead=months_ahead if months_ahead is not None else config.history_partitions_ahead,
+            retention_days=retention_days if retention_days is not None else config.history_retention_days,
+            keep_versions=keep_versions if keep_versions is not None else config.history_keep_versions,
+            drop=not detach_only,
+        )
     )
 
 
+async def _manage_history_partitions(months_ahead: int, retention_days: int, keep_versions: int, drop: bool) -> None:
+    db = await init_db(dsn=get_config().db_dsn)
+    try:
+        async with db.acquire() as conn:
+            for name in await history_partitions.create_history_partitions(conn, months_ahead=months_ahead):
+                click.echo(f'Created partition {name}')
+
+            pruned = await history_partitions.prune_history_partitions(
+                conn, retention_days=retention_days, keep_versions=keep_versions, drop=drop
+            )
+            kept_in_default = pruned.pop(history_partitions.DEFAULT_PARTITION)
+            for name, kept in pruned.items():
+                click.echo(f'{"Dropped" if drop else "Detached"} partition {name}, kept {kept} last versions')
+            click.echo(
+                f'Pruned partition {history_partitions.DEFAULT_PARTITION}, kept {kept_in_default} last versions'
+            )
+    finally:
+        await close_db()
+
+
+@contextmanager
+def _progress(label: str, file: t.IO[t.Any]) -> t.Iterator[t.Callable[[int], None]]:
+    """
+    Reports the progress of reading or writing the file to stderr, as a progress bar if the size of the file is known
+    """
+    length = os.fstat(file.fileno()).st_size if file.seekable() else 0
+    if length:
+        with click.progressbar(length=length, label=label, file=sys.stderr) as bar:
+            yield bar.update
+        return
+
+    done = 0
+    reported_at = time.monotonic()
+
+    def update(size: int) -> None:
+        nonlocal done, reported_at
+        done += size
+        if time.monotonic() - reported_at >= 1:
+            reported_at = time.monotonic()
+            click.echo(f'{label} {done / 2**20:.1f} MiB', err=True)
+
+    yield update
+
+
+@cli.command()
+@click.option('--service', 'service_names', multiple=True, help='Name of the service, all services by default')
+@click.option(
+    '--format',
+    'file_format',
+    default=SettingsFileFormat.ndjson.value,
+    type=click.Choice([file_format.value for file_format in SettingsFileFormat]),
+)
+@click.option('--output', default='-', type=click.File('wb'), help='Path of the file, stdout by default')
+def export(service_names: tuple[str, ...], file_format: str, output: t.BinaryIO) -> None:
+    """
+    Exports the settings of the services as NDJSON or CSV
+    """
+    with psycopg2.connect(get_config().db_dsn, client_encoding='utf8') as conn, _progress(
+        'Exporting', output
+    ) as on_progress:
+        exported = transfer.export_settings(
+            conn,
+            output,
+            service_names=service_names,
+            file_format=SettingsFileFormat(file_format),
+            on_progress=on_progress,
+        )
+    conn.close()
+    click.echo(f'Exported {exported} settings', err=True)
+
+
+@cli.command('import')
+@click.argument('input_file', metavar='INPUT', default='-', type=click.File('rb'))
+@click.option(
+    '--format',
+    'file_format',
+    default=SettingsFileFormat.ndjson.value,
+    type=click.Choice([file_format.value for file_format in SettingsFileFormat]),
+)
+@click.option(
+    '--replace', default=False, is_flag=True, help='Delete the settings of the imported services missing in the file'
+)
+def import_(input_file: t.BinaryIO, file_format: str, replace: bool) -> None:
+    """
+    Imports the settings exported by the export command, the settings with the same names are overwritten
+    """
+    with psycopg2.connect(get_config().db_dsn, client_encoding='utf8') as conn, _progress(
+        'Importing', input_file
+    ) as on_progress:
+        result = transfer.import_settings(
+            conn,
+            input_file,
+            file_format=SettingsFileFormat(file_format),
+            replace=replace,
+            on_progress=on_progress,
+        )
+    conn.close()
+    click.echo(f'Created {result.created}, updated {result.updated}, deleted {result.deleted} settings', err=True)
+
+
 if __name__ == '__main__':
     cli()
@@ -37,6 +37,46 @@ class Config(BaseSettings):
     db_user: str
     db_password: str
     db_name: str
+    db_pool_min_size: int = Field(default=1, ge=0)
+    db_pool_max_size: int = Field(default=10, gt=0)
+    # time to wait for a free connection of the pool, the request fails with 503 when it expires
+    db_pool_acquire_timeout: float | None = Field(default=5, gt=0)
+    # time after which an idle connection of the pool is reconnected
+    db_pool_recycle: float | None = Field(default=None, gt=0)
+    # time after which the database cancels a query, the request fails with 503
+    db_statement_timeout: float | None = Field(default=10, gt=0)
+    # time of a query above which it is logged with the id of the request, the queries are not logged if it is not set
+    db_slow_query_threshold: float | None = Field(default=0.5, gt=0)
+    # read replicas used by the read-only endpoints, the pool settings of the primary database are used for them
+    db_replica_dsns: list[PostgresDsn] = Field(default_factory=list)
+    # replication lag above which a replica is not used, the settings cached after a change are reloaded once this
+    # time has passed, so they do not stay outdated if they were read from a lagging replica
+    db_replica_max_lag: float = Field(default=5, gt=0)
+    db_replica_check_interval: float = Field(default=5, gt=0)
+
+    # partitions of the change history of the settings by months
+    history_partitions_ahead: int = Field(default=3, ge=0)
+    history_retention_days: int = Field(default=365, gt=0)
+    # the last versions of each setting are kept regardless of the retention
+    history_keep_versions: int = Field(default=10, ge=0)
+
+    # service settings cache
+    settings_cache_max_size: int = Field(default=1000, gt=0)
+    # the cache is invalidated by notifications from the database, the ttl only limits the lifetime of an entry
+    settings_cache_ttl: float | None = Field(default=None, gt=0)
+    # time to wait for the settings to be read from the database before the last known settings are served, the
+    # last known settings are never served if it is not set
+    settings_cache_stale_timeout: float | None = Field(default=1, gt=0)
+    # directory where the last known settings are saved to be served after a restart while the database is down
+    settings_cache_fallback_dir: Path | None = None
+
+    # response compression, brotli is used only if the brotli package is installed
+    compression_minimum_size: int = Field(default=500, ge=0)
+    compression_gzip_level: int = Field(default=6, ge=1, le=9)
+    compression_brotli_quality: int = Field(default=4, ge=0, le=11)
+
+    # stream of setting changes
+    settings_stream_heartbeat_interval: float = Field(default=15, gt=0)
 
     @property
     def db_dsn(self) -> PostgresDsn:
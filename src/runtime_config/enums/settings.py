@@ -7,3 +7,14 @@ class ValueType(enum.Enum):
     bool = 'bool'
     null = 'null'
     json = 'json'
+
+
+class SearchMode(enum.Enum):
+    exact = 'exact'
+    prefix = 'prefix'
+    substring = 'substring'
+
+
+class SettingsFileFormat(enum.Enum):
+    ndjson = 'ndjson'
+    csv = 'csv'
@@ -0,0 +1,88 @@
+import time
+import typing as t
+from collections import OrderedDict
+
+K = t.TypeVar('K', bound=t.Hashable)
+V = t.TypeVar('V')
+
+
+class CacheStats(t.TypedDict):
+    size: int
+    max_size: int
+    hits: int
+    misses: int
+    evictions: int
+
+
+class TTLCache(t.Generic[K, V]):
+    """
+    LRU cache whose entries expire after ttl seconds. If ttl is None, entries live until they are evicted or
+    invalidated.
+
+    The generation of a key is increased when the key is invalidated or the cache is cleared, it allows to detect that
+    a value read from the source may have become outdated before it was put into the cache. The invalidation of one
+    key does not change the generations of the others.
+    """
+
+    def __init__(self, max_size: int, ttl: float | None = None) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # number of invalidations, the generation of a key is the number at its last invalidation
+        self._invalidations = 0
+        self._cleared_at = 0
+        self._invalidated_at: dict[K, int] = {}
+        self._data: OrderedDict[K, tuple[float | None, V]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: K) -> V | None:
+        try:
+            expires_at, value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return None
+
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return None
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: K, value: V) -> None:
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def get_generation(self, key: K) -> int:
+        return self._invalidated_at.get(key, self._cleared_at)
+
+    def invalidate(self, key: K) -> None:
+        self._data.pop(key, None)
+        self._invalidations += 1
+        self._invalidated_at[key] = self._invalidations
+
+    def clear(self) -> None:
+        self._data.clear()
+        self._invalidations += 1
+        self._cleared_at = self._invalidations
+        self._invalidated_at.clear()
+
+    def stats(self) -> CacheStats:
+        return {
+            'size': len(self._data),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
@@ -0,0 +1,53 @@
+import gzip
+
+from runtime_config.lib.exception import ServiceInstanceNotFound
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+
+class Compressor:
+    """
+    Compresses response bodies. Brotli is supported only when the brotli package is installed, gzip is always
+    available.
+    """
+
+    def __init__(self, minimum_size: int, gzip_level: int, brotli_quality: int) -> None:
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    @property
+    def encodings(self) -> tuple[str, ...]:
+        """
+        Supported encodings in the order of preference
+        """
+        return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+    def should_compress(self, body: bytes) -> bool:
+        return len(body) > 0 and len(body) >= self.minimum_size
+
+    def compress(self, body: bytes, encoding: str) -> bytes:
+        if encoding == 'gzip':
+            return gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
+        if encoding == 'br' and brotli is not None:
+            return brotli.compress(body, quality=self.brotli_quality)
+        raise ValueError(f'Unsupported encoding: {encoding}')
+
+
+_inst: dict[str, Compressor] = {}
+
+
+def init_compressor(minimum_size: int, gzip_level: int, brotli_quality: int) -> Compressor:
+    compressor = Compressor(minimum_size=minimum_size, gzip_level=gzip_level, brotli_quality=brotli_quality)
+    _inst['compressor'] = compressor
+    return compressor
+
+
+def get_compressor() -> Compressor:
+    try:
+        return _inst['compressor']
+    except KeyError:
+        raise ServiceInstanceNotFound('compressor')
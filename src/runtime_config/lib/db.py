@@ -1,14 +1,171 @@
+import asyncio
+import re
+import time
 import typing as t
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
 
+import aiopg
+import psycopg2
 from aiopg.sa import Engine, SAConnection, create_engine
 from pydantic.networks import PostgresDsn
+from sqlalchemy.dialects.postgresql.psycopg2 import PGDialect_psycopg2
+from sqlalchemy.sql import ClauseElement
 from structlog import get_logger
 
-from runtime_config.lib.exception import ServiceInstanceNotFound
+from runtime_config.lib import metrics
+from runtime_config.lib.exception import DatabaseUnavailable, ServiceInstanceNotFound
 
 logger = get_logger(__name__)
 
 _inst: dict[str, Engine] = {}
+_replicas: dict[str, 'ReplicaSet'] = {}
+# time to wait for a free connection of the pool in seconds, there is no limit if it is not set
+_acquire_timeout: dict[str, float] = {}
+
+# time of a query in seconds above which it is logged
+_slow_query_threshold: dict[str, float] = {}
+
+# durations of holding the connections taken within the tracked scope (usually a request) in seconds
+_conn_hold_times: ContextVar[list[float] | None] = ContextVar('conn_hold_times', default=None)
+# queries made within the tracked scope
+_query_traces: ContextVar[list['QueryTrace'] | None] = ContextVar('query_traces', default=None)
+
+_QUERY_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_QUERY_SPACE_RE = re.compile(r'\s+')
+# the lists of values of different lengths are reduced to one value
+_QUERY_IN_LIST_RE = re.compile(r'\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)', re.IGNORECASE)
+_fingerprint_dialect = PGDialect_psycopg2()
+
+# name of the pool of the primary database in the metrics
+PRIMARY_POOL = 'primary'
+
+ConnAcquirer = t.Callable[[], t.AsyncContextManager[SAConnection]]
+
+
+class PoolStats(t.TypedDict):
+    min_size: int
+    max_size: int
+    size: int
+    free: int
+    used: int
+
+
+class ReplicaStats(t.TypedDict):
+    host: str | None
+    healthy: bool
+    # replication lag in seconds, None if it is unknown
+    lag: float | None
+    pool: PoolStats
+
+
+def get_query_fingerprint(query: str | ClauseElement) -> str:
+    """
+    Returns the statement of the query without the literal values, so the executions of the same query with
+    different values have the same fingerprint
+    """
+    statement = query if isinstance(query, str) else str(query.compile(dialect=_fingerprint_dialect))
+    statement = _QUERY_IN_LIST_RE.sub('IN (?)', _QUERY_LITERAL_RE.sub('?', statement))
+    return _QUERY_SPACE_RE.sub(' ', statement).strip()
+
+
+@dataclass(frozen=True)
+class QueryTrace:
+    query: str | ClauseElement
+    # seconds
+    duration: float
+    # None if the query has failed
+    rowcount: int | None
+
+    @property
+    def fingerprint(self) -> str:
+        # the query is compiled once more only when the fingerprint is needed
+        return get_query_fingerprint(self.query)
+
+
+class Replica:
+    def __init__(self, dsn: PostgresDsn, db: Engine) -> None:
+        self.dsn = dsn
+        self.db = db
+        self.healthy = False
+        self.lag: float | None = None
+        # name of the pool in the metrics
+        self.pool = f'replica:{dsn.host}:{dsn.port or 5432}'
+
+
+class ReplicaSet:
+    """
+    Read replicas of the database. The replicas are checked periodically, the reads are spread between the healthy
+    ones, whose replication lag does not exceed the ceiling.
+    """
+
+    LAG_QUERY = (
+        'SELECT coalesce(CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+        'ELSE extract(epoch FROM now() - pg_last_xact_replay_timestamp()) END, 0) AS lag'
+    )
+
+    def __init__(self, replicas: list[Replica], max_lag: float | None, check_interval: float) -> None:
+        self.replicas = replicas
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._next = 0
+        self._check_task: asyncio.Task[None] | None = None
+
+    def choose(self) -> Replica | None:
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return None
+
+        self._next = (self._next + 1) % len(healthy)
+        return healthy[self._next]
+
+    def mark_unhealthy(self, replica: Replica) -> None:
+        if replica.healthy:
+            logger.warning('Database replica is unavailable, reads are moved off it', host=replica.dsn.host)
+        replica.healthy = False
+
+    async def check(self) -> None:
+        await asyncio.gather(*(self._check_replica(replica) for replica in self.replicas))
+
+    async def _check_replica(self, replica: Replica) -> None:
+        try:
+            async with replica.db.acquire() as conn:
+                replica.lag = float(await conn.scalar(self.LAG_QUERY))
+        except (psycopg2.Error, OSError, asyncio.TimeoutError):
+            replica.lag = None
+            self.mark_unhealthy(replica)
+            return
+
+        healthy = self.max_lag is None or replica.lag <= self.max_lag
+        if healthy != replica.healthy:
+            logger.info(
+                'Database replica became healthy'
+                if healthy
+                else 'Database replica lags behind, reads are moved off it',
+                host=replica.dsn.host,
+                lag=replica.lag,
+            )
+        replica.healthy = healthy
+
+    def start(self) -> None:
+        self._check_task = asyncio.create_task(self._check_periodically())
+
+    async def _check_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.check_interval)
+            try:
+                await self.check()
+            except Exception:
+                logger.exception('Failed to check the database replicas')
+
+    async def close(self) -> None:
+        if self._check_task is not None:
+            self._check_task.cancel()
+            await asyncio.gather(self._check_task, return_exceptions=True)
+        for replica in self.replicas:
+            replica.db.close()
+        await asyncio.gather(*(replica.db.wait_closed() for replica in self.replicas))
 
 
 def get_db() -> Engine:
@@ -18,22 +175,327 @@ def get_db() -> Engine:
         raise ServiceInstanceNotFound('db')
 
 
+def _update_pool_metrics(db: Engine, pool: str) -> None:
+    metrics.DB_POOL_SIZE.labels(pool).set(db.size)
+    metrics.DB_POOL_FREE.labels(pool).set(db.freesize)
+
+
+async def _take_conn(db: Engine, pool: str) -> SAConnection:
+    waiting = metrics.DB_POOL_WAITING.labels(pool)
+    waiting.inc()
+    try:
+        return await asyncio.wait_for(db.acquire(), timeout=_acquire_timeout.get('db'))
+    except asyncio.TimeoutError:
+        raise DatabaseUnavailable('Timed out waiting for a free database connection')
+    finally:
+        waiting.dec()
+        _update_pool_metrics(db, pool)
+
+
+def _record_query(trace: QueryTrace) -> None:
+    traces = _query_traces.get()
+    if traces is not None:
+        traces.append(trace)
+
+    threshold = _slow_query_threshold.get('db')
+    if threshold is not None and trace.duration > threshold:
+        logger.warning(
+            'Slow database query',
+            fingerprint=trace.fingerprint,
+            duration=round(trace.duration, 6),
+            rowcount=trace.rowcount,
+        )
+
+
+class _TracedExecution:
+    """
+    Result of TracedSAConnection.execute, which may be awaited, iterated over or used as a context manager like the
+    result of SAConnection.execute. The query is recorded when its result is received.
+    """
+
+    def __init__(self, execution: t.Any, query: str | ClauseElement) -> None:
+        self._execution = execution
+        self._query = query
+        self._result: t.Any = None
+
+    def __await__(self) -> t.Generator[t.Any, None, t.Any]:
+        return self._trace(self._execution).__await__()
+
+    async def _trace(self, execution: t.Awaitable[t.Any]) -> t.Any:
+        rowcount = None
+        started_at = time.perf_counter()
+        try:
+            result = await execution
+            rowcount = result.rowcount
+            return result
+        finally:
+            _record_query(QueryTrace(query=self._query, duration=time.perf_counter() - started_at, rowcount=rowcount))
+
+    async def __aenter__(self) -> t.Any:
+        return await self._trace(self._execution.__aenter__())
+
+    async def __aexit__(self, *exc_info: t.Any) -> None:
+        await self._execution.__aexit__(*exc_info)
+
+    def __aiter__(self) -> '_TracedExecution':
+        return self
+
+    async def __anext__(self) -> t.Any:
+        if self._result is None:
+            self._result = await self
+        try:
+            return await self._result.__anext__()
+        except StopAsyncIteration:
+            self._result.close()
+            raise
+
+
+class TracedSAConnection(SAConnection):
+    """
+    Records the duration and the number of rows of each query, the queries made by scalar are recorded too as it
+    calls execute
+    """
+
+    def execute(self, query: str | ClauseElement, *multiparams: t.Any, **params: t.Any) -> _TracedExecution:
+        return _TracedExecution(super().execute(query, *multiparams, **params), query)
+
+
+@asynccontextmanager
+async def _hold_conn(db: Engine, pool: str, conn: SAConnection) -> t.AsyncIterator[SAConnection]:
+    # the connection taken from the pool is replaced by the traced one, it is released to the pool the same way
+    conn = TracedSAConnection(conn.connection, db)
+    acquired_at = time.perf_counter()
+    try:
+        yield conn
+    finally:
+        await conn.close()
+        _update_pool_metrics(db, pool)
+        hold_times = _conn_hold_times.get()
+        if hold_times is not None:
+            hold_times.append(time.perf_counter() - acquired_at)
+
+
+@asynccontextmanager
+async def acquire_db_conn() -> t.AsyncIterator[SAConnection]:
+    """
+    Takes a connection from the pool, fails with DatabaseUnavailable if there is no free connection within the acquire
+    timeout
+    """
+    db = get_db()
+    async with _hold_conn(db, PRIMARY_POOL, await _take_conn(db, PRIMARY_POOL)) as conn:
+        yield conn
+
+
+@asynccontextmanager
+async def acquire_read_db_conn() -> t.AsyncIterator[SAConnection]:
+    """
+    Takes a connection to one of the healthy replicas, or to the primary database if there are none or the connection
+    to the replica cannot be taken. The connection must be used only for reading.
+    """
+    replicas = _replicas.get('db')
+    replica = replicas.choose() if replicas is not None else None
+    if replicas is not None and replica is not None:
+        try:
+            conn = await _take_conn(replica.db, replica.pool)
+        except (psycopg2.Error, OSError):
+            replicas.mark_unhealthy(replica)
+        except DatabaseUnavailable:
+            # the pool of the replica is exhausted, but the replica itself is fine
+            pass
+        else:
+            async with _hold_conn(replica.db, replica.pool, conn) as conn:
+                yield conn
+            return
+
+    async with acquire_db_conn() as conn:
+        yield conn
+
+
+@contextmanager
+def track_conn_hold_time() -> t.Iterator[list[float]]:
+    """
+    Collects the durations of holding each connection taken from the pool within the block
+    """
+    hold_times: list[float] = []
+    token = _conn_hold_times.set(hold_times)
+    try:
+        yield hold_times
+    finally:
+        _conn_hold_times.reset(token)
+
+
+@contextmanager
+def track_queries() -> t.Iterator[list[QueryTrace]]:
+    """
+    Collects the queries made through the connections taken from the pool within the block
+    """
+    traces: list[QueryTrace] = []
+    token = _query_traces.set(traces)
+    try:
+        yield traces
+    finally:
+        _query_traces.reset(token)
+
+
 async def get_db_conn() -> t.AsyncIterable[SAConnection]:
-    async with get_db().acquire() as conn:
+    async with acquire_db_conn() as conn:
         yield conn
 
 
+def get_db_conn_acquirer() -> ConnAcquirer:
+    """
+    Unlike get_db_conn, allows the handler to take a connection from the pool only when it is really needed and to
+    return it as soon as possible
+    """
+    return acquire_db_conn
+
+
+def get_db_read_conn_acquirer() -> ConnAcquirer:
+    """
+    Same as get_db_conn_acquirer, but the connections are taken from the read replicas if there are any
+    """
+    return acquire_read_db_conn
+
+
+def _get_pool_stats(db: Engine) -> PoolStats:
+    return {
+        'min_size': db.minsize,
+        'max_size': db.maxsize,
+        'size': db.size,
+        'free': db.freesize,
+        'used': db.size - db.freesize,
+    }
+
+
+def get_db_pool_stats() -> PoolStats:
+    return _get_pool_stats(get_db())
+
+
+def get_db_replica_stats() -> list[ReplicaStats]:
+    replicas = _replicas.get('db')
+    if replicas is None:
+        return []
+
+    return [
+        {
+            'host': replica.dsn.host,
+            'healthy': replica.healthy,
+            'lag': replica.lag,
+            'pool': _get_pool_stats(replica.db),
+        }
+        for replica in replicas.replicas
+    ]
+
+
 def set_db(db: Engine) -> None:
     _inst['db'] = db
 
 
-async def init_db(dsn: PostgresDsn) -> Engine:
-    db = await create_engine(dsn=dsn)
+async def _create_engine(
+    dsn: PostgresDsn,
+    min_size: int,
+    max_size: int,
+    statement_timeout: float | None,
+    pool_recycle: float | None,
+) -> Engine:
+    options = {}
+    if statement_timeout is not None:
+        # aiopg turns the cancellation of a query by the server into asyncio.CancelledError, which cannot be told
+        # apart from the cancellation of the request, so the query is timed out by aiopg and the server timeout,
+        # a bit longer, only stops the query abandoned by the client
+        options['options'] = f'-c statement_timeout={int((statement_timeout + 1) * 1000)}'
+    return await create_engine(
+        dsn=dsn,
+        minsize=min_size,
+        maxsize=max_size,
+        timeout=statement_timeout if statement_timeout is not None else aiopg.DEFAULT_TIMEOUT,
+        pool_recycle=pool_recycle if pool_recycle is not None else -1,
+        **options,
+    )
+
+
+async def init_db(
+    dsn: PostgresDsn,
+    min_size: int = 1,
+    max_size: int = 10,
+    acquire_timeout: float | None = None,
+    statement_timeout: float | None = None,
+    pool_recycle: float | None = None,
+    slow_query_threshold: float | None = None,
+) -> Engine:
+    """
+    :param acquire_timeout: time to wait for a free connection of the pool in seconds
+    :param statement_timeout: time after which a query fails with asyncio.TimeoutError in seconds
+    :param pool_recycle: time after which an idle connection is reconnected in seconds
+    :param slow_query_threshold: time of a query above which it is logged in seconds, the queries to the replicas
+        are logged too
+    """
+    db = await _create_engine(
+        dsn=dsn, min_size=min_size, max_size=max_size, statement_timeout=statement_timeout, pool_recycle=pool_recycle
+    )
     set_db(db)
+    if acquire_timeout is not None:
+        _acquire_timeout['db'] = acquire_timeout
+    else:
+        _acquire_timeout.pop('db', None)
+    if slow_query_threshold is not None:
+        _slow_query_threshold['db'] = slow_query_threshold
+    else:
+        _slow_query_threshold.pop('db', None)
     logger.info('Database connection pool initialized successfully')
     return db
 
 
+async def init_db_replicas(
+    dsns: list[PostgresDsn],
+    max_lag: float | None = None,
+    check_interval: float = 5,
+    max_size: int = 10,
+    statement_timeout: float | None = None,
+    pool_recycle: float | None = None,
+) -> ReplicaSet | None:
+    """
+    Creates the connection pools of the read replicas, the acquire timeout of the primary database is used for them
+    too. Nothing is done if there are no replicas.
+
+    :param max_lag: replication lag in seconds above which the replica is not used
+    :param check_interval: interval between the checks of the health and the lag of the replicas in seconds
+    """
+    if not dsns:
+        return None
+
+    replicas = ReplicaSet(
+        replicas=[
+            Replica(
+                dsn=dsn,
+                # the pools of the replicas are filled on demand, so an unavailable replica does not fail the start
+                db=await _create_engine(
+                    dsn=dsn,
+                    min_size=0,
+                    max_size=max_size,
+                    statement_timeout=statement_timeout,
+                    pool_recycle=pool_recycle,
+                ),
+            )
+            for dsn in dsns
+        ],
+        max_lag=max_lag,
+        check_interval=check_interval,
+    )
+    await replicas.check()
+    replicas.start()
+    _replicas['db'] = replicas
+    logger.info('Database replica connection pools initialized successfully', replicas=len(dsns))
+    return replicas
+
+
+async def close_db_replicas() -> None:
+    replicas = _replicas.pop('db', None)
+    if replicas is not None:
+        await replicas.close()
+        logger.info('Database replica connection pools closed')
+
+
 async def close_db() -> None:
     try:
         db = get_db()
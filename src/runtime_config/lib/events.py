@@ -0,0 +1,41 @@
+import asyncio
+import typing as t
+from collections import defaultdict
+from contextlib import contextmanager
+
+
+class KeyedEvents:
+    """
+    Registry of asyncio events by key. When a key is notified, its event is set and replaced by a new one, so a
+    coroutine that took the event before reading some state is woken up by any change made after the reading.
+    """
+
+    def __init__(self) -> None:
+        self._events: dict[str, asyncio.Event] = {}
+        self._subscribers: defaultdict[str, int] = defaultdict(int)
+
+    @contextmanager
+    def subscribe(self, key: str) -> t.Iterator[asyncio.Event]:
+        try:
+            event = self._events[key]
+        except KeyError:
+            event = self._events[key] = asyncio.Event()
+
+        self._subscribers[key] += 1
+        try:
+            yield event
+        finally:
+            self._subscribers[key] -= 1
+            if not self._subscribers[key]:
+                del self._subscribers[key]
+                self._events.pop(key, None)
+
+    def notify(self, key: str) -> None:
+        event = self._events.pop(key, None)
+        if event is not None:
+            event.set()
+
+    def notify_all(self) -> None:
+        events, self._events = self._events, {}
+        for event in events.values():
+            event.set()
@@ -5,3 +5,7 @@ class ServiceInstanceNotFound(Exception):
 
     def __init__(self, service_name: str, msg: str = default_msg) -> None:
         super().__init__(msg.format(service_name=service_name))
+
+
+class DatabaseUnavailable(Exception):
+    pass
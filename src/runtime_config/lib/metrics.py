@@ -0,0 +1,144 @@
+import functools
+import inspect
+import os
+import time
+import typing as t
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+# the metrics of all workers are written to the files of this directory and are aggregated when they are collected
+MULTIPROC_DIR_ENV = 'PROMETHEUS_MULTIPROC_DIR'
+METRICS_CONTENT_TYPE = CONTENT_TYPE_LATEST
+# route of the requests which have not matched any route, so that arbitrary paths do not produce new label values
+UNMATCHED_ROUTE = '<unmatched>'
+
+P = t.ParamSpec('P')
+R = t.TypeVar('R')
+Y = t.TypeVar('Y')
+
+REQUEST_DURATION = Histogram(
+    'runtime_config_http_request_duration_seconds',
+    'Time of handling the requests by route template',
+    ['method', 'route', 'status_code'],
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    'runtime_config_http_requests_in_progress',
+    'Number of the requests being handled',
+    ['method'],
+    multiprocess_mode='livesum',
+)
+RESPONSE_SIZE = Histogram(
+    'runtime_config_http_response_size_bytes',
+    'Size of the response bodies sent to the clients by route template',
+    ['method', 'route'],
+    buckets=(100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000),
+)
+DB_QUERY_DURATION = Histogram(
+    'runtime_config_db_query_duration_seconds',
+    'Time of the database queries by repository function',
+    ['function'],
+)
+DB_POOL_SIZE = Gauge(
+    'runtime_config_db_pool_size',
+    'Number of the open connections of the pool',
+    ['pool'],
+    multiprocess_mode='livesum',
+)
+DB_POOL_FREE = Gauge(
+    'runtime_config_db_pool_free',
+    'Number of the free connections of the pool',
+    ['pool'],
+    multiprocess_mode='livesum',
+)
+DB_POOL_WAITING = Gauge(
+    'runtime_config_db_pool_waiting',
+    'Number of the requests waiting for a free connection of the pool',
+    ['pool'],
+    multiprocess_mode='livesum',
+)
+
+
+def is_multiprocess() -> bool:
+    return bool(os.environ.get(MULTIPROC_DIR_ENV))
+
+
+def collect_metrics() -> bytes:
+    """
+    Returns the metrics in the text format of Prometheus. When several workers are run, the metrics of all of them
+    are returned, not only of the worker handling the request.
+    """
+    if not is_multiprocess():
+        return generate_latest(REGISTRY)
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry)
+
+
+def prepare_multiprocess_dir(path: str) -> None:
+    """
+    Makes the workers started afterwards write their metrics to the directory, the metrics left by the previous run
+    are removed
+    """
+    os.makedirs(path, exist_ok=True)
+    for name in os.listdir(path):
+        if name.endswith('.db'):
+            os.remove(os.path.join(path, name))
+    os.environ[MULTIPROC_DIR_ENV] = path
+
+
+async def close_metrics() -> None:
+    # the gauges of a stopped worker must not be summed up with the gauges of the running ones
+    if is_multiprocess():
+        multiprocess.mark_process_dead(os.getpid())
+
+
+def track_query_duration(func: t.Callable[P, t.Awaitable[R]]) -> t.Callable[P, t.Awaitable[R]]:
+    histogram = DB_QUERY_DURATION.labels(func.__name__)
+
+    @functools.wraps(func)
+    async def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+        started_at = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            histogram.observe(time.perf_counter() - started_at)
+
+    return wrapper
+
+
+def track_query_stream_duration(func: t.Callable[P, t.AsyncIterable[Y]]) -> t.Callable[P, t.AsyncIterator[Y]]:
+    """
+    Same as track_query_duration for the functions streaming the rows. Only the time of reading the rows is counted,
+    not the time the caller spends between them.
+    """
+    histogram = DB_QUERY_DURATION.labels(func.__name__)
+
+    @functools.wraps(func)
+    async def wrapper(*args: P.args, **kwargs: P.kwargs) -> t.AsyncIterator[Y]:
+        rows = func(*args, **kwargs).__aiter__()
+        duration = 0.0
+        try:
+            while True:
+                started_at = time.perf_counter()
+                try:
+                    row = await rows.__anext__()
+                except StopAsyncIteration:
+                    break
+                finally:
+                    duration += time.perf_counter() - started_at
+                yield row
+        finally:
+            histogram.observe(duration)
+            if inspect.isasyncgen(rows):
+                await rows.aclose()
+
+    return wrapper
@@ -0,0 +1,84 @@
+import asyncio
+import typing as t
+
+import aiopg
+from structlog import get_logger
+
+logger = get_logger(__name__)
+
+NotificationHandler = t.Callable[[str], None]
+ConnectHandler = t.Callable[[], None]
+
+
+class PgListener:
+    """
+    Listens to a postgres notification channel on a dedicated connection and passes the payload of each
+    notification to the handlers.
+
+    Notifications sent while the connection is lost are not delivered, so the connect handlers are called every
+    time the connection is (re)established to let the consumers resynchronize their state.
+    """
+
+    def __init__(self, dsn: str, channel: str, reconnect_delay: float = 1) -> None:
+        self.dsn = dsn
+        self.channel = channel
+        self.reconnect_delay = reconnect_delay
+        self._handlers: list[NotificationHandler] = []
+        self._connect_handlers: list[ConnectHandler] = []
+        self._task: asyncio.Task[None] | None = None
+        self._connected = asyncio.Event()
+
+    def add_handler(self, handler: NotificationHandler) -> None:
+        self._handlers.append(handler)
+
+    def add_connect_handler(self, handler: ConnectHandler) -> None:
+        self._connect_handlers.append(handler)
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def wait_connected(self) -> None:
+        await self._connected.wait()
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                async with aiopg.connect(dsn=self.dsn) as conn:
+                    async with conn.cursor() as cur:
+                        await cur.execute(f'LISTEN "{self.channel}"')
+
+                    logger.info('Listening to notifications', channel=self.channel)
+                    self._call_handlers(self._connect_handlers)
+                    self._connected.set()
+
+                    while True:
+                        notification = await conn.notifies.get()
+                        self._call_handlers(self._handlers, notification.payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.warning(
+                    'Lost connection to the notification channel, reconnecting',
+                    channel=self.channel,
+                    exc_info=True,
+                )
+            finally:
+                self._connected.clear()
+
+            await asyncio.sleep(self.reconnect_delay)
+
+    def _call_handlers(self, handlers: t.Sequence[t.Callable[..., None]], *args: t.Any) -> None:
+        for handler in handlers:
+            try:
+                handler(*args)
+            except Exception:
+                logger.exception('Notification handler failed', channel=self.channel, handler=handler)
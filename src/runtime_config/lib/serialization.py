@@ -0,0 +1,39 @@
+import datetime
+import enum
+import json
+import typing as t
+
+from pydantic.main import BaseModel
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None  # type: ignore[assignment]
+
+
+def _default(obj: t.Any) -> t.Any:
+    if isinstance(obj, BaseModel):
+        return obj.dict()
+    if isinstance(obj, enum.Enum):
+        return obj.value
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        return obj.isoformat()
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+def _dumps_std(obj: t.Any) -> bytes:
+    return json.dumps(
+        obj, default=_default, ensure_ascii=False, allow_nan=False, indent=None, separators=(',', ':')
+    ).encode('utf-8')
+
+
+def _dumps_orjson(obj: t.Any) -> bytes:
+    return orjson.dumps(obj, default=_default)
+
+
+def dumps(obj: t.Any) -> bytes:
+    """
+    Encodes the object to JSON in the same way as FastAPI does it for the response models: pydantic models are
+    encoded as dicts, enums as their values and dates in the ISO 8601 format. Uses orjson when it is installed.
+    """
+    return _dumps_orjson(obj) if orjson is not None else _dumps_std(obj)
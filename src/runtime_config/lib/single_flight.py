@@ -0,0 +1,34 @@
+import asyncio
+import typing as t
+from functools import partial
+
+K = t.TypeVar('K', bound=t.Hashable)
+V = t.TypeVar('V')
+
+
+class SingleFlight(t.Generic[K, V]):
+    """
+    Coalesces concurrent calls with the same key: while a call is in progress, the other callers with the same key
+    wait for its result instead of making the call again. The call runs in a separate task, so cancelling one of
+    the callers does not cancel it for the others.
+    """
+
+    def __init__(self) -> None:
+        self._calls: dict[K, asyncio.Task[V]] = {}
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: K, func: t.Callable[[], t.Coroutine[t.Any, t.Any, V]]) -> V:
+        task = self._calls.get(key)
+        if task is None:
+            task = self._calls[key] = asyncio.create_task(func())
+            task.add_done_callback(partial(self._forget, key))
+        return await asyncio.shield(task)
+
+    def _forget(self, key: K, task: asyncio.Task[V]) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # retrieves the exception so that it is not reported as never retrieved when all callers were cancelled
+            task.exception()
@@ -9,6 +9,8 @@ from structlog.types import Processor
 from runtime_config.config import LogLevel
 
 processors: list[Processor] = [
+    # the values bound to the context of the request (the request id) are added to all records made while handling it
+    structlog.contextvars.merge_contextvars,
     structlog.processors.TimeStamper(fmt='iso'),
     structlog.stdlib.add_log_level,
     structlog.stdlib.add_logger_name,
@@ -4,20 +4,86 @@ from functools import partial
 from fastapi import FastAPI
 
 from runtime_config.config import Config, get_config
-from runtime_config.lib.db import close_db, init_db
+from runtime_config.lib.compression import init_compressor
+from runtime_config.lib.db import close_db, close_db_replicas, init_db, init_db_replicas
+from runtime_config.lib.metrics import close_metrics
 from runtime_config.logger import init_logger
+from runtime_config.services.setting_changes import (
+    close_setting_listener,
+    init_setting_listener,
+)
+from runtime_config.services.settings_broadcaster import (
+    close_settings_broadcaster,
+    init_settings_broadcaster,
+)
+from runtime_config.services.settings_cache import init_settings_cache
+from runtime_config.web.compression import CompressionMiddleware
+from runtime_config.web.exception_handlers import init_exception_handlers
+from runtime_config.web.instrumentation import (
+    ConnHoldTimeMiddleware,
+    MetricsMiddleware,
+    RequestTracingMiddleware,
+)
 from runtime_config.web.routes import init_routes
 
 
 def init_hooks(app: FastAPI, config: Config) -> None:
-    app.on_event('startup')(partial(init_db, dsn=config.db_dsn))
+    app.on_event('startup')(
+        partial(
+            init_db,
+            dsn=config.db_dsn,
+            min_size=config.db_pool_min_size,
+            max_size=config.db_pool_max_size,
+            acquire_timeout=config.db_pool_acquire_timeout,
+            statement_timeout=config.db_statement_timeout,
+            pool_recycle=config.db_pool_recycle,
+            slow_query_threshold=config.db_slow_query_threshold,
+        )
+    )
+    app.on_event('startup')(
+        partial(
+            init_db_replicas,
+            dsns=config.db_replica_dsns,
+            max_lag=config.db_replica_max_lag,
+            check_interval=config.db_replica_check_interval,
+            max_size=config.db_pool_max_size,
+            statement_timeout=config.db_statement_timeout,
+            pool_recycle=config.db_pool_recycle,
+        )
+    )
+    app.on_event('startup')(partial(init_setting_listener, dsn=config.db_dsn))
+    app.on_event('startup')(
+        partial(init_settings_broadcaster, heartbeat_interval=config.settings_stream_heartbeat_interval)
+    )
+    app.on_event('shutdown')(close_settings_broadcaster)
+    app.on_event('shutdown')(close_setting_listener)
+    app.on_event('shutdown')(close_db_replicas)
     app.on_event('shutdown')(close_db)
+    app.on_event('shutdown')(close_metrics)
 
 
 def app_factory(app_hooks: t.Callable[[FastAPI, Config], None] = init_hooks) -> FastAPI:
     config = get_config()
     init_logger(log_mode=config.log_mode.value, log_level=config.log_level)
+    init_settings_cache(
+        max_size=config.settings_cache_max_size,
+        ttl=config.settings_cache_ttl,
+        reload_delay=config.db_replica_max_lag if config.db_replica_dsns else None,
+        stale_timeout=config.settings_cache_stale_timeout,
+        fallback_dir=config.settings_cache_fallback_dir,
+    )
+    compressor = init_compressor(
+        minimum_size=config.compression_minimum_size,
+        gzip_level=config.compression_gzip_level,
+        brotli_quality=config.compression_brotli_quality,
+    )
     app = FastAPI(title='runtime-config')
+    app.add_middleware(CompressionMiddleware, compressor=compressor)
+    app.add_middleware(ConnHoldTimeMiddleware)
+    app.add_middleware(RequestTracingMiddleware)
+    # the outermost middleware, so the size of the compressed responses is measured
+    app.add_middleware(MetricsMiddleware)
     app_hooks(app, config)
+    init_exception_handlers(app)
     init_routes(app)
     return app
@@ -1,4 +1,14 @@
-from sqlalchemy import Boolean, Column, DateTime, Enum, Integer, Text, UniqueConstraint
+from sqlalchemy import (
+    BigInteger,
+    Boolean,
+    Column,
+    DateTime,
+    Enum,
+    Integer,
+    Text,
+    UniqueConstraint,
+    text,
+)
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql import expression
 
@@ -14,11 +24,13 @@ class Setting(Base):  # type: ignore
     id = Column(Integer, primary_key=True)
     name = Column(Text, nullable=False)
     value = Column(Text)
-    value_type = Column(Enum(ValueType), nullable=False)
+    value_type = Column(Enum(ValueType, name='settingvaluetype'), nullable=False)
     is_disabled = Column(Boolean, server_default=expression.false(), nullable=False)
     service_name = Column(Text, nullable=False)
     created_by_db_user = Column(Text)
     updated_at = Column(DateTime, nullable=False)
+    # id of the transaction which made the change
+    change_xid = Column(BigInteger, server_default=text('pg_current_xact_id()::text::bigint'), nullable=False)
 
     __table_args__ = (UniqueConstraint('name', 'service_name', name='unique_setting_name_per_service'),)
 
@@ -26,13 +38,18 @@ class Setting(Base):  # type: ignore
 class SettingHistory(Base):  # type: ignore
     __tablename__ = 'setting_history'
 
-    id = Column(Integer, primary_key=True)
+    id = Column(Integer, primary_key=True, autoincrement=True)
     name = Column(Text, nullable=False)
     value = Column(Text)
-    value_type = Column(Enum(ValueType), nullable=False)
+    value_type = Column(Enum(ValueType, name='settingvaluetype'), nullable=False)
     is_disabled = Column(Boolean, nullable=False)
     service_name = Column(Text, nullable=False)
     created_by_db_user = Column(Text, nullable=False)
-    updated_at = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, primary_key=True, nullable=False)
     is_deleted = Column(Boolean, server_default=expression.false(), nullable=False)
     deleted_by_db_user = Column(Text)
+    # id of the transaction which made the change
+    change_xid = Column(BigInteger, server_default=text('pg_current_xact_id()::text::bigint'), nullable=False)
+
+    # the partitions by months are managed by the "manage-history-partitions" command
+    __table_args__ = {'postgresql_partition_by': 'RANGE (updated_at)'}
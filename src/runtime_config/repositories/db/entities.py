@@ -6,6 +6,16 @@ from pydantic.main import BaseModel
 from runtime_config.enums.settings import ValueType
 
 
+class SettingKey(t.NamedTuple):
+    """
+    Position of a setting in the lists of settings ordered by service name, name and id
+    """
+
+    service_name: str
+    name: str
+    id: int
+
+
 class SettingData(BaseModel):
     id: int
     name: str
@@ -16,7 +26,33 @@ class SettingData(BaseModel):
     created_by_db_user: str
     updated_at: datetime.datetime
 
+    @property
+    def key(self) -> SettingKey:
+        return SettingKey(service_name=self.service_name, name=self.name, id=self.id)
+
+
+class HistoryKey(t.NamedTuple):
+    """
+    Position of an entry in the change history of a setting ordered from the newest entries to the oldest ones
+    """
+
+    updated_at: datetime.datetime
+    id: int
+
 
 class SettingHistoryData(SettingData):
     is_deleted: bool
     deleted_by_db_user: str | None
+
+    @property
+    def history_key(self) -> HistoryKey:
+        return HistoryKey(updated_at=self.updated_at, id=self.id)
+
+
+class ServiceSettingsChanges(BaseModel):
+    # id of the oldest transaction in progress when the changes were read, it is passed as "since" to get the next
+    # changes
+    version: int
+    upserted: list[SettingData]
+    # names of the settings that no longer exist in the service
+    deleted: list[str]
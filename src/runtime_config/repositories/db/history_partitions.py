@@ -0,0 +1,158 @@
+import datetime
+import re
+
+from aiopg.sa import SAConnection
+from sqlalchemy import text
+
+# The change history is partitioned by months of updated_at. The entries that do not fall into any monthly partition
+# are stored in the default partition.
+DEFAULT_PARTITION = 'setting_history_default'
+
+_PARTITION_NAME_RE = re.compile(r'^setting_history_p(\d{4})(\d{2})$')
+
+
+def month_start(value: datetime.date) -> datetime.date:
+    return datetime.date(value.year, value.month, 1)
+
+
+def add_months(month: datetime.date, months: int) -> datetime.date:
+    year, month_index = divmod(month.year * 12 + month.month - 1 + months, 12)
+    return datetime.date(year, month_index + 1, 1)
+
+
+def get_partition_name(month: datetime.date) -> str:
+    return f'setting_history_p{month:%Y%m}'
+
+
+async def get_db_now(conn: SAConnection) -> datetime.datetime:
+    # updated_at is filled by the database, so its clock and time zone are used
+    return await conn.scalar(text('SELECT localtimestamp'))
+
+
+async def get_history_partitions(conn: SAConnection) -> dict[datetime.date, str]:
+    """
+    Returns the monthly partitions of the change history by their first days
+    """
+    query = text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = 'setting_history'::regclass"
+    )
+    partitions = {}
+    async for row in conn.execute(query):
+        match = _PARTITION_NAME_RE.match(row.relname)
+        if match:
+            partitions[datetime.date(int(match[1]), int(match[2]), 1)] = row.relname
+    return partitions
+
+
+async def create_history_partition(conn: SAConnection, month: datetime.date) -> str:
+    name = get_partition_name(month)
+    params = {'start': month, 'end': add_months(month, 1)}
+    async with conn.begin():
+        await conn.execute(f'CREATE TABLE {name} (LIKE setting_history INCLUDING DEFAULTS INCLUDING CONSTRAINTS);')
+        # the entries written to the default partition while the partition of their month did not exist are moved to
+        # it, otherwise the partition cannot be attached
+        await conn.execute(
+            text(
+                f'WITH moved AS ('
+                f'    DELETE FROM {DEFAULT_PARTITION} WHERE updated_at >= :start AND updated_at < :end RETURNING *'
+                f') INSERT INTO {name} SELECT * FROM moved;'
+            ),
+            params,
+        )
+        await conn.execute(
+            text(f'ALTER TABLE setting_history ATTACH PARTITION {name} FOR VALUES FROM (:start) TO (:end);'), params
+        )
+    return name
+
+
+async def create_history_partitions(conn: SAConnection, months_ahead: int) -> list[str]:
+    """
+    Creates the missing partitions of the current month and the given number of months ahead
+    """
+    current_month = month_start(await get_db_now(conn))
+    existing = await get_history_partitions(conn)
+    created = []
+    for i in range(months_ahead + 1):
+        month = add_months(current_month, i)
+        if month not in existing:
+            created.append(await create_history_partition(conn, month))
+    return created
+
+
+def _count_newer_versions(entry: str) -> str:
+    # number of the newer versions of the setting of the entry, counted up to keep_versions
+    return (
+        f'SELECT count(*) FROM ('
+        f'    SELECT 1 FROM setting_history h '
+        f'    WHERE h.service_name = {entry}.service_name AND h.name = {entry}.name '
+        f'        AND (h.updated_at, h.id) > ({entry}.updated_at, {entry}.id) '
+        f'    LIMIT :keep_versions'
+        f') newer'
+    )
+
+
+async def prune_history_partition(conn: SAConnection, name: str, keep_versions: int, drop: bool = True) -> int:
+    """
+    Detaches the partition from the change history and drops it unless drop is false. The entries that are among the
+    last keep_versions versions of their settings are moved to the default partition. Returns the number of the kept
+    entries.
+    """
+    async with conn.begin():
+        await conn.execute(
+            text(
+                f'CREATE TEMPORARY TABLE setting_history_kept AS '
+                f'SELECT e.* FROM {name} e WHERE ({_count_newer_versions("e")}) < :keep_versions;'
+            ),
+            {'keep_versions': keep_versions},
+        )
+        await conn.execute(f'ALTER TABLE setting_history DETACH PARTITION {name};')
+        kept = await conn.scalar(
+            'WITH kept AS (INSERT INTO setting_history SELECT * FROM setting_history_kept RETURNING 1) '
+            'SELECT count(*) FROM kept;'
+        )
+        await conn.execute('DROP TABLE setting_history_kept;')
+        if drop:
+            await conn.execute(f'DROP TABLE {name};')
+    return kept
+
+
+async def prune_default_history_partition(
+    conn: SAConnection, expired_before: datetime.datetime, keep_versions: int
+) -> int:
+    """
+    Deletes the entries of the default partition older than the given time, except for the last keep_versions
+    versions of their settings. Returns the number of the kept entries older than the given time.
+    """
+    params = {'expired_before': expired_before, 'keep_versions': keep_versions}
+    async with conn.begin():
+        await conn.execute(
+            text(
+                f'DELETE FROM {DEFAULT_PARTITION} e '
+                f'WHERE e.updated_at < :expired_before AND ({_count_newer_versions("e")}) >= :keep_versions;'
+            ),
+            params,
+        )
+        return await conn.scalar(
+            text(f'SELECT count(*) FROM {DEFAULT_PARTITION} WHERE updated_at < :expired_before;'), params
+        )
+
+
+async def prune_history_partitions(
+    conn: SAConnection, retention_days: int, keep_versions: int, drop: bool = True
+) -> dict[str, int]:
+    """
+    Removes the partitions whose entries are all older than the retention window and the expired entries of the
+    default partition. The default partition receives the last versions kept from the removed partitions and the
+    changes of the settings last updated before the existing partitions, so it is pruned on every run. Returns the
+    numbers of the kept entries by the names of the pruned partitions.
+    """
+    expired_before = await get_db_now(conn) - datetime.timedelta(days=retention_days)
+    pruned = {}
+    for month, name in sorted((await get_history_partitions(conn)).items()):
+        if datetime.datetime.combine(add_months(month, 1), datetime.time()) <= expired_before:
+            pruned[name] = await prune_history_partition(conn, name, keep_versions=keep_versions, drop=drop)
+    pruned[DEFAULT_PARTITION] = await prune_default_history_partition(
+        conn, expired_before=expired_before, keep_versions=keep_versions
+    )
+    return pruned
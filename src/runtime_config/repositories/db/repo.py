@@ -1,19 +1,50 @@
 import typing as t
 
+import psycopg2.errors
 from aiopg.sa import SAConnection
-from sqlalchemy import delete, desc, insert, select, update
+from sqlalchemy import (
+    Boolean,
+    and_,
+    any_,
+    case,
+    cast,
+    column,
+    delete,
+    desc,
+    exists,
+    insert,
+    literal,
+    select,
+    true,
+    tuple_,
+    update,
+    values,
+)
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.postgresql.psycopg2 import PGDialect_psycopg2
 from sqlalchemy.sql.expression import literal_column
 
+from runtime_config.enums.settings import SearchMode
+from runtime_config.lib.metrics import track_query_duration, track_query_stream_duration
 from runtime_config.models import Setting, SettingHistory
-from runtime_config.repositories.db.entities import SettingData, SettingHistoryData
+from runtime_config.repositories.db.entities import (
+    HistoryKey,
+    ServiceSettingsChanges,
+    SettingData,
+    SettingHistoryData,
+    SettingKey,
+)
 
 
-async def delete_setting(conn: SAConnection, setting_id: int) -> bool:
-    query = delete(Setting).where(Setting.id == setting_id).returning(Setting.id)
-    deleted_row_id = await (await conn.execute(query)).fetchone()
-    return bool(deleted_row_id)
+@track_query_duration
+async def delete_setting(conn: SAConnection, setting_id: int) -> SettingData | None:
+    query = delete(Setting).where(Setting.id == setting_id).returning(literal_column('*'))
+    row = await (await conn.execute(query)).fetchone()
+    return SettingData(**row) if row else None
 
 
+@track_query_duration
 async def create_new_setting(conn: SAConnection, values: dict[str, t.Any]) -> SettingData | None:
     query = (
         insert(Setting)
@@ -39,16 +70,120 @@ async def create_new_setting(conn: SAConnection, values: dict[str, t.Any]) -> Se
     return created_setting
 
 
+@track_query_duration
 async def edit_setting(conn: SAConnection, setting_id: int, values: dict[str, t.Any]) -> SettingData | None:
     query = update(Setting).where(Setting.id == setting_id).values(values).returning(literal_column('*'))
     row = await (await conn.execute(query)).fetchone()
     return SettingData(**row) if row else None
 
 
+@track_query_duration
+async def create_new_settings(conn: SAConnection, values: list[dict[str, t.Any]]) -> list[SettingData]:
+    """
+    Creates the settings by one statement. The settings whose names are already taken in their services are skipped,
+    only the created settings are returned.
+    """
+    if not values:
+        return []
+
+    query = (
+        pg_insert(Setting)
+        .values(values)
+        .on_conflict_do_nothing(constraint='unique_setting_name_per_service')
+        .returning(*Setting.__table__.columns)
+    )
+    return [SettingData(**row) async for row in conn.execute(query)]
+
+
+_EDITABLE_COLUMNS = ('name', 'value', 'value_type', 'is_disabled', 'service_name')
+
+
+@track_query_duration
+async def edit_settings(conn: SAConnection, edits: dict[int, dict[str, t.Any]]) -> tuple[list[SettingData], set[int]]:
+    """
+    Changes the given values of the settings by their ids by one statement, the values of each setting may differ and
+    so may the changed columns. Returns the found settings and the ids of the settings not changed because their new
+    names are taken, the other settings are changed anyway.
+    """
+    async with conn.begin_nested():
+        try:
+            async with conn.begin_nested():
+                return await _update_settings(conn, edits), set()
+        except psycopg2.errors.UniqueViolation:
+            pass
+
+        # it is not known which of the settings has a taken name, so they are changed one by one to find out
+        edited = []
+        conflicting = set()
+        for setting_id, setting_values in edits.items():
+            try:
+                async with conn.begin_nested():
+                    edited += await _update_settings(conn, {setting_id: setting_values})
+            except psycopg2.errors.UniqueViolation:
+                conflicting.add(setting_id)
+        return edited, conflicting
+
+
+async def _update_settings(conn: SAConnection, edits: dict[int, dict[str, t.Any]]) -> list[SettingData]:
+    if not edits:
+        return []
+
+    columns = [column('id', Setting.id.type)]
+    for name in _EDITABLE_COLUMNS:
+        columns += [column(name, getattr(Setting, name).type), column(f'set_{name}', Boolean)]
+    rows = [
+        (setting_id, *(item for name in _EDITABLE_COLUMNS for item in (values.get(name), name in values)))
+        for setting_id, values in edits.items()
+    ]
+    edited = values(*columns, name='edited').data(rows)
+
+    query = (
+        update(Setting)
+        .where(Setting.id == edited.c.id)
+        .values(
+            {
+                # the parameters of VALUES have no types, so the values are cast to the types of the columns
+                name: case(
+                    (edited.c[f'set_{name}'], cast(edited.c[name], getattr(Setting, name).type)),
+                    else_=getattr(Setting, name),
+                )
+                for name in _EDITABLE_COLUMNS
+            }
+        )
+        .returning(*Setting.__table__.columns)
+    )
+    return [SettingData(**row) async for row in conn.execute(query)]
+
+
+@track_query_duration
+async def delete_settings(conn: SAConnection, setting_ids: list[int]) -> list[SettingData]:
+    """
+    Deletes the settings by their ids by one statement, only the found settings are returned
+    """
+    if not setting_ids:
+        return []
+
+    query = (
+        delete(Setting)
+        .where(Setting.id == any_(literal(setting_ids, ARRAY(Setting.id.type))))
+        .returning(*Setting.__table__.columns)
+    )
+    return [SettingData(**row) async for row in conn.execute(query)]
+
+
+@track_query_duration
 async def get_setting(
-    conn: SAConnection, setting_id: int, include_history: bool = False
+    conn: SAConnection,
+    setting_id: int,
+    include_history: bool = False,
+    history_limit: int | None = None,
+    history_before: HistoryKey | None = None,
 ) -> tuple[SettingData | None, list[SettingHistoryData]]:
-    query = select(
+    """
+    The setting and its change history from the newest entries to the oldest ones are read in one query. The next
+    page of the history starts before the key of the last entry of the previous page.
+    """
+    setting_columns = [
         Setting.id,
         Setting.name,
         Setting.value,
@@ -57,42 +192,81 @@ async def get_setting(
         Setting.service_name,
         Setting.created_by_db_user,
         Setting.updated_at,
-    ).where(Setting.id == setting_id)
+    ]
+    if not include_history:
+        row = await (await conn.execute(select(setting_columns).where(Setting.id == setting_id))).fetchone()
+        return (SettingData(**row) if row is not None else None), []
 
-    row = await (await conn.execute(query)).fetchone()
-    found_setting = None
-    if row is not None:
-        found_setting = SettingData(**row)
+    history_query = (
+        select(
+            SettingHistory.id,
+            SettingHistory.name,
+            SettingHistory.value,
+            SettingHistory.value_type,
+            SettingHistory.is_disabled,
+            SettingHistory.service_name,
+            SettingHistory.created_by_db_user,
+            SettingHistory.updated_at,
+            SettingHistory.is_deleted,
+            SettingHistory.deleted_by_db_user,
+        )
+        .where(
+            SettingHistory.name == Setting.name,
+            SettingHistory.service_name == Setting.service_name,
+        )
+        .order_by(desc(SettingHistory.updated_at), desc(SettingHistory.id))
+        .limit(history_limit)
+    )
+    if history_before is not None:
+        history_query = history_query.where(
+            tuple_(SettingHistory.updated_at, SettingHistory.id) < tuple_(*history_before)  # type: ignore[type-var]
+        )
+    history = history_query.lateral('history')
 
+    query = (
+        select(setting_columns + [column.label(f'history_{column.name}') for column in history.c])
+        .select_from(Setting.__table__.outerjoin(history, true()))
+        .where(Setting.id == setting_id)
+        .order_by(desc(history.c.updated_at), desc(history.c.id))
+    )
+
+    found_setting = None
     history_rows = []
-    if include_history and found_setting:
-        query_history = (
-            select(
-                SettingHistory.id,
-                SettingHistory.name,
-                SettingHistory.value,
-                SettingHistory.value_type,
-                SettingHistory.is_disabled,
-                SettingHistory.service_name,
-                SettingHistory.created_by_db_user,
-                SettingHistory.updated_at,
-                SettingHistory.is_deleted,
-                SettingHistory.deleted_by_db_user,
-            )
-            .where(
-                SettingHistory.name == found_setting.name,
-                SettingHistory.service_name == found_setting.service_name,
+    async for row in conn.execute(query):
+        if found_setting is None:
+            found_setting = SettingData(**{field: row[field] for field in SettingData.__fields__})
+        if row['history_id'] is not None:
+            history_rows.append(
+                SettingHistoryData(**{field: row[f'history_{field}'] for field in SettingHistoryData.__fields__})
             )
-            .order_by(desc(SettingHistory.updated_at))
-        )
-        history_rows = [SettingHistoryData(**row) async for row in conn.execute(query_history)]
 
     return found_setting, history_rows
 
 
+_SNAPSHOT_XMIN_QUERY = 'SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint'
+
+
+def _escape_like(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+@track_query_stream_duration
 async def search_settings(
-    conn: SAConnection, name: str | None, service_name: str | None, offset: int = 0, limit: int = 30
+    conn: SAConnection,
+    name: str | None,
+    service_name: str | None,
+    offset: int = 0,
+    limit: int = 30,
+    search_mode: SearchMode = SearchMode.substring,
+    after: SettingKey | None = None,
 ) -> t.AsyncIterable[SettingData]:
+    """
+    Each search mode is served by its own index: the exact search by the unique constraint, the prefix search by
+    the text_pattern_ops index and the substring search by the trigram index.
+
+    The settings are ordered by service name, name and id. The next page starts after the key of the last setting of
+    the previous page, it is found by the index as fast as the first page unlike the offset.
+    """
     query = (
         select(
             Setting.id,
@@ -104,12 +278,24 @@ async def search_settings(
             Setting.created_by_db_user,
             Setting.updated_at,
         )
+        .order_by(Setting.service_name, Setting.name, Setting.id)
         .offset(offset)
         .limit(limit)
     )
 
+    if after is not None:
+        query = query.where(
+            tuple_(Setting.service_name, Setting.name, Setting.id)  # type: ignore[type-var]
+            > tuple_(*after)  # type: ignore[type-var]
+        )
+
     if name is not None:
-        query = query.where(Setting.name.like(f'%{name}%'))
+        if search_mode == SearchMode.exact:
+            query = query.where(Setting.name == name)
+        elif search_mode == SearchMode.prefix:
+            query = query.where(Setting.name.like(f'{_escape_like(name)}%'))
+        else:
+            query = query.where(Setting.name.like(f'%{_escape_like(name)}%'))
 
     if service_name is not None:
         query = query.where(Setting.service_name == service_name)
@@ -118,9 +304,14 @@ async def search_settings(
         yield SettingData(**row)
 
 
+@track_query_stream_duration
 async def get_service_settings(
-    conn: SAConnection, service_name: str, offset: int = 0, limit: int | None = None
+    conn: SAConnection, service_name: str, offset: int = 0, limit: int | None = None, batch_size: int | None = None
 ) -> t.AsyncIterable[SettingData]:
+    """
+    Without the batch size all settings are read at once. With it they are read through a server-side cursor by
+    batches of the given size, so only one batch is held in memory at a time.
+    """
     query = (
         select(
             Setting.id,
@@ -133,10 +324,86 @@ async def get_service_settings(
             Setting.updated_at,
         )
         .where(Setting.service_name == service_name)
+        .order_by(Setting.name, Setting.id)
         .offset(offset)
     )
     if limit:
         query = query.limit(limit)
 
+    if batch_size is None:
+        async for row in conn.execute(query):
+            yield SettingData(**row)
+        return
+
+    compiled = query.compile(dialect=PGDialect_psycopg2())
+    async with conn.begin():
+        await conn.execute(f'DECLARE service_settings_cursor NO SCROLL CURSOR FOR {compiled}', compiled.params)
+        while True:
+            rows = await (await conn.execute(f'FETCH FORWARD {batch_size} FROM service_settings_cursor')).fetchall()
+            for row in rows:
+                yield SettingData(**row)
+            if len(rows) < batch_size:
+                break
+        await conn.execute('CLOSE service_settings_cursor')
+
+
+@track_query_stream_duration
+async def get_settings_of_services(conn: SAConnection, service_names: list[str]) -> t.AsyncIterable[SettingData]:
+    query = (
+        select(
+            Setting.id,
+            Setting.name,
+            Setting.value,
+            Setting.value_type,
+            Setting.is_disabled,
+            Setting.service_name,
+            Setting.created_by_db_user,
+            Setting.updated_at,
+        )
+        .where(Setting.service_name == any_(literal(service_names, ARRAY(Setting.service_name.type))))
+        .order_by(Setting.service_name, Setting.name, Setting.id)
+    )
     async for row in conn.execute(query):
         yield SettingData(**row)
+
+
+@track_query_duration
+async def get_service_settings_changes(conn: SAConnection, service_name: str, since: int) -> ServiceSettingsChanges:
+    """
+    Returns the changes made by the transactions with ids not less than the given one. The returned version is the
+    id of the oldest transaction in progress, all transactions before it have finished and their changes have been
+    returned, the changes of the transactions in progress will be returned by the next request. The changes of the
+    transactions committed after that one may be returned again.
+    """
+    query_upserted = select(
+        Setting.id,
+        Setting.name,
+        Setting.value,
+        Setting.value_type,
+        Setting.is_disabled,
+        Setting.service_name,
+        Setting.created_by_db_user,
+        Setting.updated_at,
+    ).where(Setting.service_name == service_name, Setting.change_xid >= since)
+
+    # a setting is considered deleted from the service if it has a history entry (deletion, renaming or moving to
+    # another service) made after the given change, but the service no longer has a setting with that name
+    query_deleted = (
+        select(SettingHistory.name)
+        .where(SettingHistory.service_name == service_name, SettingHistory.change_xid >= since)
+        .where(
+            ~exists().where(
+                and_(Setting.service_name == SettingHistory.service_name, Setting.name == SettingHistory.name)
+            )
+        )
+        .distinct()
+    )
+
+    # the snapshot is taken by the first query, so the queries see the changes of the transactions it lists as
+    # finished and only them
+    async with conn.begin(isolation_level='REPEATABLE READ', readonly=True):
+        version = await conn.scalar(_SNAPSHOT_XMIN_QUERY)
+        upserted = [SettingData(**row) async for row in conn.execute(query_upserted)]
+        deleted = [row.name async for row in conn.execute(query_deleted)]
+
+    return ServiceSettingsChanges(version=version, upserted=upserted, deleted=deleted)
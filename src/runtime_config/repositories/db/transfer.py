@@ -0,0 +1,153 @@
+import typing as t
+
+from psycopg2.extensions import connection as PgConnection
+from psycopg2.sql import SQL, Literal
+
+from runtime_config.enums.settings import SettingsFileFormat
+
+# columns of the settings moved between the environments, the ids and the authors of the changes are not moved
+COLUMNS = ('service_name', 'name', 'value', 'value_type', 'is_disabled')
+
+# With these options COPY in the CSV format reads and writes the lines as they are, JSON documents cannot contain
+# either of the characters unescaped
+_RAW_LINES_OPTIONS = "FORMAT csv, QUOTE e'\\x01', DELIMITER e'\\x02'"
+
+
+class ImportResult(t.NamedTuple):
+    created: int
+    updated: int
+    deleted: int
+
+
+class ProgressFile:
+    """
+    Wraps a binary file to report the number of bytes read from it or written to it by COPY
+    """
+
+    def __init__(self, file: t.BinaryIO, on_progress: t.Callable[[int], None] | None = None) -> None:
+        self.file = file
+        self.on_progress = on_progress
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.file.read(size)
+        if self.on_progress is not None:
+            self.on_progress(len(data))
+        return data
+
+    def readline(self, size: int = -1) -> bytes:
+        data = self.file.readline(size)
+        if self.on_progress is not None:
+            self.on_progress(len(data))
+        return data
+
+    def write(self, data: bytes) -> int:
+        written = self.file.write(data)
+        if self.on_progress is not None:
+            self.on_progress(len(data))
+        return written
+
+
+def export_settings(
+    conn: PgConnection,
+    file: t.BinaryIO,
+    service_names: t.Sequence[str],
+    file_format: SettingsFileFormat,
+    on_progress: t.Callable[[int], None] | None = None,
+) -> int:
+    """
+    Writes the settings of the services (of all services if none are given) to the file by COPY, so the settings are
+    streamed from the database without being held in memory. The file is written in the client encoding of the
+    connection. Returns the number of the exported settings.
+    """
+    query = SQL('SELECT {columns} FROM setting').format(columns=SQL(', ').join(map(SQL, COLUMNS)))
+    if service_names:
+        query += SQL(' WHERE service_name = ANY({service_names})').format(service_names=Literal(list(service_names)))
+    query += SQL(' ORDER BY service_name, name')
+
+    if file_format == SettingsFileFormat.ndjson:
+        copy = SQL('COPY (SELECT row_to_json(s) FROM ({query}) s) TO STDOUT WITH ({options})').format(
+            query=query, options=SQL(_RAW_LINES_OPTIONS)
+        )
+    else:
+        copy = SQL('COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER true)').format(query=query)
+
+    with conn.cursor() as cursor:
+        cursor.copy_expert(copy, ProgressFile(file, on_progress))
+        return cursor.rowcount
+
+
+def import_settings(
+    conn: PgConnection,
+    file: t.BinaryIO,
+    file_format: SettingsFileFormat,
+    replace: bool = False,
+    on_progress: t.Callable[[int], None] | None = None,
+) -> ImportResult:
+    """
+    Loads the settings from the file into a staging table by COPY and merges them into the settings by a few
+    statements in one transaction. The settings with the same names are updated only if they differ, so no history
+    entries are made for the unchanged ones. If replace is true, the settings of the imported services that are
+    missing from the file are deleted. The transaction is committed by the caller.
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(
+            'CREATE TEMPORARY TABLE setting_import ('
+            '    line bigserial, service_name text, name text, value text, value_type text, is_disabled boolean'
+            ');'
+        )
+        if file_format == SettingsFileFormat.ndjson:
+            # the lines are loaded as text, so the empty ones (e.g. at the end of the file) are skipped before parsing
+            cursor.execute('CREATE TEMPORARY TABLE setting_import_raw (doc text);')
+            cursor.copy_expert(
+                SQL('COPY setting_import_raw (doc) FROM STDIN WITH ({options})').format(
+                    options=SQL(_RAW_LINES_OPTIONS)
+                ),
+                ProgressFile(file, on_progress),
+            )
+            cursor.execute(
+                SQL(
+                    'INSERT INTO setting_import ({columns}) '
+                    'SELECT {columns} FROM ('
+                    "    SELECT doc::json AS doc FROM setting_import_raw WHERE btrim(doc, e' \\t') <> ''"
+                    ') raw, json_populate_record(null::setting_import, raw.doc);'
+                ).format(columns=SQL(', ').join(map(SQL, COLUMNS)))
+            )
+        else:
+            cursor.copy_expert(
+                SQL('COPY setting_import ({columns}) FROM STDIN WITH (FORMAT csv, HEADER true)').format(
+                    columns=SQL(', ').join(map(SQL, COLUMNS))
+                ),
+                ProgressFile(file, on_progress),
+            )
+
+        deleted = 0
+        if replace:
+            cursor.execute(
+                'DELETE FROM setting s '
+                'WHERE s.service_name IN (SELECT service_name FROM setting_import) '
+                '    AND NOT EXISTS ('
+                '        SELECT 1 FROM setting_import i WHERE i.service_name = s.service_name AND i.name = s.name'
+                '    );'
+            )
+            deleted = cursor.rowcount
+
+        # the last of the lines with the same setting wins
+        cursor.execute(
+            'WITH merged AS ('
+            '    INSERT INTO setting (service_name, name, value, value_type, is_disabled) '
+            '    SELECT DISTINCT ON (service_name, name) '
+            '        service_name, name, value, value_type::settingvaluetype, coalesce(is_disabled, false) '
+            '    FROM setting_import '
+            '    ORDER BY service_name, name, line DESC '
+            '    ON CONFLICT ON CONSTRAINT unique_setting_name_per_service DO UPDATE '
+            '    SET value = excluded.value, value_type = excluded.value_type, is_disabled = excluded.is_disabled '
+            '    WHERE (setting.value, setting.value_type, setting.is_disabled) '
+            '        IS DISTINCT FROM (excluded.value, excluded.value_type, excluded.is_disabled) '
+            '    RETURNING xmax = 0 AS created'
+            ') '
+            'SELECT count(*) FILTER (WHERE created), count(*) FILTER (WHERE NOT created) FROM merged;'
+        )
+        created, updated = cursor.fetchone() or (0, 0)
+        cursor.execute('DROP TABLE IF EXISTS setting_import, setting_import_raw;')
+
+    return ImportResult(created=created, updated=updated, deleted=deleted)
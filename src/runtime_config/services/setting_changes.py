@@ -0,0 +1,84 @@
+import asyncio
+
+from pydantic.networks import PostgresDsn
+from structlog import get_logger
+
+from runtime_config.lib.db import ConnAcquirer
+from runtime_config.lib.events import KeyedEvents
+from runtime_config.lib.exception import ServiceInstanceNotFound
+from runtime_config.lib.pg_listener import PgListener
+from runtime_config.services import settings_cache
+from runtime_config.services.settings_cache import ServiceSettingsSnapshot
+
+logger = get_logger(__name__)
+
+SETTING_CHANGED_CHANNEL = 'setting_changed'
+
+_inst: dict[str, PgListener] = {}
+
+_service_changes = KeyedEvents()
+
+
+def get_setting_listener() -> PgListener:
+    try:
+        return _inst['setting_listener']
+    except KeyError:
+        raise ServiceInstanceNotFound('setting_listener')
+
+
+def on_setting_changed(service_name: str) -> None:
+    if service_name:
+        settings_cache.invalidate_service_settings(service_name)
+        _service_changes.notify(service_name)
+    else:
+        on_all_settings_changed()
+
+
+def on_all_settings_changed() -> None:
+    settings_cache.invalidate_all_service_settings()
+    _service_changes.notify_all()
+
+
+async def wait_for_service_snapshot(
+    acquire_db_conn: ConnAcquirer, service_name: str, version: str | None, timeout: float
+) -> ServiceSettingsSnapshot:
+    """
+    Returns the snapshot of the service settings as soon as its version differs from the given one or when the
+    timeout expires. No database connection is held while waiting.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while True:
+        # the subscription is made before reading the snapshot so as not to miss a change made during the reading
+        with _service_changes.subscribe(service_name) as changed:
+            snapshot = await settings_cache.get_service_snapshot(
+                acquire_db_conn=acquire_db_conn, service_name=service_name
+            )
+            remaining = deadline - loop.time()
+            if snapshot.version != version or remaining <= 0:
+                return snapshot
+
+            try:
+                await asyncio.wait_for(changed.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                return snapshot
+
+
+async def init_setting_listener(dsn: PostgresDsn) -> PgListener:
+    listener = PgListener(dsn=dsn, channel=SETTING_CHANGED_CHANNEL)
+    listener.add_handler(on_setting_changed)
+    # changes made while the listener was disconnected are unknown, so everything is considered changed
+    listener.add_connect_handler(on_all_settings_changed)
+    await listener.start()
+    _inst['setting_listener'] = listener
+    return listener
+
+
+async def close_setting_listener() -> None:
+    try:
+        listener = _inst.pop('setting_listener')
+    except KeyError:
+        logger.warning('Setting listener has not been initialized, cannot stop it')
+    else:
+        await listener.stop()
+        logger.info('Setting listener stopped')
@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import typing as t
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+from structlog import get_logger
+
+from runtime_config.lib.db import ConnAcquirer, get_db_conn_acquirer
+from runtime_config.lib.exception import ServiceInstanceNotFound
+from runtime_config.repositories.db.entities import SettingData
+from runtime_config.services import settings_cache
+from runtime_config.services.setting_changes import get_setting_listener
+from runtime_config.services.settings_cache import ServiceSettingsSnapshot
+
+logger = get_logger(__name__)
+
+
+@dataclass(frozen=True)
+class ServiceSettingsChange:
+    snapshot: ServiceSettingsSnapshot
+    upserted: list[SettingData]
+    deleted: list[SettingData]
+
+    @classmethod
+    def create(cls, previous: ServiceSettingsSnapshot, current: ServiceSettingsSnapshot) -> ServiceSettingsChange:
+        previous_settings = {setting.id: setting for setting in previous.settings}
+        current_ids = {setting.id for setting in current.settings}
+        return cls(
+            snapshot=current,
+            upserted=[setting for setting in current.settings if previous_settings.get(setting.id) != setting],
+            deleted=[setting for setting in previous.settings if setting.id not in current_ids],
+        )
+
+
+@dataclass(eq=False)
+class Subscription:
+    service_names: list[str]
+    queue: asyncio.Queue[ServiceSettingsChange]
+    # set when the subscriber does not keep up with the changes and some of them were dropped
+    overflowed: bool = field(default=False)
+
+    def put(self, change: ServiceSettingsChange) -> None:
+        try:
+            self.queue.put_nowait(change)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+
+class SettingsBroadcaster:
+    """
+    Fans out the changes of service settings to all subscribers of the worker. The settings of a changed service
+    are read once per notification regardless of the number of subscribers, the difference with the previous
+    version is computed once too.
+    """
+
+    def __init__(self, acquire_db_conn: ConnAcquirer, heartbeat_interval: float, max_queue_size: int = 100) -> None:
+        self.acquire_db_conn = acquire_db_conn
+        self.heartbeat_interval = heartbeat_interval
+        self.max_queue_size = max_queue_size
+        self._subscriptions: defaultdict[str, set[Subscription]] = defaultdict(set)
+        self._snapshots: dict[str, ServiceSettingsSnapshot] = {}
+        # numbers of the reads of the settings in the order they were started, the snapshot of a service is replaced
+        # only by a snapshot whose reading started later
+        self._reads = itertools.count()
+        self._snapshot_reads: dict[str, int] = {}
+        self._refresh_tasks: dict[str, asyncio.Task[None]] = {}
+        self._outdated: set[str] = set()
+
+    async def subscribe(self, service_names: t.Sequence[str]) -> Subscription:
+        subscription = Subscription(service_names=list(service_names), queue=asyncio.Queue(self.max_queue_size))
+        for service_name in subscription.service_names:
+            self._subscriptions[service_name].add(subscription)
+
+        try:
+            for service_name in subscription.service_names:
+                if service_name not in self._snapshots:
+                    read = next(self._reads)
+                    snapshot = await settings_cache.get_service_snapshot(
+                        acquire_db_conn=self.acquire_db_conn, service_name=service_name
+                    )
+                    # a change may have been read while the snapshot was being read, the newer one is kept
+                    self._keep_newer(service_name, snapshot, read)
+        except BaseException:
+            self.unsubscribe(subscription)
+            raise
+
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        for service_name in subscription.service_names:
+            subscribers = self._subscriptions.get(service_name)
+            if subscribers is None:
+                continue
+
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscriptions[service_name]
+                self._snapshots.pop(service_name, None)
+                self._snapshot_reads.pop(service_name, None)
+
+    def get_snapshot(self, service_name: str) -> ServiceSettingsSnapshot:
+        return self._snapshots[service_name]
+
+    def on_setting_changed(self, service_name: str) -> None:
+        if not service_name:
+            self.on_all_settings_changed()
+        elif service_name in self._subscriptions:
+            self._schedule_refresh(service_name)
+
+    def on_all_settings_changed(self) -> None:
+        for service_name in list(self._subscriptions):
+            self._schedule_refresh(service_name)
+
+    async def close(self) -> None:
+        tasks = list(self._refresh_tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _schedule_refresh(self, service_name: str) -> None:
+        if service_name in self._refresh_tasks:
+            # the settings may have been read before the change was committed, so they are read again afterwards
+            self._outdated.add(service_name)
+            return
+
+        task = asyncio.create_task(self._refresh(service_name))
+        self._refresh_tasks[service_name] = task
+        task.add_done_callback(lambda _: self._on_refresh_done(service_name))
+
+    def _on_refresh_done(self, service_name: str) -> None:
+        del self._refresh_tasks[service_name]
+        if service_name in self._outdated:
+            self._outdated.discard(service_name)
+            if service_name in self._subscriptions:
+                self._schedule_refresh(service_name)
+
+    def _keep_newer(self, service_name: str, snapshot: ServiceSettingsSnapshot, read: int) -> bool:
+        if self._snapshot_reads.get(service_name, -1) > read:
+            return False
+
+        self._snapshots[service_name] = snapshot
+        self._snapshot_reads[service_name] = read
+        return True
+
+    async def _refresh(self, service_name: str) -> None:
+        read = next(self._reads)
+        try:
+            snapshot = await settings_cache.get_service_snapshot(
+                acquire_db_conn=self.acquire_db_conn, service_name=service_name
+            )
+        except Exception:
+            logger.exception('Failed to read the changed settings of the service', service_name=service_name)
+            return
+
+        if service_name not in self._subscriptions:
+            return
+
+        # the snapshot is stored even if the first snapshot of the service is still being read by subscribe, which
+        # then keeps this newer one
+        previous = self._snapshots.get(service_name)
+        if (
+            not self._keep_newer(service_name, snapshot, read)
+            or previous is None
+            or previous.version == snapshot.version
+        ):
+            return
+
+        change = ServiceSettingsChange.create(previous=previous, current=snapshot)
+        for subscription in self._subscriptions[service_name]:
+            subscription.put(change)
+
+
+_inst: dict[str, SettingsBroadcaster] = {}
+
+
+def get_settings_broadcaster() -> SettingsBroadcaster:
+    try:
+        return _inst['settings_broadcaster']
+    except KeyError:
+        raise ServiceInstanceNotFound('settings_broadcaster')
+
+
+async def init_settings_broadcaster(heartbeat_interval: float) -> SettingsBroadcaster:
+    broadcaster = SettingsBroadcaster(acquire_db_conn=get_db_conn_acquirer(), heartbeat_interval=heartbeat_interval)
+    listener = get_setting_listener()
+    listener.add_handler(broadcaster.on_setting_changed)
+    listener.add_connect_handler(broadcaster.on_all_settings_changed)
+    _inst['settings_broadcaster'] = broadcaster
+    return broadcaster
+
+
+async def close_settings_broadcaster() -> None:
+    try:
+        broadcaster = _inst.pop('settings_broadcaster')
+    except KeyError:
+        logger.warning('Settings broadcaster has not been initialized, cannot close it')
+    else:
+        await broadcaster.close()
+        logger.info('Settings broadcaster closed')
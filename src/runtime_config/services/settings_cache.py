@@ -0,0 +1,382 @@
+from __future__ import annotations
+
+import asyncio
+import bisect
+import hashlib
+import json
+import os
+import tempfile
+import time
+import typing as t
+from dataclasses import dataclass, field
+from functools import cached_property, partial
+from pathlib import Path
+from urllib.parse import quote
+
+import psycopg2
+from structlog import get_logger
+
+from runtime_config.lib.cache import TTLCache
+from runtime_config.lib.compression import Compressor
+from runtime_config.lib.db import ConnAcquirer
+from runtime_config.lib.exception import DatabaseUnavailable, ServiceInstanceNotFound
+from runtime_config.lib.serialization import dumps
+from runtime_config.lib.single_flight import SingleFlight
+from runtime_config.repositories.db import repo as db_repo
+from runtime_config.repositories.db.entities import SettingData, SettingKey
+
+logger = get_logger(__name__)
+
+# errors of reading the settings after which the last known settings are served
+DB_UNAVAILABLE_ERRORS = (DatabaseUnavailable, psycopg2.OperationalError, asyncio.TimeoutError)
+
+
+def to_legacy_dict(setting: SettingData) -> dict[str, t.Any]:
+    return {
+        'name': setting.name,
+        'value': setting.value,
+        'value_type': setting.value_type.value,
+        'disable': setting.is_disabled,
+    }
+
+
+@dataclass(frozen=True)
+class ServiceSettingsSnapshot:
+    service_name: str
+    # ordered by name and id
+    settings: list[SettingData]
+    # hash of the contents of all settings of the service, changes whenever any of them changes
+    version: str
+    # unix time of reading the settings from the database
+    loaded_at: float = field(default_factory=time.time, compare=False)
+    # compressed encoded bodies by the name of the body and the encoding
+    _compressed: dict[tuple[str, str], bytes] = field(default_factory=dict, init=False, repr=False, compare=False)
+
+    @classmethod
+    def create(cls, service_name: str, settings: list[SettingData]) -> ServiceSettingsSnapshot:
+        # sorted here rather than by the database, so the pages can be looked up by comparing the keys in python
+        # regardless of the collation of the database
+        settings = sorted(settings, key=lambda setting: (setting.name, setting.id))
+        digest = hashlib.blake2b(digest_size=16)
+        for setting in settings:
+            digest.update(
+                repr(
+                    (
+                        setting.id,
+                        setting.name,
+                        setting.value,
+                        setting.value_type.value,
+                        setting.is_disabled,
+                        setting.created_by_db_user,
+                        setting.updated_at.isoformat(),
+                    )
+                ).encode()
+            )
+        return cls(service_name=service_name, settings=settings, version=digest.hexdigest())
+
+    @cached_property
+    def legacy_json(self) -> bytes:
+        """
+        Settings in the format of the deprecated /get_settings endpoint encoded in the same way as FastAPI does it.
+        Encoded once per version of the settings, so serving a cached snapshot does not require any work per setting.
+        """
+        return dumps([to_legacy_dict(setting) for setting in self.settings])
+
+    @cached_property
+    def _keys(self) -> list[tuple[str, int]]:
+        return [(setting.name, setting.id) for setting in self.settings]
+
+    def get_page(self, limit: int, after: SettingKey | None = None) -> list[SettingData]:
+        """
+        Returns the settings following the given key, it is not necessary for the setting of the key to still exist
+        """
+        start = bisect.bisect_right(self._keys, (after.name, after.id)) if after is not None else 0
+        return self.settings[start : start + limit]
+
+    @cached_property
+    def settings_json(self) -> bytes:
+        return dumps(self.settings)
+
+    def dump(self) -> bytes:
+        return dumps(
+            {
+                'service_name': self.service_name,
+                'version': self.version,
+                'loaded_at': self.loaded_at,
+                'settings': self.settings,
+            }
+        )
+
+    @classmethod
+    def load(cls, data: bytes) -> ServiceSettingsSnapshot:
+        snapshot = json.loads(data)
+        return cls(
+            service_name=snapshot['service_name'],
+            settings=[SettingData(**setting) for setting in snapshot['settings']],
+            version=snapshot['version'],
+            loaded_at=snapshot['loaded_at'],
+        )
+
+    def compress(
+        self, body: t.Literal['legacy_json', 'settings_json'], encoding: str, compressor: Compressor
+    ) -> bytes:
+        """
+        Returns the encoded body compressed with the given encoding, it is compressed once per version of the settings
+        """
+        key = (body, encoding)
+        try:
+            return self._compressed[key]
+        except KeyError:
+            compressed = self._compressed[key] = compressor.compress(getattr(self, body), encoding)
+            return compressed
+
+
+class SnapshotFallback:
+    """
+    Last known settings of the services, they are served when the settings cannot be read from the database in time.
+    If the directory is given, they are also saved to files, so they survive the restart of the application.
+    """
+
+    def __init__(self, max_size: int, stale_timeout: float, directory: Path | None = None) -> None:
+        self.stale_timeout = stale_timeout
+        self.directory = directory
+        self._snapshots: TTLCache[str, ServiceSettingsSnapshot] = TTLCache(max_size=max_size)
+
+    def get(self, service_name: str) -> ServiceSettingsSnapshot | None:
+        return self._snapshots.get(service_name)
+
+    async def remember(self, snapshot: ServiceSettingsSnapshot) -> None:
+        previous = self._snapshots.get(snapshot.service_name)
+        self._snapshots.set(snapshot.service_name, snapshot)
+        if self.directory is not None and (previous is None or previous.version != snapshot.version):
+            try:
+                await asyncio.to_thread(self._save, self.directory, snapshot)
+            except OSError:
+                logger.exception('Failed to save the last known settings', service_name=snapshot.service_name)
+
+    def restore(self) -> None:
+        if self.directory is None or not self.directory.is_dir():
+            return
+
+        for path in self.directory.glob('*.json'):
+            try:
+                snapshot = ServiceSettingsSnapshot.load(path.read_bytes())
+            except (OSError, ValueError, KeyError, TypeError):
+                logger.warning('Failed to restore the last known settings', path=str(path))
+                continue
+            self._snapshots.set(snapshot.service_name, snapshot)
+
+    @staticmethod
+    def _save(directory: Path, snapshot: ServiceSettingsSnapshot) -> None:
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f'{quote(snapshot.service_name, safe="")}.json'
+        # written to a temporary file and renamed, so a partially written file is never read. The name of the
+        # temporary file is unique, so the snapshots of the same service saved concurrently do not mix up.
+        with tempfile.NamedTemporaryFile(dir=directory, prefix=f'.{path.stem}.', suffix='.tmp', delete=False) as file:
+            try:
+                file.write(snapshot.dump())
+                file.flush()
+                os.fsync(file.fileno())
+            except BaseException:
+                os.unlink(file.name)
+                raise
+        os.replace(file.name, path)
+
+
+_inst: dict[str, TTLCache[str, ServiceSettingsSnapshot]] = {}
+_fallback: dict[str, SnapshotFallback] = {}
+
+# time after which the settings of a changed service are reloaded once more in seconds
+_reload_delay: dict[str, float] = {}
+
+_snapshot_loads: SingleFlight[tuple[str, int], ServiceSettingsSnapshot] = SingleFlight()
+
+
+def init_settings_cache(
+    max_size: int,
+    ttl: float | None,
+    reload_delay: float | None = None,
+    stale_timeout: float | None = None,
+    fallback_dir: Path | None = None,
+) -> TTLCache[str, ServiceSettingsSnapshot]:
+    """
+    :param reload_delay: time after which the settings of a changed service are invalidated once more in seconds. The
+    settings read from a lagging replica right after the change may not contain it, so they are not kept longer.
+    :param stale_timeout: time to wait for the settings to be read from the database before the last known settings
+    are served in seconds, the last known settings are not served if it is not set
+    :param fallback_dir: directory where the last known settings are saved
+    """
+    cache: TTLCache[str, ServiceSettingsSnapshot] = TTLCache(max_size=max_size, ttl=ttl)
+    _inst['settings_cache'] = cache
+    if reload_delay is not None:
+        _reload_delay['settings_cache'] = reload_delay
+    else:
+        _reload_delay.pop('settings_cache', None)
+    if stale_timeout is not None:
+        fallback = _fallback['settings_cache'] = SnapshotFallback(
+            max_size=max_size, stale_timeout=stale_timeout, directory=fallback_dir
+        )
+        fallback.restore()
+    else:
+        _fallback.pop('settings_cache', None)
+    return cache
+
+
+def get_settings_cache() -> TTLCache[str, ServiceSettingsSnapshot]:
+    try:
+        return _inst['settings_cache']
+    except KeyError:
+        raise ServiceInstanceNotFound('settings_cache')
+
+
+async def get_service_snapshot(acquire_db_conn: ConnAcquirer, service_name: str) -> ServiceSettingsSnapshot:
+    """
+    Returns all settings of the service, a database connection is taken only if they are not in the cache. The
+    concurrent requests of the settings missing in the cache share one database query.
+    """
+    snapshot = get_settings_cache().get(service_name)
+    if snapshot is None:
+        snapshot = await _read_service_snapshot(acquire_db_conn=acquire_db_conn, service_name=service_name)
+    return snapshot
+
+
+async def _read_service_snapshot(acquire_db_conn: ConnAcquirer, service_name: str) -> ServiceSettingsSnapshot:
+    generation = get_settings_cache().get_generation(service_name)
+    # the reading started before an invalidation of the service is not joined, as it may return the outdated settings
+    return await _snapshot_loads.do(
+        (service_name, generation),
+        partial(
+            _load_service_snapshot, acquire_db_conn=acquire_db_conn, service_name=service_name, generation=generation
+        ),
+    )
+
+
+async def _load_service_snapshot(
+    acquire_db_conn: ConnAcquirer, service_name: str, generation: int
+) -> ServiceSettingsSnapshot:
+    # the settings are put into the cache here rather than by the callers, as all of them may stop waiting for them
+    async with acquire_db_conn() as conn:
+        settings = [setting async for setting in db_repo.get_service_settings(conn=conn, service_name=service_name)]
+    snapshot = ServiceSettingsSnapshot.create(service_name=service_name, settings=settings)
+    await _remember(snapshot)
+    cache = get_settings_cache()
+    if cache.get_generation(service_name) == generation:
+        cache.set(service_name, snapshot)
+    return snapshot
+
+
+async def _remember(snapshot: ServiceSettingsSnapshot) -> None:
+    fallback = _fallback.get('settings_cache')
+    if fallback is not None:
+        await fallback.remember(snapshot)
+
+
+def _get_stale_age(snapshots: t.Iterable[ServiceSettingsSnapshot]) -> float:
+    return max((time.time() - snapshot.loaded_at for snapshot in snapshots), default=0)
+
+
+async def get_service_snapshot_or_stale(
+    acquire_db_conn: ConnAcquirer, service_name: str
+) -> tuple[ServiceSettingsSnapshot, float | None]:
+    """
+    Same as get_service_snapshot, but if the settings cannot be read from the database within the stale timeout, the
+    last known settings are returned, while the reading goes on in the background. Returns the settings and the time
+    passed since the returned settings were read from the database in seconds if they are stale.
+    """
+    cached = get_settings_cache().get(service_name)
+    if cached is not None:
+        return cached, None
+
+    fallback = _fallback.get('settings_cache')
+    last_known = fallback.get(service_name) if fallback is not None else None
+    if fallback is None or last_known is None:
+        return await _read_service_snapshot(acquire_db_conn=acquire_db_conn, service_name=service_name), None
+
+    try:
+        snapshot = await asyncio.wait_for(
+            _read_service_snapshot(acquire_db_conn=acquire_db_conn, service_name=service_name),
+            timeout=fallback.stale_timeout,
+        )
+    except DB_UNAVAILABLE_ERRORS:
+        logger.warning('Failed to read the settings of the service, the last known ones are served', exc_info=True)
+        return last_known, _get_stale_age([last_known])
+    return snapshot, None
+
+
+async def get_service_snapshots(
+    acquire_db_conn: ConnAcquirer, service_names: t.Sequence[str]
+) -> tuple[dict[str, ServiceSettingsSnapshot], float | None]:
+    """
+    Returns all settings of the services in the given order. The settings of the services missing in the cache are
+    read by one query using one database connection. If they cannot be read, the last known settings of the services
+    are returned, as long as they are known for all services. The second value is the time passed since the oldest
+    of the stale settings were read from the database in seconds, None if none of them are stale.
+    """
+    cache = get_settings_cache()
+    snapshots: dict[str, ServiceSettingsSnapshot | None] = {
+        service_name: cache.get(service_name) for service_name in service_names
+    }
+    missing = [service_name for service_name, snapshot in snapshots.items() if snapshot is None]
+    stale_age = None
+    if missing:
+        fallback = _fallback.get('settings_cache')
+        try:
+            loaded = await asyncio.wait_for(
+                _load_service_snapshots(acquire_db_conn, service_names=missing),
+                timeout=fallback.stale_timeout if fallback is not None else None,
+            )
+        except DB_UNAVAILABLE_ERRORS:
+            last_known = {
+                service_name: fallback.get(service_name) if fallback is not None else None for service_name in missing
+            }
+            if any(snapshot is None for snapshot in last_known.values()):
+                raise
+            logger.warning(
+                'Failed to read the settings of the services, the last known ones are served', exc_info=True
+            )
+            snapshots.update(last_known)
+            stale_age = _get_stale_age(snapshot for snapshot in last_known.values() if snapshot is not None)
+        else:
+            snapshots.update(loaded)
+    return {service_name: snapshot for service_name, snapshot in snapshots.items() if snapshot is not None}, stale_age
+
+
+async def _load_service_snapshots(
+    acquire_db_conn: ConnAcquirer, service_names: list[str]
+) -> dict[str, ServiceSettingsSnapshot]:
+    cache = get_settings_cache()
+    generations = {service_name: cache.get_generation(service_name) for service_name in service_names}
+    settings: dict[str, list[SettingData]] = {service_name: [] for service_name in service_names}
+    async with acquire_db_conn() as conn:
+        async for setting in db_repo.get_settings_of_services(conn=conn, service_names=service_names):
+            settings[setting.service_name].append(setting)
+
+    snapshots = {}
+    for service_name in service_names:
+        snapshot = snapshots[service_name] = ServiceSettingsSnapshot.create(
+            service_name=service_name, settings=settings[service_name]
+        )
+        await _remember(snapshot)
+        if cache.get_generation(service_name) == generations[service_name]:
+            cache.set(service_name, snapshot)
+    return snapshots
+
+
+def invalidate_service_settings(*service_names: str) -> None:
+    cache = get_settings_cache()
+    for service_name in service_names:
+        cache.invalidate(service_name)
+        _schedule_reload(cache.invalidate, service_name)
+
+
+def invalidate_all_service_settings() -> None:
+    cache = get_settings_cache()
+    cache.clear()
+    _schedule_reload(cache.clear)
+    logger.info('Service settings cache cleared')
+
+
+def _schedule_reload(invalidate: t.Callable[..., None], *args: t.Any) -> None:
+    reload_delay = _reload_delay.get('settings_cache')
+    if reload_delay is not None:
+        asyncio.get_running_loop().call_later(reload_delay, invalidate, *args)
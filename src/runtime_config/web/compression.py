@@ -0,0 +1,109 @@
+import typing as t
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from runtime_config.lib.compression import Compressor
+from runtime_config.web.etag import add_etag_encoding
+
+
+def parse_accept_encoding(accept_encoding: str | None) -> dict[str, float]:
+    """
+    Returns the quality values of the encodings listed in the Accept-Encoding request header
+    """
+    qualities: dict[str, float] = {}
+    for item in (accept_encoding or '').split(','):
+        name, *params = (part.strip() for part in item.split(';'))
+        if not name:
+            continue
+
+        quality = 1.0
+        for param in params:
+            if param.startswith('q='):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0
+        qualities[name.lower()] = quality
+    return qualities
+
+
+def accepts_encoding(accept_encoding: str | None, encoding: str) -> bool:
+    qualities = parse_accept_encoding(accept_encoding)
+    return qualities.get(encoding, qualities.get('*', 0)) > 0
+
+
+def choose_encoding(accept_encoding: str | None, encodings: t.Sequence[str]) -> str | None:
+    """
+    Returns the encoding with the highest quality accepted by the client, the order of the given encodings decides
+    between encodings of equal quality. None means that the body should be sent as is.
+    """
+    qualities = parse_accept_encoding(accept_encoding)
+    chosen, chosen_quality = None, 0.0
+    for encoding in encodings:
+        quality = qualities.get(encoding, qualities.get('*', 0))
+        if quality > chosen_quality:
+            chosen, chosen_quality = encoding, quality
+    return chosen
+
+
+class CompressionMiddleware:
+    """
+    Compresses the response bodies sent in one piece. Streaming responses (server-sent events) are sent as is so as
+    not to delay the events, and so are the responses already compressed by the endpoints.
+
+    The name of the encoding is appended to the ETag of the compressed responses. The 304 responses keep the ETag
+    the client has sent, so it does not change from the compressed representation to the identity one.
+    """
+
+    def __init__(self, app: ASGIApp, compressor: Compressor) -> None:
+        self.app = app
+        self.compressor = compressor
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        request_headers = Headers(scope=scope)
+        chosen_encoding = choose_encoding(request_headers.get('Accept-Encoding'), self.compressor.encodings)
+        if chosen_encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        encoding: str = chosen_encoding
+
+        start_message: Message = {}
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start_message
+            if message['type'] == 'http.response.start':
+                # the headers are sent along with the first part of the body, when it is known how to encode it
+                start_message = message
+                return
+
+            if message['type'] == 'http.response.body' and start_message:
+                headers = MutableHeaders(raw=start_message['headers'])
+                body = message.get('body', b'')
+                if (
+                    not message.get('more_body', False)
+                    and 'Content-Encoding' not in headers
+                    and self.compressor.should_compress(body)
+                ):
+                    body = self.compressor.compress(body, encoding)
+                    headers['Content-Encoding'] = encoding
+                    headers['Content-Length'] = str(len(body))
+                    headers.add_vary_header('Accept-Encoding')
+                    if 'ETag' in headers:
+                        headers['ETag'] = add_etag_encoding(headers['ETag'], encoding)
+                    message = {**message, 'body': body}
+                elif start_message['status'] == 304 and 'ETag' in headers:
+                    encoded_etag = add_etag_encoding(headers['ETag'], encoding)
+                    if_none_match = request_headers.get('If-None-Match', '')
+                    if encoded_etag in (tag.strip().removeprefix('W/') for tag in if_none_match.split(',')):
+                        headers['ETag'] = encoded_etag
+                await send(start_message)
+                start_message = {}
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
@@ -39,8 +39,34 @@ class DeleteSettingResponse(OperationStatusResponse):
     pass
 
 
+class BatchItemResult(BaseModel):
+    # results of the items of a batch are listed in the order of the items
+    status: ResponseStatus
+    message: str | None
+    setting: SettingData | None
+
+
 class GetServiceSettingsLegacyResponse(BaseModel):
     name: str
     value: t.Any
     value_type: ValueType
     disable: bool
+
+
+class ServiceSettingsResponse(BaseModel):
+    service_name: str
+    # changes whenever any of the settings of the service changes
+    version: str
+    settings: list[SettingData]
+
+
+class ServiceSettingsSnapshotEvent(BaseModel):
+    service_name: str
+    version: str
+    settings: list[SettingData]
+
+
+class SettingChangeEvent(BaseModel):
+    service_name: str
+    version: str
+    setting: SettingData
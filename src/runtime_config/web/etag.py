@@ -0,0 +1,40 @@
+# encodings whose names are appended to the etags of the compressed representations
+ETAG_ENCODINGS = ('br', 'gzip')
+
+
+def make_etag(*parts: str | int) -> str:
+    return '"{}"'.format('-'.join(str(part) for part in parts))
+
+
+def add_etag_encoding(etag: str, encoding: str) -> str:
+    """
+    Returns the etag of the representation compressed with the encoding. A strong etag must differ for each encoding
+    of the body, so the name of the encoding is appended to it.
+    """
+    return f'{etag[:-1]}-{encoding}"'
+
+
+def remove_etag_encoding(tag: str) -> str:
+    """
+    Returns the etag of the identity representation, the tag may be given with or without quotes
+    """
+    quote = '"' if tag.endswith('"') else ''
+    for encoding in ETAG_ENCODINGS:
+        suffix = f'-{encoding}{quote}'
+        if tag.endswith(suffix):
+            return tag[: -len(suffix)] + quote
+    return tag
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """
+    Checks the If-None-Match request header against the etag of the current representation using the weak
+    comparison required by RFC 7232 for this header. The etags of the compressed representations match too.
+    """
+    if not if_none_match:
+        return False
+
+    if if_none_match.strip() == '*':
+        return True
+
+    return any(remove_etag_encoding(tag.strip().removeprefix('W/')) == etag for tag in if_none_match.split(','))
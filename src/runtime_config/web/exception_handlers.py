@@ -0,0 +1,39 @@
+import asyncio
+
+import psycopg2
+from fastapi import FastAPI, Request
+from structlog import get_logger
+
+from runtime_config.enums.status import ResponseStatus
+from runtime_config.lib.exception import DatabaseUnavailable
+from runtime_config.web.pagination import InvalidCursor
+from runtime_config.web.responses import JSONResponse
+
+logger = get_logger(__name__)
+
+
+async def database_unavailable_handler(request: Request, exc: Exception) -> JSONResponse:
+    """
+    The database cannot be connected to or does not respond in time, the client is asked to retry the request later
+    instead of waiting
+    """
+    logger.warning('Database is unavailable', path=request.url.path, error=str(exc))
+    return JSONResponse(
+        content={'status': ResponseStatus.error.value, 'message': 'Database is temporarily unavailable'},
+        status_code=503,
+        headers={'Retry-After': '1'},
+    )
+
+
+async def invalid_cursor_handler(request: Request, exc: Exception) -> JSONResponse:
+    return JSONResponse(
+        content={'status': ResponseStatus.error.value, 'message': 'Invalid pagination cursor'}, status_code=400
+    )
+
+
+def init_exception_handlers(app: FastAPI) -> None:
+    app.add_exception_handler(DatabaseUnavailable, database_unavailable_handler)
+    app.add_exception_handler(psycopg2.OperationalError, database_unavailable_handler)
+    # the endpoints handle their own timeouts, so the remaining ones are the timeouts of the database queries
+    app.add_exception_handler(asyncio.TimeoutError, database_unavailable_handler)
+    app.add_exception_handler(InvalidCursor, invalid_cursor_handler)
@@ -0,0 +1,163 @@
+import re
+import time
+import typing as t
+import uuid
+from collections import defaultdict
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from structlog.contextvars import bound_contextvars
+
+from runtime_config.lib import metrics
+from runtime_config.lib.db import QueryTrace, track_conn_hold_time, track_queries
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+# the request id given by the client is used only if it is safe to put into the logs and the headers
+_REQUEST_ID_RE = re.compile(r'[\w.:-]{1,128}')
+
+
+class RouteConnHoldTime(t.TypedDict):
+    requests: int
+    connections: int
+    # seconds
+    total: float
+    avg_per_request: float
+    max_per_request: float
+
+
+class ConnHoldTimeStats:
+    """
+    Time the database connections are held by the requests to each route, it defines the size of the pool needed
+    """
+
+    def __init__(self) -> None:
+        self._requests: defaultdict[str, int] = defaultdict(int)
+        self._connections: defaultdict[str, int] = defaultdict(int)
+        self._total: defaultdict[str, float] = defaultdict(float)
+        self._max: defaultdict[str, float] = defaultdict(float)
+
+    def add(self, route: str, hold_times: list[float]) -> None:
+        request_hold_time = sum(hold_times)
+        self._requests[route] += 1
+        self._connections[route] += len(hold_times)
+        self._total[route] += request_hold_time
+        self._max[route] = max(self._max[route], request_hold_time)
+
+    def stats(self) -> dict[str, RouteConnHoldTime]:
+        return {
+            route: {
+                'requests': requests,
+                'connections': self._connections[route],
+                'total': self._total[route],
+                'avg_per_request': self._total[route] / requests,
+                'max_per_request': self._max[route],
+            }
+            for route, requests in self._requests.items()
+        }
+
+    def clear(self) -> None:
+        self._requests.clear()
+        self._connections.clear()
+        self._total.clear()
+        self._max.clear()
+
+
+conn_hold_time_stats = ConnHoldTimeStats()
+
+
+class ConnHoldTimeMiddleware:
+    def __init__(self, app: ASGIApp, stats: ConnHoldTimeStats = conn_hold_time_stats) -> None:
+        self.app = app
+        self.stats = stats
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        with track_conn_hold_time() as hold_times:
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                # the route is put into the scope by the router, the requests to unknown paths are not counted
+                route = scope.get('route')
+                if route is not None:
+                    self.stats.add(route.path, hold_times)
+
+
+class MetricsMiddleware:
+    """
+    Collects the Prometheus metrics of the requests: the number of the requests in progress, the duration and the
+    size of the response by route template
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        method = scope['method']
+        # the request is failed if the response has not been started
+        status_code = 500
+        response_size = 0
+
+        async def send_tracked(message: Message) -> None:
+            nonlocal status_code, response_size
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+            elif message['type'] == 'http.response.body':
+                response_size += len(message.get('body', b''))
+            await send(message)
+
+        in_progress = metrics.REQUESTS_IN_PROGRESS.labels(method)
+        in_progress.inc()
+        started_at = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_tracked)
+        finally:
+            duration = time.perf_counter() - started_at
+            in_progress.dec()
+            route = scope.get('route')
+            route_path = route.path if route is not None else metrics.UNMATCHED_ROUTE
+            metrics.REQUEST_DURATION.labels(method, route_path, str(status_code)).observe(duration)
+            metrics.RESPONSE_SIZE.labels(method, route_path).observe(response_size)
+
+
+def format_server_timing(queries: list[QueryTrace]) -> str:
+    duration = sum(query.duration for query in queries) * 1000
+    return f'db;desc="{len(queries)} queries";dur={duration:.2f}'
+
+
+class RequestTracingMiddleware:
+    """
+    Binds the id of the request to the records logged while handling it and reports the number and the total time of
+    the database queries made by the request in the Server-Timing header. The id is taken from the X-Request-ID
+    header or generated and is returned in the same header. The queries made after the headers have been sent (by the
+    streaming responses) are not reported.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        request_id = Headers(scope=scope).get(REQUEST_ID_HEADER, '')
+        if not _REQUEST_ID_RE.fullmatch(request_id):
+            request_id = uuid.uuid4().hex
+
+        with bound_contextvars(request_id=request_id), track_queries() as queries:
+
+            async def send_traced(message: Message) -> None:
+                if message['type'] == 'http.response.start':
+                    headers = MutableHeaders(scope=message)
+                    headers[REQUEST_ID_HEADER] = request_id
+                    headers.append('Server-Timing', format_server_timing(queries))
+                await send(message)
+
+            await self.app(scope, receive, send_traced)
@@ -0,0 +1,52 @@
+import base64
+import binascii
+import datetime
+import json
+import typing as t
+
+from runtime_config.repositories.db.entities import HistoryKey, SettingKey
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def _encode(values: list[t.Any]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values, separators=(',', ':')).encode()).decode()
+
+
+def _decode(cursor: str, types: tuple[type, ...]) -> list[t.Any]:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, ValueError):
+        raise InvalidCursor(cursor)
+
+    if not isinstance(values, list) or len(values) != len(types):
+        raise InvalidCursor(cursor)
+    if not all(isinstance(value, type_) for value, type_ in zip(values, types)):
+        raise InvalidCursor(cursor)
+    return values
+
+
+def encode_cursor(key: SettingKey) -> str:
+    """
+    The cursor is opaque to the clients, it is passed back as is to get the next page
+    """
+    return _encode(list(key))
+
+
+def decode_cursor(cursor: str) -> SettingKey:
+    service_name, name, setting_id = _decode(cursor, types=(str, str, int))
+    return SettingKey(service_name=service_name, name=name, id=setting_id)
+
+
+def encode_history_cursor(key: HistoryKey) -> str:
+    return _encode([key.updated_at.isoformat(), key.id])
+
+
+def decode_history_cursor(cursor: str) -> HistoryKey:
+    updated_at, history_id = _decode(cursor, types=(str, int))
+    try:
+        return HistoryKey(updated_at=datetime.datetime.fromisoformat(updated_at), id=history_id)
+    except ValueError:
+        raise InvalidCursor(cursor)
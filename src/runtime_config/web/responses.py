@@ -0,0 +1,15 @@
+import typing as t
+
+from fastapi.responses import JSONResponse as _JSONResponse
+
+from runtime_config.lib.serialization import dumps
+
+
+class JSONResponse(_JSONResponse):
+    """
+    The content may contain pydantic models, enums and dates. The endpoints returning large lists of settings return
+    this response directly, so FastAPI does not validate and convert every setting to a dict before encoding it.
+    """
+
+    def render(self, content: t.Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,106 @@
+import asyncio
+import base64
+import binascii
+import json
+import typing as t
+
+from pydantic.main import BaseModel
+
+from runtime_config.services.settings_broadcaster import SettingsBroadcaster
+from runtime_config.services.settings_cache import ServiceSettingsSnapshot
+from runtime_config.web.entities import ServiceSettingsSnapshotEvent, SettingChangeEvent
+
+
+def format_event(event: str, data: BaseModel | None = None, event_id: str | None = None) -> str:
+    lines = [f'event: {event}']
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'data: {data.json() if data is not None else "{}"}')
+    return '\n'.join(lines) + '\n\n'
+
+
+def encode_resume_token(versions: dict[str, str]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(versions, separators=(',', ':')).encode()).decode()
+
+
+def decode_resume_token(token: str | None) -> dict[str, str]:
+    if not token:
+        return {}
+
+    try:
+        versions = json.loads(base64.urlsafe_b64decode(token.encode()))
+    except (binascii.Error, ValueError):
+        return {}
+
+    if not isinstance(versions, dict):
+        return {}
+    return {str(service_name): str(version) for service_name, version in versions.items()}
+
+
+async def stream_setting_events(
+    broadcaster: SettingsBroadcaster, service_names: t.Sequence[str], known_versions: dict[str, str]
+) -> t.AsyncIterator[str]:
+    """
+    Generates server-sent events of the changes of the services. The services are subscribed to when the stream is
+    started and unsubscribed from when it is closed, so a response that has never been sent leaves no subscription
+    behind. First, a snapshot event is sent for each service whose
+    version differs from the version known by the client, then upsert and delete events are sent for each change.
+
+    The id of the events is a resume token containing the versions of the services that the client has received.
+    Within a batch of events it is set only on the last one, so the client that has reconnected with the
+    Last-Event-ID header does not miss a part of the batch.
+    """
+    subscription = await broadcaster.subscribe(service_names)
+    try:
+        versions: dict[str, str] = {}
+        outdated = []
+        for service_name in subscription.service_names:
+            snapshot = broadcaster.get_snapshot(service_name)
+            if known_versions.get(service_name) == snapshot.version:
+                versions[service_name] = snapshot.version
+            else:
+                outdated.append(snapshot)
+
+        for snapshot in outdated:
+            yield _snapshot_event(snapshot, versions)
+        yield format_event('heartbeat', event_id=encode_resume_token(versions))
+
+        while True:
+            try:
+                change = await asyncio.wait_for(subscription.queue.get(), timeout=broadcaster.heartbeat_interval)
+            except asyncio.TimeoutError:
+                yield format_event('heartbeat', event_id=encode_resume_token(versions))
+                continue
+
+            if subscription.overflowed:
+                # some changes were dropped, so the client receives the current state of all services
+                subscription.overflowed = False
+                while not subscription.queue.empty():
+                    subscription.queue.get_nowait()
+                for service_name in subscription.service_names:
+                    yield _snapshot_event(broadcaster.get_snapshot(service_name), versions)
+                continue
+
+            snapshot = change.snapshot
+            versions[snapshot.service_name] = snapshot.version
+            events = [('upsert', setting) for setting in change.upserted]
+            events.extend(('delete', setting) for setting in change.deleted)
+            for i, (event, setting) in enumerate(events, start=1):
+                yield format_event(
+                    event,
+                    SettingChangeEvent(service_name=snapshot.service_name, version=snapshot.version, setting=setting),
+                    event_id=encode_resume_token(versions) if i == len(events) else None,
+                )
+    finally:
+        broadcaster.unsubscribe(subscription)
+
+
+def _snapshot_event(snapshot: ServiceSettingsSnapshot, versions: dict[str, str]) -> str:
+    versions[snapshot.service_name] = snapshot.version
+    return format_event(
+        'snapshot',
+        ServiceSettingsSnapshotEvent(
+            service_name=snapshot.service_name, version=snapshot.version, settings=snapshot.settings
+        ),
+        event_id=encode_resume_token(versions),
+    )
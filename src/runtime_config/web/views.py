@@ -1,32 +1,135 @@
+import hashlib
 import typing as t
 
 import psycopg2.errors
-from aiopg.sa import SAConnection
-from fastapi import APIRouter, Depends, Query
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Body, Depends, Header, Query
+from fastapi.responses import Response, StreamingResponse
 
+from runtime_config.enums.settings import SearchMode
 from runtime_config.enums.status import ResponseStatus
-from runtime_config.lib.db import get_db_conn
+from runtime_config.lib import metrics
+from runtime_config.lib.cache import CacheStats
+from runtime_config.lib.compression import get_compressor
+from runtime_config.lib.db import (
+    ConnAcquirer,
+    PoolStats,
+    ReplicaStats,
+    get_db_conn_acquirer,
+    get_db_pool_stats,
+    get_db_read_conn_acquirer,
+    get_db_replica_stats,
+)
+from runtime_config.lib.serialization import dumps
 from runtime_config.repositories.db import repo as db_repo
-from runtime_config.repositories.db.entities import SettingData, SettingHistoryData
+from runtime_config.repositories.db.entities import (
+    ServiceSettingsChanges,
+    SettingData,
+    SettingHistoryData,
+)
+from runtime_config.services import setting_changes, settings_cache
+from runtime_config.services.settings_broadcaster import get_settings_broadcaster
+from runtime_config.services.settings_cache import ServiceSettingsSnapshot
+from runtime_config.web.compression import choose_encoding
 from runtime_config.web.entities import (
+    BatchItemResult,
     CreateNewSettingRequest,
     EditSettingRequest,
     GetServiceSettingsLegacyResponse,
     GetSettingResponse,
     OperationStatusResponse,
+    ServiceSettingsResponse,
+)
+from runtime_config.web.etag import (
+    add_etag_encoding,
+    etag_matches,
+    make_etag,
+    remove_etag_encoding,
 )
+from runtime_config.web.instrumentation import RouteConnHoldTime, conn_hold_time_stats
+from runtime_config.web.pagination import (
+    decode_cursor,
+    decode_history_cursor,
+    encode_cursor,
+    encode_history_cursor,
+)
+from runtime_config.web.responses import JSONResponse
+from runtime_config.web.sse import decode_resume_token, stream_setting_events
+
+router = APIRouter(default_response_class=JSONResponse)
+
+MAX_PAGE_SIZE = 1000
+MAX_BATCH_SIZE = 1000
+# number of the settings read from the database and sent to the client at once by the streaming responses
+STREAM_BATCH_SIZE = 500
+# header of the responses made of the last known settings when the database is unavailable, the value is the time
+# passed since the settings were read from the database in seconds
+STALE_AGE_HEADER = 'X-Settings-Stale-Age'
+
+
+def _settings_headers(etag: str, stale_age: float | None) -> dict[str, str]:
+    headers = {'ETag': etag}
+    if stale_age is not None:
+        headers[STALE_AGE_HEADER] = str(int(stale_age))
+    return headers
+
+
+def _page_response(settings: list[SettingData], limit: int, headers: dict[str, str]) -> JSONResponse:
+    # one setting more than the limit is read to find out whether there is the next page
+    if len(settings) > limit:
+        settings = settings[:limit]
+        headers['X-Next-Cursor'] = encode_cursor(settings[-1].key)
+    return JSONResponse(content=settings, headers=headers)
+
 
-router = APIRouter()
+def _snapshot_response(
+    snapshot: ServiceSettingsSnapshot,
+    body: t.Literal['legacy_json', 'settings_json'],
+    accept_encoding: str | None,
+    headers: dict[str, str],
+) -> Response:
+    # the body is encoded and compressed once per version of the settings and then served from the cache as is
+    compressor = get_compressor()
+    content = getattr(snapshot, body)
+    headers['Vary'] = 'Accept-Encoding'
+    encoding = choose_encoding(accept_encoding, compressor.encodings)
+    if encoding is not None and compressor.should_compress(content):
+        headers['Content-Encoding'] = encoding
+        if 'ETag' in headers:
+            headers['ETag'] = add_etag_encoding(headers['ETag'], encoding)
+        content = snapshot.compress(body=body, encoding=encoding, compressor=compressor)
+    return Response(content=content, media_type='application/json', headers=headers)
+
+
+async def _stream_service_settings(
+    acquire_db_conn: ConnAcquirer, service_name: str, ndjson: bool
+) -> t.AsyncIterator[bytes]:
+    # the connection is held until the last setting is sent, so the response is not slower than the client reads it
+    async with acquire_db_conn() as conn:
+        chunk = [] if ndjson else [b'[']
+        separator = b''
+        async for setting in db_repo.get_service_settings(
+            conn=conn, service_name=service_name, batch_size=STREAM_BATCH_SIZE
+        ):
+            item = dumps(settings_cache.to_legacy_dict(setting))
+            chunk.append(item + b'\n' if ndjson else separator + item)
+            separator = b','
+            if len(chunk) >= STREAM_BATCH_SIZE:
+                yield b''.join(chunk)
+                chunk = []
+
+    if not ndjson:
+        chunk.append(b']')
+    yield b''.join(chunk)
 
 
 @router.post('/setting/create', response_model=SettingData, responses={400: {'model': OperationStatusResponse}})
 async def create_setting(
-    payload: CreateNewSettingRequest, db_conn: SAConnection = Depends(get_db_conn)
+    payload: CreateNewSettingRequest, acquire_db_conn: ConnAcquirer = Depends(get_db_conn_acquirer)
 ) -> SettingData | JSONResponse:
     response: SettingData | JSONResponse
     try:
-        created_setting = await db_repo.create_new_setting(conn=db_conn, values=payload.dict())
+        async with acquire_db_conn() as conn:
+            created_setting = await db_repo.create_new_setting(conn=conn, values=payload.dict())
     except psycopg2.errors.UniqueViolation:
         response = JSONResponse(
             content={'status': ResponseStatus.error.value, 'message': 'Variable with the same name already exists'},
@@ -34,6 +137,7 @@ async def create_setting(
         )
     else:
         if created_setting:
+            settings_cache.invalidate_service_settings(created_setting.service_name)
             response = created_setting
         else:
             response = JSONResponse(
@@ -50,9 +154,12 @@ async def create_setting(
     responses={400: {'model': OperationStatusResponse}},
 )
 async def delete_setting(
-    setting_id: int, db_conn: SAConnection = Depends(get_db_conn)
+    setting_id: int, acquire_db_conn: ConnAcquirer = Depends(get_db_conn_acquirer)
 ) -> OperationStatusResponse | JSONResponse:
-    if await db_repo.delete_setting(conn=db_conn, setting_id=setting_id):
+    async with acquire_db_conn() as conn:
+        deleted_setting = await db_repo.delete_setting(conn=conn, setting_id=setting_id)
+    if deleted_setting:
+        settings_cache.invalidate_service_settings(deleted_setting.service_name)
         return {'status': ResponseStatus.success}
     else:
         return JSONResponse(
@@ -66,13 +173,18 @@ async def delete_setting(
 
 @router.post('/setting/edit', response_model=SettingData, responses={400: {'model': OperationStatusResponse}})
 async def edit_setting(
-    payload: EditSettingRequest, db_conn: SAConnection = Depends(get_db_conn)
+    payload: EditSettingRequest, acquire_db_conn: ConnAcquirer = Depends(get_db_conn_acquirer)
 ) -> SettingData | JSONResponse:
     response: SettingData | JSONResponse
-    edited_setting = await db_repo.edit_setting(
-        conn=db_conn, setting_id=payload.id, values=payload.dict(exclude={'id'}, exclude_unset=True)
-    )
+    values = payload.dict(exclude={'id'}, exclude_unset=True)
+    async with acquire_db_conn() as conn:
+        edited_setting = await db_repo.edit_setting(conn=conn, setting_id=payload.id, values=values)
     if edited_setting:
+        if 'service_name' in values:
+            # the previous service name of the setting is unknown, so the settings of all services are reset
+            settings_cache.invalidate_all_service_settings()
+        else:
+            settings_cache.invalidate_service_settings(edited_setting.service_name)
         response = edited_setting
     else:
         response = JSONResponse(
@@ -83,67 +195,346 @@ async def edit_setting(
     return response
 
 
+def _batch_item_error(message: str) -> BatchItemResult:
+    return BatchItemResult(status=ResponseStatus.error, message=message)
+
+
+@router.post('/setting/create/batch', response_model=list[BatchItemResult])
+async def create_settings(
+    payload: list[CreateNewSettingRequest] = Body(..., max_items=MAX_BATCH_SIZE),
+    acquire_db_conn: ConnAcquirer = Depends(get_db_conn_acquirer),
+) -> list[BatchItemResult]:
+    """
+    Creates the settings by one statement. The settings whose names are already taken are reported as failed, the
+    rest of them are created anyway.
+    """
+    # of the settings with the same name in the same service only the first one is created
+    first_items: dict[tuple[str, str], int] = {}
+    for i, item in enumerate(payload):
+        first_items.setdefault((item.service_name, item.name), i)
+
+    async with acquire_db_conn() as conn:
+        created_settings = await db_repo.create_new_settings(
+            conn=conn, values=[payload[i].dict() for i in first_items.values()]
+        )
+    settings_cache.invalidate_service_settings(*{setting.service_name for setting in created_settings})
+
+    created = {(setting.service_name, setting.name): setting for setting in created_settings}
+    results = []
+    for i, item in enumerate(payload):
+        key = (item.service_name, item.name)
+        if first_items[key] == i and key in created:
+            results.append(BatchItemResult(status=ResponseStatus.success, setting=created[key]))
+        else:
+            results.append(_batch_item_error('Variable with the same name already exists'))
+    return results
+
+
+@router.post('/setting/edit/batch', response_model=list[BatchItemResult])
+async def edit_settings(
+    payload: list[EditSettingRequest] = Body(..., max_items=MAX_BATCH_SIZE),
+    acquire_db_conn: ConnAcquirer = Depends(get_db_conn_acquirer),
+) -> list[BatchItemResult]:
+    """
+    Changes the settings by one statement. The settings that cannot be changed because their new names are taken are
+    reported as failed, the rest of them are changed anyway.
+    """
+    edits: dict[int, dict[str, t.Any]] = {}
+    first_items: dict[int, int] = {}
+    for i, item in enumerate(payload):
+        if first_items.setdefault(item.id, i) == i:
+            edits[item.id] = item.dict(exclude={'id'}, exclude_unset=True)
+
+    async with acquire_db_conn() as conn:
+        edited_settings, conflicting = await db_repo.edit_settings(conn=conn, edits=edits)
+
+    if any('service_name' in values for values in edits.values()):
+        # the previous service names of the settings are unknown, so the settings of all services are reset
+        settings_cache.invalidate_all_service_settings()
+    else:
+        settings_cache.invalidate_service_settings(*{setting.service_name for setting in edited_settings})
+
+    edited = {setting.id: setting for setting in edited_settings}
+    results = []
+    for i, item in enumerate(payload):
+        if first_items[item.id] != i:
+            results.append(_batch_item_error('Setting with the specified id is already edited in the batch'))
+        elif item.id in conflicting:
+            results.append(_batch_item_error('Variable with the same name already exists'))
+        elif item.id in edited:
+            results.append(BatchItemResult(status=ResponseStatus.success, setting=edited[item.id]))
+        else:
+            results.append(_batch_item_error('Setting with the specified id was not found'))
+    return results
+
+
+@router.post('/setting/delete/batch', response_model=list[BatchItemResult])
+async def delete_settings(
+    setting_ids: list[int] = Body(..., max_items=MAX_BATCH_SIZE),
+    acquire_db_conn: ConnAcquirer = Depends(get_db_conn_acquirer),
+) -> list[BatchItemResult]:
+    async with acquire_db_conn() as conn:
+        deleted_settings = await db_repo.delete_settings(conn=conn, setting_ids=list(set(setting_ids)))
+    settings_cache.invalidate_service_settings(*{setting.service_name for setting in deleted_settings})
+
+    deleted = {setting.id: setting for setting in deleted_settings}
+    return [
+        BatchItemResult(status=ResponseStatus.success, setting=deleted[setting_id])
+        if setting_id in deleted
+        else _batch_item_error('Could not find the setting with the specified id')
+        for setting_id in setting_ids
+    ]
+
+
 @router.get('/setting/get/{setting_id}', response_model=GetSettingResponse)
 async def get_setting(
-    setting_id: int, include_history: bool = False, db_conn: SAConnection = Depends(get_db_conn)
-) -> GetSettingResponse:
+    setting_id: int,
+    include_history: bool = False,
+    history_limit: int = Query(default=100, gt=0, le=MAX_PAGE_SIZE),
+    history_cursor: str | None = None,
+    acquire_db_conn: ConnAcquirer = Depends(get_db_read_conn_acquirer),
+) -> JSONResponse:
+    """
+    The change history is returned from the newest entries to the oldest ones. If there are more entries, the cursor
+    of the next page of the history is returned in the X-Next-History-Cursor header.
+    """
     change_history: list[SettingHistoryData] | None
-    found_setting, change_history = await db_repo.get_setting(
-        conn=db_conn, setting_id=setting_id, include_history=include_history
-    )
+    async with acquire_db_conn() as conn:
+        found_setting, change_history = await db_repo.get_setting(
+            conn=conn,
+            setting_id=setting_id,
+            include_history=include_history,
+            history_limit=history_limit + 1,
+            history_before=decode_history_cursor(history_cursor) if history_cursor else None,
+        )
+
+    headers = {}
     if not include_history:
         change_history = None
-    return GetSettingResponse(setting=found_setting, change_history=change_history)
+    elif len(change_history) > history_limit:
+        change_history = change_history[:history_limit]
+        headers['X-Next-History-Cursor'] = encode_history_cursor(change_history[-1].history_key)
+    return JSONResponse(
+        content=GetSettingResponse(setting=found_setting, change_history=change_history), headers=headers
+    )
 
 
 @router.get('/setting/search', response_model=list[SettingData])
 async def search_settings(
     name: str | None = None,
     service_name: str | None = None,
+    search_mode: SearchMode | None = None,
     offset: int = Query(default=0, gt=-1),
-    limit: int = Query(default=30, gt=0, le=30),
-    db_conn: SAConnection = Depends(get_db_conn),
-) -> list[SettingData]:
-    return [
-        setting
-        async for setting in db_repo.search_settings(
-            conn=db_conn, name=name, service_name=service_name, offset=offset, limit=limit
-        )
-    ]
+    limit: int = Query(default=30, gt=0, le=MAX_PAGE_SIZE),
+    cursor: str | None = None,
+    acquire_db_conn: ConnAcquirer = Depends(get_db_read_conn_acquirer),
+) -> JSONResponse:
+    """
+    Searches the settings whose names contain the given name. The name ending with "*" is searched as a prefix, the
+    search mode can also be set explicitly.
 
+    The settings are ordered by service name, name and id. If there are more of them, the cursor of the next page is
+    returned in the X-Next-Cursor header. The cursor should be used instead of the offset to walk through many pages.
+    """
+    if search_mode is None:
+        search_mode = SearchMode.substring
+        if name is not None and name.endswith('*'):
+            name, search_mode = name[:-1], SearchMode.prefix
 
-@router.get('/setting/all/{service_name}', response_model=list[SettingData])
+    async with acquire_db_conn() as conn:
+        found_settings = [
+            setting
+            async for setting in db_repo.search_settings(
+                conn=conn,
+                name=name,
+                service_name=service_name,
+                offset=offset,
+                limit=limit + 1,
+                search_mode=search_mode,
+                after=decode_cursor(cursor) if cursor else None,
+            )
+        ]
+    return _page_response(found_settings, limit=limit, headers={})
+
+
+@router.get('/setting/all/{service_name}', response_model=list[SettingData], responses={304: {}})
 async def get_all_service_settings(
     service_name: str,
     offset: int = Query(default=0, gt=-1),
-    limit: int = Query(default=30, gt=0, le=30),
-    db_conn: SAConnection = Depends(get_db_conn),
-) -> list[SettingData]:
-    return [
-        setting
-        async for setting in db_repo.get_service_settings(
-            conn=db_conn,
-            service_name=service_name,
-            offset=offset,
-            limit=limit,
-        )
-    ]
+    limit: int = Query(default=30, gt=0, le=MAX_PAGE_SIZE),
+    cursor: str | None = None,
+    if_none_match: str | None = Header(default=None),
+    acquire_db_conn: ConnAcquirer = Depends(get_db_read_conn_acquirer),
+) -> Response:
+    """
+    The settings are ordered by name and id, the cursor of the next page is returned in the X-Next-Cursor header
+    """
+    snapshot, stale_age = await settings_cache.get_service_snapshot_or_stale(
+        acquire_db_conn=acquire_db_conn, service_name=service_name
+    )
+    etag = make_etag(snapshot.version, offset, limit, cursor or '')
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=_settings_headers(etag, stale_age))
 
+    if cursor:
+        page = snapshot.get_page(limit=limit + 1, after=decode_cursor(cursor))
+    else:
+        page = snapshot.settings[offset : offset + limit + 1]
+    return _page_response(page, limit=limit, headers=_settings_headers(etag, stale_age))
 
-@router.get('/get_settings/{service_name}', response_model=list[GetServiceSettingsLegacyResponse], deprecated=True)
+
+@router.get(
+    '/get_settings/{service_name}',
+    response_model=list[GetServiceSettingsLegacyResponse],
+    responses={304: {}},
+    deprecated=True,
+)
 async def get_service_settings(
-    service_name: str, db_conn: SAConnection = Depends(get_db_conn)
-) -> list[dict[str, t.Any]]:
+    service_name: str,
+    stream: bool = False,
+    if_none_match: str | None = Header(default=None),
+    accept: str | None = Header(default=None),
+    accept_encoding: str | None = Header(default=None),
+    acquire_db_conn: ConnAcquirer = Depends(get_db_read_conn_acquirer),
+) -> Response:
+    """
+    The settings are streamed from the database as they are read, bypassing the cache, when the client accepts
+    application/x-ndjson (one setting per line) or asks for it with the stream parameter (a JSON array sent in parts)
+    """
     # not removed for backwards compatibility with client library
-    def rename_fields(setting_data: SettingData) -> dict[str, t.Any]:
-        data = setting_data.dict()
-        data['disable'] = data.pop('is_disabled')
-        return data
+    ndjson = 'application/x-ndjson' in (accept or '')
+    if ndjson or stream:
+        return StreamingResponse(
+            _stream_service_settings(acquire_db_conn, service_name=service_name, ndjson=ndjson),
+            media_type='application/x-ndjson' if ndjson else 'application/json',
+        )
 
-    return [
-        rename_fields(setting)
-        async for setting in db_repo.get_service_settings(conn=db_conn, service_name=service_name)
-    ]
+    snapshot, stale_age = await settings_cache.get_service_snapshot_or_stale(
+        acquire_db_conn=acquire_db_conn, service_name=service_name
+    )
+    etag = make_etag(snapshot.version)
+    headers = _settings_headers(etag, stale_age)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={**headers, 'Vary': 'Accept-Encoding'})
+
+    return _snapshot_response(snapshot, body='legacy_json', accept_encoding=accept_encoding, headers=headers)
+
+
+@router.get('/setting/services', response_model=list[ServiceSettingsResponse], responses={304: {}})
+async def get_settings_of_services(
+    service_name: list[str] = Query(min_items=1, max_items=MAX_BATCH_SIZE),
+    if_none_match: str | None = Header(default=None),
+    acquire_db_conn: ConnAcquirer = Depends(get_db_read_conn_acquirer),
+) -> Response:
+    """
+    All settings of several services by one request, the services missing in the cache are read by one query. The
+    ETag changes whenever the version of any of the services changes.
+    """
+    snapshots, stale_age = await settings_cache.get_service_snapshots(
+        acquire_db_conn=acquire_db_conn, service_names=list(dict.fromkeys(service_name))
+    )
+    digest = hashlib.blake2b(digest_size=16)
+    for snapshot in snapshots.values():
+        digest.update(f'{snapshot.service_name}:{snapshot.version};'.encode())
+    etag = make_etag(digest.hexdigest())
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=_settings_headers(etag, stale_age))
+
+    # the settings of each service are encoded once per version and put into the body as they are
+    content = b'[%s]' % b','.join(
+        b'{"service_name":%s,"version":%s,"settings":%s}'
+        % (dumps(snapshot.service_name), dumps(snapshot.version), snapshot.settings_json)
+        for snapshot in snapshots.values()
+    )
+    return Response(content=content, media_type='application/json', headers=_settings_headers(etag, stale_age))
+
+
+@router.get('/setting/wait/{service_name}', response_model=list[SettingData], responses={304: {}})
+async def wait_service_settings(
+    service_name: str,
+    version: str | None = None,
+    timeout: float = Query(default=30, gt=0, le=60),
+    accept_encoding: str | None = Header(default=None),
+    acquire_db_conn: ConnAcquirer = Depends(get_db_conn_acquirer),
+) -> Response:
+    """
+    Long polling: responds as soon as the version of the service settings differs from the version received by the
+    client (the ETag of the previous response without quotes) or with 304 when the timeout expires
+    """
+    if version is not None:
+        # the ETag of a compressed response ends with the name of the encoding
+        version = remove_etag_encoding(version)
+    snapshot = await setting_changes.wait_for_service_snapshot(
+        acquire_db_conn=acquire_db_conn, service_name=service_name, version=version, timeout=timeout
+    )
+    etag = make_etag(snapshot.version)
+    if snapshot.version == version:
+        return Response(status_code=304, headers={'ETag': etag})
+
+    return _snapshot_response(snapshot, body='settings_json', accept_encoding=accept_encoding, headers={'ETag': etag})
+
+
+@router.get('/setting/changes/{service_name}', response_model=ServiceSettingsChanges)
+async def get_service_settings_changes(
+    service_name: str,
+    since: int = Query(default=0, ge=0),
+    acquire_db_conn: ConnAcquirer = Depends(get_db_conn_acquirer),
+) -> JSONResponse:
+    """
+    Returns the settings of the service created or changed since the given version and the names of the deleted
+    settings. The version of the response is passed as "since" in the next request, the settings changed shortly
+    before it may be returned again.
+    """
+    async with acquire_db_conn() as conn:
+        changes = await db_repo.get_service_settings_changes(conn=conn, service_name=service_name, since=since)
+    return JSONResponse(content=changes)
+
+
+@router.get('/setting/subscribe', response_class=StreamingResponse)
+async def subscribe_to_settings(
+    service_name: list[str] = Query(min_items=1, max_items=MAX_BATCH_SIZE),
+    resume_token: str | None = None,
+    last_event_id: str | None = Header(default=None),
+) -> StreamingResponse:
+    """
+    Server-sent events stream of the changes of the settings of the services. The resume token is the id of the last
+    received event, it is also taken from the Last-Event-ID header when the client reconnects.
+    """
+    return StreamingResponse(
+        stream_setting_events(
+            broadcaster=get_settings_broadcaster(),
+            service_names=list(dict.fromkeys(service_name)),
+            known_versions=decode_resume_token(resume_token or last_event_id),
+        ),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+
+@router.get('/stats/settings-cache', response_model=CacheStats)
+def get_settings_cache_stats() -> CacheStats:
+    return settings_cache.get_settings_cache().stats()
+
+
+@router.get('/stats/db-pool', response_model=PoolStats)
+def get_pool_stats() -> PoolStats:
+    return get_db_pool_stats()
+
+
+@router.get('/stats/db-replicas', response_model=list[ReplicaStats])
+def get_replica_stats() -> list[ReplicaStats]:
+    return get_db_replica_stats()
+
+
+@router.get('/stats/db-conn-hold-time', response_model=dict[str, RouteConnHoldTime])
+def get_conn_hold_time_stats() -> dict[str, RouteConnHoldTime]:
+    return conn_hold_time_stats.stats()
+
+
+@router.get('/metrics', response_class=Response, include_in_schema=False)
+def get_metrics() -> Response:
+    # the metrics files of the workers are read from the disk, so it is run in the thread pool
+    return Response(content=metrics.collect_metrics(), media_type=metrics.METRICS_CONTENT_TYPE)
 
 
 @router.get('/health-check')
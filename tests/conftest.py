@@ -1,4 +1,6 @@
 import typing as t
+from contextlib import asynccontextmanager
+from functools import partial
 
 import pytest
 from aiopg.sa import Engine, SAConnection
@@ -6,7 +8,13 @@ from fastapi import FastAPI
 from httpx import AsyncClient
 
 from runtime_config.config import Config, get_config
-from runtime_config.lib.db import close_db, get_db_conn, init_db
+from runtime_config.lib.db import (
+    close_db,
+    get_db_conn,
+    get_db_conn_acquirer,
+    get_db_read_conn_acquirer,
+    init_db,
+)
 from runtime_config.lib.db_utils import apply_migrations, create_db, drop_db
 from runtime_config.main import app_factory
 from tests.fixtures import *  # noqa: F403, F401
@@ -47,10 +55,17 @@ async def db_conn_fixture(db: Engine) -> t.AsyncGenerator[SAConnection, None]:
         await tx.rollback()
 
 
+@asynccontextmanager
+async def _acquire_test_conn(conn: SAConnection) -> t.AsyncIterator[SAConnection]:
+    yield conn
+
+
 @pytest.fixture(name='app')
 async def app_fixture(config: Config, db_conn: SAConnection) -> t.AsyncGenerator[FastAPI, None]:
     app = app_factory(app_hooks=lambda *args, **kwargs: None)
     app.dependency_overrides[get_db_conn] = lambda: db_conn
+    app.dependency_overrides[get_db_conn_acquirer] = lambda: partial(_acquire_test_conn, db_conn)
+    app.dependency_overrides[get_db_read_conn_acquirer] = lambda: partial(_acquire_test_conn, db_conn)
     yield app
 
 
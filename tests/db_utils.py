@@ -4,7 +4,7 @@ from aiopg.sa import SAConnection
 from sqlalchemy import func, select
 from sqlalchemy.dialects.postgresql import insert
 
-from runtime_config.models import Setting
+from runtime_config.models import Setting, SettingHistory
 
 
 async def create_setting(conn: SAConnection, value: dict[str, t.Any]) -> dict[str, t.Any]:
@@ -12,6 +12,15 @@ async def create_setting(conn: SAConnection, value: dict[str, t.Any]) -> dict[st
     return dict(await (await conn.execute(query)).fetchone())
 
 
+async def create_settings(conn: SAConnection, values: list[dict[str, t.Any]]) -> list[dict[str, t.Any]]:
+    query = insert(Setting).values(values).returning('*')
+    return [dict(row) for row in await (await conn.execute(query)).fetchall()]
+
+
+async def create_setting_history(conn: SAConnection, values: list[dict[str, t.Any]]) -> None:
+    await conn.execute(insert(SettingHistory).values(values))
+
+
 async def count_settings(conn: SAConnection) -> int:
     query = select(func.count()).subquery(select(Setting))
     return (await (await conn.execute(query)).fetchone())[0]
@@ -1,8 +1,12 @@
+from contextlib import asynccontextmanager
+
 import pytest
 
 from runtime_config.enums.settings import ValueType
+from runtime_config.services import settings_cache
+from runtime_config.services.settings_broadcaster import SettingsBroadcaster
 
-__all__ = ['setting_data_fixture']
+__all__ = ['setting_data_fixture', 'broadcaster_fixture']
 
 
 @pytest.fixture(name='setting_data')
@@ -15,3 +19,15 @@ def setting_data_fixture(config):
         'service_name': 'service-name',
         'created_by_db_user': config.db_user,
     }
+
+
+@pytest.fixture(name='broadcaster')
+async def broadcaster_fixture(db_conn):
+    @asynccontextmanager
+    async def acquire_db_conn():
+        yield db_conn
+
+    settings_cache.init_settings_cache(max_size=10, ttl=None)
+    broadcaster = SettingsBroadcaster(acquire_db_conn=acquire_db_conn, heartbeat_interval=1)
+    yield broadcaster
+    await broadcaster.close()
@@ -0,0 +1,95 @@
+from pytest_mock import MockerFixture
+
+from runtime_config.lib.cache import TTLCache
+
+
+def test_ttl_cache__get_missing_key__return_none():
+    # arrange
+    cache: TTLCache[str, int] = TTLCache(max_size=2)
+
+    # act
+    value = cache.get('key')
+
+    # assert
+    assert value is None
+    assert cache.stats() == {'size': 0, 'max_size': 2, 'hits': 0, 'misses': 1, 'evictions': 0}
+
+
+def test_ttl_cache__get_stored_key__return_value():
+    # arrange
+    cache: TTLCache[str, int] = TTLCache(max_size=2)
+    cache.set('key', 1)
+
+    # act
+    value = cache.get('key')
+
+    # assert
+    assert value == 1
+    assert cache.stats() == {'size': 1, 'max_size': 2, 'hits': 1, 'misses': 0, 'evictions': 0}
+
+
+def test_ttl_cache__entry_expired__return_none(mocker: MockerFixture):
+    # arrange
+    monotonic_mock = mocker.patch('runtime_config.lib.cache.time.monotonic', return_value=100)
+    cache: TTLCache[str, int] = TTLCache(max_size=2, ttl=5)
+    cache.set('key', 1)
+    monotonic_mock.return_value = 105
+
+    # act
+    value = cache.get('key')
+
+    # assert
+    assert value is None
+    assert len(cache) == 0
+
+
+def test_ttl_cache__size_exceeded__least_recently_used_entry_evicted():
+    # arrange
+    cache: TTLCache[str, int] = TTLCache(max_size=2)
+    cache.set('key1', 1)
+    cache.set('key2', 2)
+    cache.get('key1')
+
+    # act
+    cache.set('key3', 3)
+
+    # assert
+    assert cache.get('key2') is None
+    assert cache.get('key1') == 1
+    assert cache.get('key3') == 3
+    assert cache.evictions == 1
+
+
+def test_ttl_cache__invalidate_and_clear():
+    # arrange
+    cache: TTLCache[str, int] = TTLCache(max_size=3)
+    for i, key in enumerate(('key1', 'key2', 'key3')):
+        cache.set(key, i)
+
+    # act
+    cache.invalidate('key1')
+    cache.invalidate('unknown')
+    size_after_invalidate = len(cache)
+    cache.clear()
+
+    # assert
+    assert size_after_invalidate == 2
+    assert len(cache) == 0
+
+
+def test_ttl_cache__invalidate_key__generation_of_only_that_key_changed():
+    # arrange
+    cache: TTLCache[str, int] = TTLCache(max_size=3)
+    initial = {key: cache.get_generation(key) for key in ('key1', 'key2')}
+
+    # act
+    cache.invalidate('key1')
+    after_invalidate = {key: cache.get_generation(key) for key in ('key1', 'key2')}
+    cache.clear()
+    after_clear = {key: cache.get_generation(key) for key in ('key1', 'key2')}
+
+    # assert
+    assert after_invalidate['key1'] != initial['key1']
+    assert after_invalidate['key2'] == initial['key2']
+    assert after_clear['key1'] not in (initial['key1'], after_invalidate['key1'])
+    assert after_clear['key2'] != initial['key2']
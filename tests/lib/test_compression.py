@@ -0,0 +1,28 @@
+import gzip
+
+import pytest
+
+from runtime_config.lib.compression import Compressor
+
+brotli = pytest.importorskip('brotli')
+
+
+@pytest.mark.parametrize('encoding, decompress', [('gzip', gzip.decompress), ('br', brotli.decompress)])
+def test_compressor__compress__return_compressed_body(encoding, decompress):
+    # arrange
+    compressor = Compressor(minimum_size=0, gzip_level=6, brotli_quality=4)
+
+    # act
+    compressed = compressor.compress(b'a' * 100, encoding)
+
+    # assert
+    assert decompress(compressed) == b'a' * 100
+
+
+def test_compressor__unsupported_encoding__raise_value_error():
+    # arrange
+    compressor = Compressor(minimum_size=0, gzip_level=6, brotli_quality=4)
+
+    # act && assert
+    with pytest.raises(ValueError):
+        compressor.compress(b'a', 'deflate')
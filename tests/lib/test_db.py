@@ -1,10 +1,33 @@
+import asyncio
+
+import psycopg2
 import pytest
 from aiopg.sa import Engine
 from pytest_mock import MockerFixture
+from structlog import get_config
+from structlog.contextvars import bound_contextvars, merge_contextvars
+from structlog.testing import capture_logs
 
 import runtime_config.lib.db as db_module
-from runtime_config.lib.db import close_db, get_db, get_db_conn
-from runtime_config.lib.exception import ServiceInstanceNotFound
+from runtime_config.lib.db import (
+    Replica,
+    ReplicaSet,
+    acquire_db_conn,
+    acquire_read_db_conn,
+    close_db,
+    close_db_replicas,
+    get_db,
+    get_db_conn,
+    get_db_conn_acquirer,
+    get_db_pool_stats,
+    get_db_replica_stats,
+    get_query_fingerprint,
+    init_db,
+    init_db_replicas,
+    track_conn_hold_time,
+    track_queries,
+)
+from runtime_config.lib.exception import DatabaseUnavailable, ServiceInstanceNotFound
 
 
 def test_get_db(mocker: MockerFixture):
@@ -24,7 +47,229 @@ async def test_get_db_conn(db_mock):
     conn = await anext(get_db_conn())
 
     # arrange
-    assert conn == await db_mock.acquire().__aenter__()
+    assert conn.connection == db_mock.acquire.return_value.connection
+
+
+async def test_acquire_db_conn__connection_released(db_mock):
+    # act
+    async with acquire_db_conn() as conn:
+        pass
+
+    # arrange
+    assert conn.connection is None
+    db_mock.release.assert_awaited_once_with(conn)
+
+
+async def test_acquire_db_conn__no_free_connection__raise_database_unavailable(mocker: MockerFixture, db_mock):
+    # arrange
+    mocker.patch.dict(db_module._acquire_timeout, {'db': 0.01})
+    db_mock.acquire = mocker.Mock(side_effect=lambda: asyncio.sleep(1))
+
+    # act && assert
+    with pytest.raises(DatabaseUnavailable):
+        async with acquire_db_conn():
+            pass
+
+
+async def test_track_conn_hold_time__connections_taken__hold_times_collected(db_mock):
+    # act
+    with track_conn_hold_time() as hold_times:
+        async with acquire_db_conn():
+            await asyncio.sleep(0.01)
+        async with acquire_db_conn():
+            pass
+    async with acquire_db_conn():
+        pass
+
+    # assert
+    assert len(hold_times) == 2
+    assert hold_times[0] >= 0.01
+
+
+@pytest.mark.parametrize(
+    'query, expected_fingerprint',
+    [
+        (
+            "SELECT * FROM setting WHERE name = 'it''s' AND id > 10",
+            'SELECT * FROM setting WHERE name = ? AND id > ?',
+        ),
+        ('SELECT *\n  FROM setting WHERE id IN (1, 2,3)', 'SELECT * FROM setting WHERE id IN (?)'),
+        ('SELECT * FROM setting WHERE id in ( 7 )', 'SELECT * FROM setting WHERE id IN (?)'),
+        ('FETCH FORWARD 500 FROM service_settings_cursor', 'FETCH FORWARD ? FROM service_settings_cursor'),
+        ('SELECT * FROM setting_history_p202610', 'SELECT * FROM setting_history_p202610'),
+    ],
+)
+def test_get_query_fingerprint__literals_replaced(query, expected_fingerprint):
+    # act
+    fingerprint = get_query_fingerprint(query)
+
+    # assert
+    assert fingerprint == expected_fingerprint
+
+
+@pytest.fixture(name='captured_logs')
+def captured_logs_fixture():
+    with capture_logs() as logs:
+        # the values bound to the context are merged into the records as the logger is configured to do
+        get_config()['processors'].insert(0, merge_contextvars)
+        yield logs
+
+
+async def test_acquire_db_conn__slow_query__logged_with_request_id(mocker: MockerFixture, db, captured_logs):
+    # arrange
+    mocker.patch.dict(db_module._slow_query_threshold, {'db': 0.05})
+
+    # act
+    with bound_contextvars(request_id='req-1'), track_queries() as queries:
+        async with acquire_db_conn() as conn:
+            await conn.execute('SELECT pg_sleep(0.1)')
+
+    # assert
+    slow_query_logs = [log for log in captured_logs if log['event'] == 'Slow database query']
+    assert slow_query_logs == [
+        {
+            'event': 'Slow database query',
+            'log_level': 'warning',
+            'request_id': 'req-1',
+            'fingerprint': 'SELECT pg_sleep(?)',
+            'duration': mocker.ANY,
+            'rowcount': 1,
+        }
+    ]
+    assert slow_query_logs[0]['duration'] >= 0.1
+    assert len(queries) == 1
+
+
+async def test_acquire_db_conn__fast_queries__not_logged_and_traced(mocker: MockerFixture, db, captured_logs):
+    # arrange
+    mocker.patch.dict(db_module._slow_query_threshold, {'db': 0.05})
+
+    # act
+    with track_queries() as queries:
+        async with acquire_db_conn() as conn:
+            await conn.execute('SELECT 1')
+            assert [row[0] async for row in conn.execute('SELECT generate_series(1, 3)')] == [1, 2, 3]
+            assert await conn.scalar('SELECT 2') == 2
+
+    # assert
+    assert [log for log in captured_logs if log['event'] == 'Slow database query'] == []
+    assert [(query.fingerprint, query.rowcount) for query in queries] == [
+        ('SELECT ?', 1),
+        ('SELECT generate_series(?, ?)', 3),
+        ('SELECT ?', 1),
+    ]
+
+
+def test_get_db_conn_acquirer(db_mock):
+    # act
+    acquirer = get_db_conn_acquirer()
+
+    # arrange
+    assert acquirer == acquire_db_conn
+
+
+def test_get_db_pool_stats(db_mock):
+    # arrange
+    db_mock.configure_mock(minsize=1, maxsize=10, size=4, freesize=1)
+
+    # act
+    stats = get_db_pool_stats()
+
+    # assert
+    assert stats == {'min_size': 1, 'max_size': 10, 'size': 4, 'free': 1, 'used': 3}
+
+
+async def test_init_db__statement_timeout_exceeded__raise_timeout_error(config):
+    # arrange
+    db = await init_db(dsn=config.db_dsn, min_size=0, max_size=2, acquire_timeout=1, statement_timeout=0.05)
+
+    # act && assert
+    try:
+        with pytest.raises(asyncio.TimeoutError):
+            async with acquire_db_conn() as conn:
+                await conn.execute('SELECT pg_sleep(1)')
+        assert (db.minsize, db.maxsize) == (0, 2)
+    finally:
+        await close_db()
+
+
+async def test_acquire_read_db_conn__no_replicas__primary_used(mocker: MockerFixture, db_mock):
+    # arrange
+    mocker.patch.dict(db_module._replicas, {}, clear=True)
+
+    # act
+    async with acquire_read_db_conn() as conn:
+        pass
+
+    # assert
+    db_mock.release.assert_awaited_once_with(conn)
+
+
+async def test_acquire_read_db_conn__healthy_replica__replica_used(mocker: MockerFixture, db_mock, replicas):
+    # act
+    async with acquire_read_db_conn() as conn:
+        pass
+
+    # assert
+    assert conn.connection is None
+    replicas.replicas[0].db.release.assert_awaited_once_with(conn)
+    db_mock.acquire.assert_not_awaited()
+
+
+async def test_acquire_read_db_conn__replica_unavailable__primary_used(mocker: MockerFixture, db_mock, replicas):
+    # arrange
+    replica = replicas.replicas[0]
+    replica.db.acquire.side_effect = psycopg2.OperationalError('connection refused')
+
+    # act
+    async with acquire_read_db_conn() as conn:
+        pass
+    async with acquire_read_db_conn():
+        pass
+
+    # assert
+    db_mock.release.assert_any_await(conn)
+    assert not replica.healthy
+    assert replica.db.acquire.await_count == 1
+
+
+@pytest.mark.parametrize('lag, expected_healthy', [(0, True), (4.5, True), (5.5, False)])
+async def test_replica_set_check__lag_checked_against_ceiling(mocker: MockerFixture, replicas, lag, expected_healthy):
+    # arrange
+    replica = replicas.replicas[0]
+    conn = mocker.AsyncMock()
+    conn.scalar.return_value = lag
+    replica.db.acquire = mocker.MagicMock()
+    replica.db.acquire.return_value.__aenter__.return_value = conn
+
+    # act
+    await replicas.check()
+
+    # assert
+    assert replica.healthy is expected_healthy
+    assert replica.lag == lag
+
+
+async def test_init_db_replicas__replica_available__reads_routed_to_replica(config):
+    # arrange
+    replicas = await init_db_replicas(dsns=[config.db_dsn], max_lag=5, check_interval=60)
+
+    # act && assert
+    try:
+        assert replicas is not None
+        async with acquire_read_db_conn() as conn:
+            assert await conn.scalar('SELECT 1') == 1
+        assert get_db_replica_stats() == [
+            {
+                'host': config.db_host,
+                'healthy': True,
+                'lag': 0,
+                'pool': {'min_size': 0, 'max_size': 10, 'size': 1, 'free': 1, 'used': 0},
+            }
+        ]
+    finally:
+        await close_db_replicas()
+    assert get_db_replica_stats() == []
 
 
 def test_get_db__db_engine_instance_was_not_created__raise_exception(mocker: MockerFixture):
@@ -56,5 +301,19 @@ async def test_close_db__db_engine_instance_was_not_created__success(mocker: Moc
 @pytest.fixture(name='db_mock')
 def db_mock_fixture(mocker: MockerFixture):
     db_mock = mocker.MagicMock(spec=Engine)
+    db_mock.acquire = mocker.AsyncMock(return_value=mocker.AsyncMock())
+    db_mock.release = mocker.AsyncMock()
     mocker.patch.dict(db_module._inst, {'db': db_mock})
     return db_mock
+
+
+@pytest.fixture(name='replicas')
+def replicas_fixture(mocker: MockerFixture):
+    replica_db_mock = mocker.MagicMock(spec=Engine)
+    replica_db_mock.acquire = mocker.AsyncMock(return_value=mocker.AsyncMock())
+    replica_db_mock.release = mocker.AsyncMock()
+    replica = Replica(dsn=mocker.Mock(host='replica'), db=replica_db_mock)
+    replica.healthy = True
+    replicas = ReplicaSet(replicas=[replica], max_lag=5, check_interval=60)
+    mocker.patch.dict(db_module._replicas, {'db': replicas})
+    return replicas
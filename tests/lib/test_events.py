@@ -0,0 +1,62 @@
+import asyncio
+
+from runtime_config.lib.events import KeyedEvents
+
+
+async def test_keyed_events__key_notified__only_subscribers_of_key_woken_up():
+    # arrange
+    events = KeyedEvents()
+
+    # act
+    with events.subscribe('key1') as event1, events.subscribe('key2') as event2:
+        events.notify('key1')
+        events.notify('unknown')
+
+    # assert
+    assert event1.is_set()
+    assert not event2.is_set()
+
+
+async def test_keyed_events__subscribe_after_notify__new_event_returned():
+    # arrange
+    events = KeyedEvents()
+
+    # act
+    with events.subscribe('key') as event1:
+        events.notify('key')
+        with events.subscribe('key') as event2:
+            pass
+
+    # assert
+    assert event1.is_set()
+    assert not event2.is_set()
+
+
+async def test_keyed_events__notify_all__all_subscribers_woken_up():
+    # arrange
+    events = KeyedEvents()
+
+    # act
+    with events.subscribe('key1') as event1, events.subscribe('key2') as event2:
+        events.notify_all()
+        await asyncio.wait_for(asyncio.gather(event1.wait(), event2.wait()), timeout=1)
+
+    # assert
+    assert event1.is_set()
+    assert event2.is_set()
+
+
+def test_keyed_events__all_subscribers_left__event_removed():
+    # arrange
+    events = KeyedEvents()
+
+    # act
+    with events.subscribe('key'):
+        with events.subscribe('key'):
+            pass
+        subscribed = 'key' in events._events
+
+    # assert
+    assert subscribed
+    assert events._events == {}
+    assert events._subscribers == {}
@@ -0,0 +1,81 @@
+import asyncio
+import os
+
+from prometheus_client import REGISTRY
+
+from runtime_config.lib.metrics import (
+    MULTIPROC_DIR_ENV,
+    prepare_multiprocess_dir,
+    track_query_duration,
+    track_query_stream_duration,
+)
+
+
+def _get_query_stats(function: str) -> tuple[float, float]:
+    labels = {'function': function}
+    count = REGISTRY.get_sample_value('runtime_config_db_query_duration_seconds_count', labels) or 0
+    total = REGISTRY.get_sample_value('runtime_config_db_query_duration_seconds_sum', labels) or 0
+    return count, total
+
+
+async def test_track_query_duration__called__duration_observed():
+    # arrange
+    @track_query_duration
+    async def get_item_for_test(item_id: int) -> int:
+        await asyncio.sleep(0.01)
+        return item_id
+
+    count_before, total_before = _get_query_stats('get_item_for_test')
+
+    # act
+    result = await get_item_for_test(1)
+
+    # assert
+    count, total = _get_query_stats('get_item_for_test')
+    assert result == 1
+    assert count == count_before + 1
+    assert total - total_before >= 0.01
+
+
+async def test_track_query_stream_duration__stream_abandoned__time_between_rows_not_counted_and_stream_closed():
+    # arrange
+    closed = []
+
+    @track_query_stream_duration
+    async def get_items_for_test(count: int):
+        try:
+            for item_id in range(count):
+                yield item_id
+        finally:
+            closed.append(True)
+
+    count_before, total_before = _get_query_stats('get_items_for_test')
+
+    # act
+    items = get_items_for_test(3)
+    async for item_id in items:
+        await asyncio.sleep(0.05)
+        if item_id == 1:
+            break
+    await items.aclose()
+
+    # assert
+    count, total = _get_query_stats('get_items_for_test')
+    assert count == count_before + 1
+    assert total - total_before < 0.05
+    assert closed == [True]
+
+
+def test_prepare_multiprocess_dir__metrics_of_previous_run__removed(monkeypatch, tmp_path):
+    # arrange
+    # the variable set by the function is restored after the test
+    monkeypatch.setenv(MULTIPROC_DIR_ENV, '')
+    (tmp_path / 'counter_1.db').write_bytes(b'')
+    (tmp_path / 'other.txt').write_bytes(b'')
+
+    # act
+    prepare_multiprocess_dir(str(tmp_path))
+
+    # assert
+    assert os.environ[MULTIPROC_DIR_ENV] == str(tmp_path)
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['other.txt']
@@ -0,0 +1,61 @@
+import asyncio
+
+from aiopg.sa import Engine
+from pytest_mock import MockerFixture
+
+from runtime_config.lib.pg_listener import PgListener
+
+
+async def test_pg_listener__notification_sent__handler_called(mocker: MockerFixture, config, db: Engine):
+    # arrange
+    received: asyncio.Queue[str] = asyncio.Queue()
+    connect_handler = mocker.Mock()
+    listener = PgListener(dsn=config.db_dsn, channel='test_channel')
+    listener.add_handler(received.put_nowait)
+    listener.add_connect_handler(connect_handler)
+
+    # act
+    await listener.start()
+    await asyncio.wait_for(listener.wait_connected(), timeout=5)
+    async with db.acquire() as conn:
+        await conn.execute("SELECT pg_notify('test_channel', 'payload')")
+    payload = await asyncio.wait_for(received.get(), timeout=5)
+    await listener.stop()
+
+    # assert
+    assert payload == 'payload'
+    assert connect_handler.call_count == 1
+
+
+async def test_pg_listener__handler_raise_exc__other_handlers_called(mocker: MockerFixture, config, db: Engine):
+    # arrange
+    received: asyncio.Queue[str] = asyncio.Queue()
+    listener = PgListener(dsn=config.db_dsn, channel='test_channel')
+    listener.add_handler(mocker.Mock(side_effect=ValueError))
+    listener.add_handler(received.put_nowait)
+
+    # act
+    await listener.start()
+    await asyncio.wait_for(listener.wait_connected(), timeout=5)
+    async with db.acquire() as conn:
+        await conn.execute("SELECT pg_notify('test_channel', 'payload')")
+    payload = await asyncio.wait_for(received.get(), timeout=5)
+    await listener.stop()
+
+    # assert
+    assert payload == 'payload'
+
+
+async def test_pg_listener__connection_failed__reconnect(mocker: MockerFixture, config):
+    # arrange
+    connect_mock = mocker.patch('runtime_config.lib.pg_listener.aiopg.connect', side_effect=OSError)
+    listener = PgListener(dsn=config.db_dsn, channel='test_channel', reconnect_delay=0)
+
+    # act
+    await listener.start()
+    while connect_mock.call_count < 2:
+        await asyncio.sleep(0)
+    await listener.stop()
+
+    # assert
+    assert connect_mock.call_count >= 2
@@ -0,0 +1,79 @@
+import datetime
+import json
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+
+from runtime_config.enums.settings import ValueType
+from runtime_config.lib import serialization
+from runtime_config.repositories.db.entities import SettingData, SettingHistoryData
+from runtime_config.web.entities import GetSettingResponse
+
+
+def _fastapi_dumps(obj):
+    return json.dumps(
+        jsonable_encoder(obj), ensure_ascii=False, allow_nan=False, indent=None, separators=(',', ':')
+    ).encode('utf-8')
+
+
+def _make_setting(**values):
+    return SettingData(
+        **{
+            'id': 1,
+            'name': 'greeting',
+            'value': 'привет, "мир"\n ',
+            'value_type': ValueType.str,
+            'is_disabled': False,
+            'service_name': 'service-name',
+            'created_by_db_user': 'admin',
+            'updated_at': datetime.datetime(2022, 1, 2, 3, 4, 5, 123456, tzinfo=datetime.timezone.utc),
+            **values,
+        }
+    )
+
+
+@pytest.mark.parametrize('use_orjson', [True, False])
+@pytest.mark.parametrize(
+    'content',
+    [
+        [],
+        [_make_setting(), _make_setting(id=2, value=None, value_type=ValueType.null, is_disabled=True)],
+        [_make_setting(updated_at=datetime.datetime(2022, 1, 2, 3, 4, 5, tzinfo=datetime.timezone.utc))],
+        [_make_setting(updated_at=datetime.datetime(2022, 1, 2, 3, 4, 5))],
+        [
+            _make_setting(
+                updated_at=datetime.datetime(
+                    2022, 1, 2, 3, 4, 5, tzinfo=datetime.timezone(datetime.timedelta(hours=3))
+                )
+            )
+        ],
+        GetSettingResponse(
+            setting=_make_setting(),
+            change_history=[
+                SettingHistoryData(**_make_setting().dict(), is_deleted=True, deleted_by_db_user='admin'),
+            ],
+        ),
+        {'status': 'error', 'message': 'Variable with the same name already exists'},
+    ],
+)
+def test_dumps__encoded_in_same_way_as_fastapi(mocker, use_orjson, content):
+    # arrange
+    if not use_orjson:
+        mocker.patch.object(serialization, 'orjson', None)
+
+    # act
+    encoded = serialization.dumps(content)
+
+    # assert
+    assert encoded == _fastapi_dumps(content)
+
+
+@pytest.mark.parametrize('use_orjson', [True, False])
+def test_dumps__unknown_type__raise_type_error(mocker, use_orjson):
+    # arrange
+    if not use_orjson:
+        mocker.patch.object(serialization, 'orjson', None)
+
+    # act && assert
+    with pytest.raises(TypeError):
+        serialization.dumps(object())
@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+
+from runtime_config.lib.single_flight import SingleFlight
+
+
+async def test_single_flight__concurrent_calls_with_same_key__called_once():
+    # arrange
+    single_flight: SingleFlight[str, str] = SingleFlight()
+    calls = []
+    release = asyncio.Event()
+
+    async def func(key: str) -> str:
+        calls.append(key)
+        await release.wait()
+        return f'{key}{len(calls)}'
+
+    # act
+    results = asyncio.gather(
+        single_flight.do('a', lambda: func('a')),
+        single_flight.do('a', lambda: func('a')),
+        single_flight.do('b', lambda: func('b')),
+    )
+    await asyncio.sleep(0.01)
+    release.set()
+
+    # assert
+    assert await results == ['a2', 'a2', 'b2']
+    assert calls == ['a', 'b']
+    assert len(single_flight) == 0
+
+
+async def test_single_flight__call_failed__all_callers_get_exception_and_next_call_made():
+    # arrange
+    single_flight: SingleFlight[str, int] = SingleFlight()
+
+    async def fail() -> int:
+        await asyncio.sleep(0)
+        raise ValueError('failed')
+
+    async def succeed() -> int:
+        return 1
+
+    # act
+    results = await asyncio.gather(single_flight.do('a', fail), single_flight.do('a', fail), return_exceptions=True)
+    result = await single_flight.do('a', succeed)
+
+    # assert
+    assert [type(result) for result in results] == [ValueError, ValueError]
+    assert result == 1
+
+
+async def test_single_flight__caller_cancelled__call_not_cancelled_for_others():
+    # arrange
+    single_flight: SingleFlight[str, int] = SingleFlight()
+    release = asyncio.Event()
+
+    async def func() -> int:
+        await release.wait()
+        return 1
+
+    first = asyncio.create_task(single_flight.do('a', func))
+    second = asyncio.create_task(single_flight.do('a', func))
+    await asyncio.sleep(0)
+
+    # act
+    first.cancel()
+    await asyncio.sleep(0)
+    release.set()
+
+    # assert
+    with pytest.raises(asyncio.CancelledError):
+        await first
+    assert await second == 1
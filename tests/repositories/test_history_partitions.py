@@ -0,0 +1,126 @@
+import datetime
+
+import pytest
+from sqlalchemy import func, select, text
+from sqlalchemy.dialects.postgresql import insert
+
+from runtime_config.models import SettingHistory
+from runtime_config.repositories.db import history_partitions
+
+
+@pytest.fixture(name='create_history_entry')
+def create_history_entry_fixture(db_conn, setting_data):
+    async def create(updated_at: datetime.datetime, **kwargs) -> None:
+        query = insert(SettingHistory).values({**setting_data, **kwargs, 'updated_at': updated_at})
+        await db_conn.execute(query)
+
+    return create
+
+
+async def _get_partition_of_entries(conn) -> list[tuple[str, str, datetime.datetime]]:
+    query = text('SELECT tableoid::regclass::text AS partition, name, updated_at FROM setting_history ORDER BY id')
+    return [(row.partition, row.name, row.updated_at) async for row in conn.execute(query)]
+
+
+@pytest.mark.parametrize(
+    'month, months, expected',
+    [
+        (datetime.date(2022, 1, 1), 1, datetime.date(2022, 2, 1)),
+        (datetime.date(2022, 12, 1), 1, datetime.date(2023, 1, 1)),
+        (datetime.date(2022, 1, 1), -1, datetime.date(2021, 12, 1)),
+        (datetime.date(2022, 5, 1), 20, datetime.date(2024, 1, 1)),
+    ],
+)
+def test_add_months(month, months, expected):
+    # act
+    result = history_partitions.add_months(month, months)
+
+    # assert
+    assert result == expected
+
+
+async def test_create_history_partitions__entries_in_default_partition__moved_to_created_partition(
+    db_conn, create_history_entry
+):
+    # arrange
+    current_month = history_partitions.month_start(await history_partitions.get_db_now(db_conn))
+    existing = await history_partitions.get_history_partitions(db_conn)
+    future_month = history_partitions.add_months(current_month, len(existing) + 1)
+    await create_history_entry(updated_at=datetime.datetime.combine(future_month, datetime.time(10)))
+
+    # act
+    created = await history_partitions.create_history_partitions(db_conn, months_ahead=len(existing) + 1)
+
+    # assert
+    assert created[-1] == history_partitions.get_partition_name(future_month)
+    assert await _get_partition_of_entries(db_conn) == [
+        (created[-1], 'timeout', datetime.datetime.combine(future_month, datetime.time(10)))
+    ]
+    assert await history_partitions.create_history_partitions(db_conn, months_ahead=len(existing) + 1) == []
+
+
+async def test_prune_history_partitions__expired_partition__last_versions_kept(db_conn, create_history_entry):
+    # arrange
+    old_month = datetime.date(2020, 1, 1)
+    name = await history_partitions.create_history_partition(db_conn, old_month)
+    for day in (1, 2, 3):
+        await create_history_entry(updated_at=datetime.datetime(2020, 1, day), name='timeout')
+        await create_history_entry(updated_at=datetime.datetime(2020, 1, day), name='retries')
+    await create_history_entry(updated_at=await history_partitions.get_db_now(db_conn), name='retries')
+
+    # act
+    pruned = await history_partitions.prune_history_partitions(db_conn, retention_days=30, keep_versions=2)
+
+    # assert
+    assert pruned == {name: 3, history_partitions.DEFAULT_PARTITION: 3}
+    assert old_month not in await history_partitions.get_history_partitions(db_conn)
+    kept = [
+        (partition, setting_name, updated_at)
+        for partition, setting_name, updated_at in await _get_partition_of_entries(db_conn)
+        if updated_at.year == 2020
+    ]
+    assert sorted(kept) == [
+        (history_partitions.DEFAULT_PARTITION, 'retries', datetime.datetime(2020, 1, 3)),
+        (history_partitions.DEFAULT_PARTITION, 'timeout', datetime.datetime(2020, 1, 2)),
+        (history_partitions.DEFAULT_PARTITION, 'timeout', datetime.datetime(2020, 1, 3)),
+    ]
+    assert await db_conn.scalar(select(func.count()).select_from(SettingHistory)) == 4
+
+
+async def test_prune_history_partitions__detach_only__partition_not_dropped(db_conn, create_history_entry):
+    # arrange
+    name = await history_partitions.create_history_partition(db_conn, datetime.date(2020, 1, 1))
+    await create_history_entry(updated_at=datetime.datetime(2020, 1, 1))
+
+    # act
+    pruned = await history_partitions.prune_history_partitions(db_conn, retention_days=30, keep_versions=0, drop=False)
+
+    # assert
+    assert pruned == {name: 0, history_partitions.DEFAULT_PARTITION: 0}
+    assert await _get_partition_of_entries(db_conn) == []
+    assert await db_conn.scalar(text(f'SELECT count(*) FROM {name}')) == 1
+
+
+async def test_prune_history_partitions__pruned_twice__default_partition_pruned(db_conn, create_history_entry):
+    # arrange
+    await history_partitions.create_history_partition(db_conn, datetime.date(2020, 1, 1))
+    for day in (1, 2, 3):
+        await create_history_entry(updated_at=datetime.datetime(2020, 1, day))
+    first_pruned = await history_partitions.prune_history_partitions(db_conn, retention_days=30, keep_versions=2)
+    # the changes of a setting last updated long ago are written with its old update time to the default partition
+    for day in (1, 2):
+        await create_history_entry(updated_at=datetime.datetime(2020, 2, day))
+    count_default = text(f'SELECT count(*) FROM {history_partitions.DEFAULT_PARTITION}')
+    count_before = await db_conn.scalar(count_default)
+
+    # act
+    pruned = await history_partitions.prune_history_partitions(db_conn, retention_days=30, keep_versions=2)
+
+    # assert
+    assert first_pruned[history_partitions.DEFAULT_PARTITION] == 2
+    assert count_before == 4
+    assert pruned == {history_partitions.DEFAULT_PARTITION: 2}
+    assert await _get_partition_of_entries(db_conn) == [
+        (history_partitions.DEFAULT_PARTITION, 'timeout', datetime.datetime(2020, 2, 1)),
+        (history_partitions.DEFAULT_PARTITION, 'timeout', datetime.datetime(2020, 2, 2)),
+    ]
@@ -0,0 +1,33 @@
+from aiopg.sa import Engine
+from sqlalchemy import delete
+
+from runtime_config.models import Setting, SettingHistory
+from runtime_config.repositories.db import repo
+from tests.db_utils import create_setting
+
+
+async def test_get_service_settings_changes__earlier_transaction_committed_later__its_changes_returned(
+    db: Engine, setting_data
+):
+    # arrange
+    service_name = setting_data['service_name']
+    async with db.acquire() as writer, db.acquire() as other_writer, db.acquire() as reader:
+        try:
+            tx = await writer.begin()
+            await create_setting(writer, {**setting_data, 'name': 'committed_late'})
+            await create_setting(other_writer, {**setting_data, 'name': 'committed_early'})
+
+            # act
+            changes = await repo.get_service_settings_changes(reader, service_name=service_name, since=0)
+            await tx.commit()
+            next_changes = await repo.get_service_settings_changes(
+                reader, service_name=service_name, since=changes.version
+            )
+        finally:
+            await reader.execute(delete(Setting).where(Setting.service_name == service_name))
+            await reader.execute(delete(SettingHistory).where(SettingHistory.service_name == service_name))
+
+    # assert
+    assert [i.name for i in changes.upserted] == ['committed_early']
+    assert 'committed_late' in [i.name for i in next_changes.upserted]
+    assert next_changes.version > changes.version
@@ -0,0 +1,118 @@
+import io
+import typing as t
+
+import psycopg2
+import pytest
+from psycopg2.extensions import connection as PgConnection
+
+from runtime_config.config import Config
+from runtime_config.enums.settings import SettingsFileFormat
+from runtime_config.repositories.db import transfer
+
+
+@pytest.fixture(name='pg_conn')
+def pg_conn_fixture(config: Config) -> t.Generator[PgConnection, None, None]:
+    conn = psycopg2.connect(config.db_dsn, client_encoding='utf8')
+    yield conn
+    conn.rollback()
+    conn.close()
+
+
+def _create_settings(conn: PgConnection, rows: list[tuple[str, str, str | None, str]]) -> None:
+    with conn.cursor() as cursor:
+        cursor.executemany(
+            'INSERT INTO setting (service_name, name, value, value_type) VALUES (%s, %s, %s, %s)',
+            rows,
+        )
+
+
+def _get_settings(conn: PgConnection) -> list[tuple[str, str, str | None, str, bool]]:
+    with conn.cursor() as cursor:
+        cursor.execute(
+            'SELECT service_name, name, value, value_type, is_disabled FROM setting ORDER BY service_name, name'
+        )
+        return cursor.fetchall()
+
+
+@pytest.mark.parametrize('file_format', list(SettingsFileFormat))
+def test_export_settings__import_exported__same_settings(pg_conn, file_format):
+    # arrange
+    _create_settings(
+        pg_conn,
+        [
+            ('first', 'greeting', 'Привет, "мир"\n\\n;,\t', 'str'),
+            ('first', 'empty', None, 'null'),
+            ('second', 'timeout', '10', 'int'),
+            ('third', 'timeout', '20', 'int'),
+        ],
+    )
+    expected = [setting for setting in _get_settings(pg_conn) if setting[0] != 'third']
+    file = io.BytesIO()
+    progress: list[int] = []
+
+    # act
+    exported = transfer.export_settings(
+        pg_conn, file, service_names=['first', 'second'], file_format=file_format, on_progress=progress.append
+    )
+    with pg_conn.cursor() as cursor:
+        cursor.execute('DELETE FROM setting;')
+    file.seek(0)
+    result = transfer.import_settings(pg_conn, file, file_format=file_format)
+
+    # assert
+    assert exported == 3
+    assert sum(progress) == len(file.getvalue())
+    assert result == transfer.ImportResult(created=3, updated=0, deleted=0)
+    assert _get_settings(pg_conn) == expected
+
+
+def test_import_settings__existing_settings__merged(pg_conn):
+    # arrange
+    _create_settings(
+        pg_conn,
+        [
+            ('service', 'unchanged', '1', 'int'),
+            ('service', 'changed', '1', 'int'),
+            ('service', 'missing', '1', 'int'),
+            ('other', 'missing', '1', 'int'),
+        ],
+    )
+    file = io.BytesIO(
+        b'{"service_name": "service", "name": "unchanged", "value": "1", "value_type": "int"}\n'
+        b'{"service_name": "service", "name": "changed", "value": "2", "value_type": "int"}\n'
+        b'{"service_name": "service", "name": "changed", "value": "3", "value_type": "int", "is_disabled": true}\n'
+        b'{"service_name": "service", "name": "new", "value": "1", "value_type": "int"}\n'
+    )
+
+    # act
+    result = transfer.import_settings(pg_conn, file, file_format=SettingsFileFormat.ndjson, replace=True)
+
+    # assert
+    assert result == transfer.ImportResult(created=1, updated=1, deleted=1)
+    assert _get_settings(pg_conn) == [
+        ('other', 'missing', '1', 'int', False),
+        ('service', 'changed', '3', 'int', True),
+        ('service', 'new', '1', 'int', False),
+        ('service', 'unchanged', '1', 'int', False),
+    ]
+
+
+def test_import_settings__ndjson_with_empty_lines__empty_lines_skipped(pg_conn):
+    # arrange
+    file = io.BytesIO(
+        b'{"service_name": "service", "name": "first", "value": "1", "value_type": "int"}\n'
+        b'\n'
+        b' \t\n'
+        b'{"service_name": "service", "name": "second", "value": "2", "value_type": "int"}\n'
+        b'\n'
+    )
+
+    # act
+    result = transfer.import_settings(pg_conn, file, file_format=SettingsFileFormat.ndjson)
+
+    # assert
+    assert result == transfer.ImportResult(created=2, updated=0, deleted=0)
+    assert _get_settings(pg_conn) == [
+        ('service', 'first', '1', 'int', False),
+        ('service', 'second', '2', 'int', False),
+    ]
@@ -0,0 +1,60 @@
+import pytest
+from pytest_mock import MockerFixture
+
+from runtime_config.lib.exception import ServiceInstanceNotFound
+from runtime_config.services import setting_changes
+from runtime_config.services.setting_changes import (
+    close_setting_listener,
+    get_setting_listener,
+    on_setting_changed,
+)
+from runtime_config.services.settings_cache import init_settings_cache
+
+
+def test_on_setting_changed__service_name_passed__only_service_entry_invalidated():
+    # arrange
+    cache = init_settings_cache(max_size=10, ttl=None)
+    cache.set('service1', [])
+    cache.set('service2', [])
+
+    # act
+    on_setting_changed('service1')
+
+    # assert
+    assert cache.get('service1') is None
+    assert cache.get('service2') == []
+
+
+def test_on_setting_changed__empty_payload__all_entries_invalidated():
+    # arrange
+    cache = init_settings_cache(max_size=10, ttl=None)
+    cache.set('service1', [])
+    cache.set('service2', [])
+
+    # act
+    on_setting_changed('')
+
+    # assert
+    assert len(cache) == 0
+
+
+async def test_close_setting_listener(mocker: MockerFixture):
+    # arrange
+    listener_mock = mocker.AsyncMock()
+    mocker.patch.dict(setting_changes._inst, {'setting_listener': listener_mock})
+
+    # act
+    await close_setting_listener()
+
+    # assert
+    assert listener_mock.stop.call_count == 1
+    with pytest.raises(ServiceInstanceNotFound):
+        get_setting_listener()
+
+
+async def test_close_setting_listener__listener_was_not_created__success(mocker: MockerFixture):
+    # arrange
+    mocker.patch.dict(setting_changes._inst, {}, clear=True)
+
+    # act && assert
+    await close_setting_listener()
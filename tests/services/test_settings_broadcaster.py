@@ -0,0 +1,115 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+from sqlalchemy import delete, update
+
+from runtime_config.models import Setting
+from runtime_config.services import settings_cache
+from tests.db_utils import create_setting
+
+
+async def test_settings_broadcaster__settings_changed__change_sent_to_subscribers(broadcaster, db_conn, setting_data):
+    # arrange
+    created = await create_setting(db_conn, setting_data)
+    removed = await create_setting(db_conn, {**setting_data, 'name': 'removed'})
+    service_name = setting_data['service_name']
+    subscription1 = await broadcaster.subscribe([service_name])
+    subscription2 = await broadcaster.subscribe([service_name, 'other-service'])
+    await create_setting(db_conn, {**setting_data, 'service_name': 'other-service'})
+
+    # act
+    await db_conn.execute(update(Setting).where(Setting.id == created['id']).values(value='99'))
+    await db_conn.execute(delete(Setting).where(Setting.id == removed['id']))
+    settings_cache.invalidate_service_settings(service_name)
+    broadcaster.on_setting_changed(service_name)
+    change1 = await asyncio.wait_for(subscription1.queue.get(), timeout=5)
+    change2 = await asyncio.wait_for(subscription2.queue.get(), timeout=5)
+
+    # assert
+    assert change1 is change2
+    assert [(setting.name, setting.value) for setting in change1.upserted] == [('timeout', '99')]
+    assert [setting.name for setting in change1.deleted] == ['removed']
+    assert broadcaster.get_snapshot(service_name) is change1.snapshot
+    assert subscription2.queue.empty()
+
+
+async def test_settings_broadcaster__nothing_changed__change_not_sent(broadcaster, db_conn, setting_data):
+    # arrange
+    await create_setting(db_conn, setting_data)
+    subscription = await broadcaster.subscribe([setting_data['service_name']])
+
+    # act
+    settings_cache.invalidate_all_service_settings()
+    broadcaster.on_setting_changed('')
+    await asyncio.sleep(0.1)
+
+    # assert
+    assert subscription.queue.empty()
+
+
+async def test_settings_broadcaster__subscriber_does_not_keep_up__subscription_overflowed(
+    broadcaster, db_conn, setting_data
+):
+    # arrange
+    created = await create_setting(db_conn, setting_data)
+    service_name = setting_data['service_name']
+    broadcaster.max_queue_size = 1
+    subscription = await broadcaster.subscribe([service_name])
+
+    # act
+    for value in ('1', '2'):
+        await db_conn.execute(update(Setting).where(Setting.id == created['id']).values(value=value))
+        settings_cache.invalidate_service_settings(service_name)
+        broadcaster.on_setting_changed(service_name)
+        await asyncio.sleep(0.1)
+
+    # assert
+    assert subscription.overflowed
+    assert broadcaster.get_snapshot(service_name).settings[0].value == '2'
+
+
+async def test_settings_broadcaster__settings_changed_while_subscribing__newer_snapshot_kept(
+    broadcaster, db_conn, setting_data
+):
+    # arrange
+    created = await create_setting(db_conn, setting_data)
+    service_name = setting_data['service_name']
+    released = asyncio.Event()
+    acquired = []
+
+    @asynccontextmanager
+    async def acquire_db_conn():
+        acquired.append(True)
+        yield db_conn
+        # the first snapshot read by subscribe is held until the change is read
+        if len(acquired) == 1:
+            await released.wait()
+
+    broadcaster.acquire_db_conn = acquire_db_conn
+    subscribe_task = asyncio.create_task(broadcaster.subscribe([service_name]))
+    await asyncio.sleep(0.1)
+
+    # act
+    await db_conn.execute(update(Setting).where(Setting.id == created['id']).values(value='99'))
+    settings_cache.invalidate_service_settings(service_name)
+    broadcaster.on_setting_changed(service_name)
+    await asyncio.sleep(0.1)
+    released.set()
+    await asyncio.wait_for(subscribe_task, timeout=5)
+
+    # assert
+    assert len(acquired) == 2
+    assert broadcaster.get_snapshot(service_name).settings[0].value == '99'
+
+
+async def test_settings_broadcaster__last_subscriber_left__snapshot_removed(broadcaster, db_conn, setting_data):
+    # arrange
+    subscription = await broadcaster.subscribe([setting_data['service_name']])
+
+    # act
+    broadcaster.unsubscribe(subscription)
+
+    # assert
+    with pytest.raises(KeyError):
+        broadcaster.get_snapshot(setting_data['service_name'])
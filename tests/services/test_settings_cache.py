@@ -0,0 +1,308 @@
+import asyncio
+import datetime
+import gzip
+import os
+import threading
+from contextlib import asynccontextmanager
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from structlog.testing import capture_logs
+
+from runtime_config.enums.settings import ValueType
+from runtime_config.lib.compression import Compressor
+from runtime_config.lib.exception import DatabaseUnavailable
+from runtime_config.repositories.db.entities import SettingData, SettingKey
+from runtime_config.services import settings_cache
+from runtime_config.services.settings_cache import ServiceSettingsSnapshot
+from runtime_config.web.entities import GetServiceSettingsLegacyResponse
+
+
+def test_service_settings_snapshot__settings_changed__version_changed(setting_data):
+    # arrange
+    setting = SettingData(**setting_data, id=1, updated_at=datetime.datetime(2022, 1, 1))
+    changed_setting = setting.copy(update={'value': '11'})
+
+    # act
+    snapshot = ServiceSettingsSnapshot.create(service_name='service-name', settings=[setting])
+    same_snapshot = ServiceSettingsSnapshot.create(service_name='service-name', settings=[setting.copy()])
+    changed_snapshot = ServiceSettingsSnapshot.create(service_name='service-name', settings=[changed_setting])
+
+    # assert
+    assert snapshot.version == same_snapshot.version
+    assert snapshot.version != changed_snapshot.version
+
+
+def test_service_settings_snapshot__legacy_json__encoded_in_the_same_way_as_fastapi(setting_data):
+    # arrange
+    settings = [
+        SettingData(**{**setting_data, 'name': name, 'value': value, 'value_type': value_type}, id=i, updated_at=now)
+        for i, (name, value, value_type, now) in enumerate(
+            [
+                ('timeout', '10', ValueType.int, datetime.datetime(2022, 1, 1, 10, 5, 1, 123)),
+                ('greeting', 'Привет, "мир"\n', ValueType.str, datetime.datetime(2022, 1, 1)),
+                ('options', '{"a": [1, 2]}', ValueType.json, datetime.datetime(2022, 1, 1)),
+                ('empty', None, ValueType.null, datetime.datetime(2022, 1, 1)),
+            ]
+        )
+    ]
+    expected = JSONResponse(
+        content=jsonable_encoder(
+            [
+                GetServiceSettingsLegacyResponse(
+                    name=setting.name,
+                    value=setting.value,
+                    value_type=setting.value_type,
+                    disable=setting.is_disabled,
+                )
+                for setting in sorted(settings, key=lambda setting: setting.name)
+            ]
+        )
+    ).body
+
+    # act
+    snapshot = ServiceSettingsSnapshot.create(service_name='service-name', settings=settings)
+
+    # assert
+    assert snapshot.legacy_json == expected
+
+
+def test_service_settings_snapshot__compress__compressed_once_per_encoding(mocker, setting_data):
+    # arrange
+    compressor = Compressor(minimum_size=0, gzip_level=6, brotli_quality=4)
+    compress_spy = mocker.spy(compressor, 'compress')
+    setting = SettingData(**setting_data, id=1, updated_at=datetime.datetime(2022, 1, 1))
+    snapshot = ServiceSettingsSnapshot.create(service_name='service-name', settings=[setting])
+
+    # act
+    legacy_json = [snapshot.compress(body='legacy_json', encoding='gzip', compressor=compressor) for _ in range(2)]
+    settings_json = snapshot.compress(body='settings_json', encoding='gzip', compressor=compressor)
+
+    # assert
+    assert gzip.decompress(legacy_json[0]) == snapshot.legacy_json
+    assert legacy_json[1] is legacy_json[0]
+    assert gzip.decompress(settings_json) == snapshot.settings_json
+    assert compress_spy.call_count == 2
+
+
+def test_service_settings_snapshot__get_page__return_settings_after_key(setting_data):
+    # arrange
+    settings = [
+        SettingData(**{**setting_data, 'name': name}, id=i, updated_at=datetime.datetime(2022, 1, 1))
+        for i, name in enumerate(['c', 'a', 'd', 'b'])
+    ]
+    snapshot = ServiceSettingsSnapshot.create(service_name='service-name', settings=settings)
+    deleted_key = SettingKey(service_name='service-name', name='bb', id=10)
+
+    # act
+    first_page = snapshot.get_page(limit=2)
+    next_page = snapshot.get_page(limit=2, after=first_page[-1].key)
+    page_after_deleted = snapshot.get_page(limit=2, after=deleted_key)
+
+    # assert
+    assert [setting.name for setting in first_page] == ['a', 'b']
+    assert [setting.name for setting in next_page] == ['c', 'd']
+    assert [setting.name for setting in page_after_deleted] == ['c', 'd']
+
+
+async def test_get_service_snapshot__concurrent_cache_misses__one_db_query(mocker, setting_data):
+    # arrange
+    settings_cache.init_settings_cache(max_size=10, ttl=None)
+    setting = SettingData(**setting_data, id=1, updated_at=datetime.datetime(2022, 1, 1))
+
+    async def get_service_settings(conn, service_name):
+        await asyncio.sleep(0.01)
+        yield setting
+
+    get_settings = mocker.patch.object(
+        settings_cache.db_repo, 'get_service_settings', side_effect=get_service_settings
+    )
+    acquired = []
+
+    @asynccontextmanager
+    async def acquire_db_conn():
+        acquired.append(True)
+        yield None
+
+    # act
+    snapshots = await asyncio.gather(
+        *(settings_cache.get_service_snapshot(acquire_db_conn, service_name='service-name') for _ in range(10))
+    )
+
+    # assert
+    assert len(acquired) == 1
+    assert get_settings.call_count == 1
+    assert all(snapshot is snapshots[0] for snapshot in snapshots)
+    assert snapshots[0].settings == [setting]
+
+
+@pytest.mark.parametrize(
+    'invalidated_service_name, expected_cached',
+    [
+        ('service-name', False),
+        ('other-service', True),
+    ],
+)
+async def test_get_service_snapshot__service_invalidated_while_reading__cached_if_other_service(
+    mocker, setting_data, invalidated_service_name, expected_cached
+):
+    # arrange
+    settings_cache.init_settings_cache(max_size=10, ttl=None)
+    setting = SettingData(**setting_data, id=1, updated_at=datetime.datetime(2022, 1, 1))
+
+    async def get_service_settings(conn, service_name):
+        settings_cache.invalidate_service_settings(invalidated_service_name)
+        yield setting
+
+    mocker.patch.object(settings_cache.db_repo, 'get_service_settings', side_effect=get_service_settings)
+
+    @asynccontextmanager
+    async def acquire_db_conn():
+        yield None
+
+    # act
+    snapshot = await settings_cache.get_service_snapshot(acquire_db_conn, service_name='service-name')
+
+    # assert
+    assert snapshot.settings == [setting]
+    assert (settings_cache.get_settings_cache().get('service-name') is snapshot) is expected_cached
+
+
+async def test_invalidate_service_settings__reload_delay__invalidated_once_more(mocker):
+    # arrange
+    mocker.patch.dict(settings_cache._reload_delay)
+    cache = settings_cache.init_settings_cache(max_size=10, ttl=None, reload_delay=0.01)
+    snapshot = ServiceSettingsSnapshot.create(service_name='service-name', settings=[])
+
+    # act
+    settings_cache.invalidate_service_settings('service-name')
+    cache.set('service-name', snapshot)
+    cached_before_reload = cache.get('service-name')
+    await asyncio.sleep(0.02)
+
+    # assert
+    assert cached_before_reload is snapshot
+    assert cache.get('service-name') is None
+
+
+@pytest.fixture(name='stale_cache')
+def stale_cache_fixture(mocker, tmp_path):
+    mocker.patch.dict(settings_cache._fallback)
+    return settings_cache.init_settings_cache(max_size=10, ttl=None, stale_timeout=0.05, fallback_dir=tmp_path)
+
+
+async def test_get_service_snapshot_or_stale__db_unavailable__last_known_returned(mocker, stale_cache, setting_data):
+    # arrange
+    setting = SettingData(**setting_data, id=1, updated_at=datetime.datetime(2022, 1, 1))
+
+    async def get_service_settings(conn, service_name):
+        yield setting
+
+    mocker.patch.object(settings_cache.db_repo, 'get_service_settings', side_effect=get_service_settings)
+
+    @asynccontextmanager
+    async def acquire_db_conn():
+        yield None
+
+    @asynccontextmanager
+    async def acquire_unavailable_db_conn():
+        raise DatabaseUnavailable()
+        yield
+
+    loaded, loaded_stale_age = await settings_cache.get_service_snapshot_or_stale(acquire_db_conn, 'service-name')
+    settings_cache.invalidate_service_settings('service-name')
+
+    # act
+    snapshot, stale_age = await settings_cache.get_service_snapshot_or_stale(
+        acquire_unavailable_db_conn, 'service-name'
+    )
+
+    # assert
+    assert loaded_stale_age is None
+    assert snapshot is loaded
+    assert stale_age is not None and stale_age >= 0
+    assert stale_cache.get('service-name') is None
+
+
+async def test_get_service_snapshot_or_stale__slow_db__last_known_returned_and_reading_finished_later(
+    mocker, stale_cache, setting_data
+):
+    # arrange
+    setting = SettingData(**setting_data, id=1, updated_at=datetime.datetime(2022, 1, 1))
+    changed_setting = setting.copy(update={'value': '11'})
+    delay = 0.0
+
+    async def get_service_settings(conn, service_name):
+        await asyncio.sleep(delay)
+        yield changed_setting if delay else setting
+
+    mocker.patch.object(settings_cache.db_repo, 'get_service_settings', side_effect=get_service_settings)
+
+    @asynccontextmanager
+    async def acquire_db_conn():
+        yield None
+
+    loaded, _ = await settings_cache.get_service_snapshot_or_stale(acquire_db_conn, 'service-name')
+    settings_cache.invalidate_service_settings('service-name')
+    delay = 0.1
+
+    # act
+    snapshot, stale_age = await settings_cache.get_service_snapshot_or_stale(acquire_db_conn, 'service-name')
+    await asyncio.sleep(0.1)
+
+    # assert
+    assert snapshot is loaded
+    assert stale_age is not None
+    assert stale_cache.get('service-name').settings == [changed_setting]
+
+
+async def test_snapshot_fallback__restored_from_directory(tmp_path, setting_data):
+    # arrange
+    snapshot = ServiceSettingsSnapshot.create(
+        service_name='service/name',
+        settings=[SettingData(**setting_data, id=1, updated_at=datetime.datetime(2022, 1, 1, 10, 30))],
+    )
+    await settings_cache.SnapshotFallback(max_size=10, stale_timeout=1, directory=tmp_path).remember(snapshot)
+    fallback = settings_cache.SnapshotFallback(max_size=10, stale_timeout=1, directory=tmp_path)
+
+    # act
+    fallback.restore()
+
+    # assert
+    restored = fallback.get('service/name')
+    assert restored == snapshot
+    assert restored.loaded_at == snapshot.loaded_at
+    assert restored.legacy_json == snapshot.legacy_json
+
+
+async def test_snapshot_fallback__same_service_saved_concurrently__both_saved(mocker, tmp_path, setting_data):
+    # arrange
+    snapshots = [
+        ServiceSettingsSnapshot.create(
+            service_name='service/name',
+            settings=[SettingData(**{**setting_data, 'value': value}, id=1, updated_at=datetime.datetime(2022, 1, 1))],
+        )
+        for value in ('1', '2')
+    ]
+    fallbacks = [settings_cache.SnapshotFallback(max_size=10, stale_timeout=1, directory=tmp_path) for _ in snapshots]
+    # both files are written before any of them is renamed
+    barrier = threading.Barrier(len(snapshots))
+    replace = os.replace
+
+    def replace_together(src, dst):
+        barrier.wait(timeout=5)
+        replace(src, dst)
+
+    mocker.patch('os.replace', side_effect=replace_together)
+
+    # act
+    with capture_logs() as logs:
+        await asyncio.gather(*(fallback.remember(snapshot) for fallback, snapshot in zip(fallbacks, snapshots)))
+
+    # assert
+    assert logs == []
+    assert list(tmp_path.iterdir()) == [tmp_path / 'service%2Fname.json']
+    restored = settings_cache.SnapshotFallback(max_size=10, stale_timeout=1, directory=tmp_path)
+    restored.restore()
+    assert restored.get('service/name') in snapshots
@@ -8,6 +8,13 @@ async def test_init_hooks(mocker: MockerFixture):
     # arrange
     init_db_mock = mocker.patch('runtime_config.main.init_db')
     close_db_mock = mocker.patch('runtime_config.main.close_db')
+    init_db_replicas_mock = mocker.patch('runtime_config.main.init_db_replicas')
+    close_db_replicas_mock = mocker.patch('runtime_config.main.close_db_replicas')
+    init_setting_listener_mock = mocker.patch('runtime_config.main.init_setting_listener')
+    close_setting_listener_mock = mocker.patch('runtime_config.main.close_setting_listener')
+    init_settings_broadcaster_mock = mocker.patch('runtime_config.main.init_settings_broadcaster')
+    close_settings_broadcaster_mock = mocker.patch('runtime_config.main.close_settings_broadcaster')
+    close_metrics_mock = mocker.patch('runtime_config.main.close_metrics')
     app_mock = mocker.MagicMock(FastAPI)
     config_mock = mocker.Mock()
 
@@ -18,5 +25,31 @@ async def test_init_hooks(mocker: MockerFixture):
         await fn(app_mock)
 
     # assert
-    init_db_mock.assert_called_with(app_mock, dsn=config_mock.db_dsn)
+    init_db_mock.assert_called_with(
+        app_mock,
+        dsn=config_mock.db_dsn,
+        min_size=config_mock.db_pool_min_size,
+        max_size=config_mock.db_pool_max_size,
+        acquire_timeout=config_mock.db_pool_acquire_timeout,
+        statement_timeout=config_mock.db_statement_timeout,
+        pool_recycle=config_mock.db_pool_recycle,
+        slow_query_threshold=config_mock.db_slow_query_threshold,
+    )
     close_db_mock.assert_called_with(app_mock)
+    init_db_replicas_mock.assert_called_with(
+        app_mock,
+        dsns=config_mock.db_replica_dsns,
+        max_lag=config_mock.db_replica_max_lag,
+        check_interval=config_mock.db_replica_check_interval,
+        max_size=config_mock.db_pool_max_size,
+        statement_timeout=config_mock.db_statement_timeout,
+        pool_recycle=config_mock.db_pool_recycle,
+    )
+    close_db_replicas_mock.assert_called_with(app_mock)
+    init_setting_listener_mock.assert_called_with(app_mock, dsn=config_mock.db_dsn)
+    close_setting_listener_mock.assert_called_with(app_mock)
+    init_settings_broadcaster_mock.assert_called_with(
+        app_mock, heartbeat_interval=config_mock.settings_stream_heartbeat_interval
+    )
+    close_settings_broadcaster_mock.assert_called_with(app_mock)
+    close_metrics_mock.assert_called_with(app_mock)
@@ -1,11 +1,14 @@
+import asyncio
+
 import pytest
-from aiopg.sa import SAConnection
+from aiopg.sa import Engine, SAConnection
 from psycopg2.errors import UniqueViolation  # noqa
 from pytest_mock import MockerFixture
 from sqlalchemy import delete, func, select, update
 from sqlalchemy.dialects.postgresql import insert
 
 from runtime_config.enums.settings import ValueType
+from runtime_config.lib.pg_listener import PgListener
 from runtime_config.models import Setting, SettingHistory
 from tests.db_utils import create_setting, get_all_settings
 
@@ -32,6 +35,7 @@ async def test_setting__user_field_is_filled_with_non_existing_user__valid_value
         'id': 1,
         'created_by_db_user': expected_created_by_db_user,
         'updated_at': mocker.ANY,
+        'change_xid': mocker.ANY,
     }
 
 
@@ -57,6 +61,7 @@ async def test_setting__update_row__historical_record_created(
         'value_type': ValueType(created_setting['value_type']),
         'is_deleted': False,
         'deleted_by_db_user': None,
+        'change_xid': mocker.ANY,
     }
 
 
@@ -82,6 +87,7 @@ async def test_setting__delete_row__row_moved_to_setting_history_table(
         'value_type': ValueType(created_setting['value_type']),
         'is_deleted': True,
         'deleted_by_db_user': 'admin',
+        'change_xid': mocker.ANY,
     }
 
 
@@ -103,3 +109,45 @@ async def test_setting__create_two_settings_with_same_name_in_one_service__histo
 
     # assert
     assert expected_error in str(exc)
+
+
+async def test_setting__change_rows__notifications_sent(config, db: Engine, setting_data):
+    # arrange
+    received: asyncio.Queue[str] = asyncio.Queue()
+    listener = PgListener(dsn=config.db_dsn, channel='setting_changed')
+    listener.add_handler(received.put_nowait)
+    await listener.start()
+    await asyncio.wait_for(listener.wait_connected(), timeout=5)
+
+    # act
+    async with db.acquire() as conn:
+        try:
+            created_setting = await create_setting(conn, setting_data)
+            query = update(Setting).where(Setting.id == created_setting['id']).values(service_name='other-service')
+            await conn.execute(query)
+            await conn.execute(delete(Setting).where(Setting.id == created_setting['id']))
+        finally:
+            await conn.execute(delete(SettingHistory))
+    payloads = [await asyncio.wait_for(received.get(), timeout=5) for _ in range(4)]
+    await listener.stop()
+
+    # assert
+    assert payloads == ['service-name', 'service-name', 'other-service', 'other-service']
+
+
+async def test_setting__update_and_delete_row__rows_marked_with_transaction_id(db_conn: SAConnection, setting_data):
+    # arrange
+    xid = await db_conn.scalar('SELECT pg_current_xact_id()::text::bigint')
+    created_setting = await create_setting(db_conn, setting_data)
+
+    # act
+    query = update(Setting).where(Setting.id == created_setting['id']).values(value=100).returning(Setting.change_xid)
+    updated_change_xid = (await (await db_conn.execute(query)).fetchone())[0]
+    await db_conn.execute(delete(Setting).where(Setting.id == created_setting['id']))
+    query = select(SettingHistory.change_xid).order_by(SettingHistory.id)
+    history_change_xids = [row[0] for row in await (await db_conn.execute(query)).fetchall()]
+
+    # assert
+    assert created_setting['change_xid'] == xid
+    assert updated_change_xid == xid
+    assert history_change_xids == [xid, xid]
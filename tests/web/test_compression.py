@@ -0,0 +1,122 @@
+import gzip
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import Response, StreamingResponse
+from httpx import AsyncClient
+
+from runtime_config.lib.compression import Compressor
+from runtime_config.web.compression import (
+    CompressionMiddleware,
+    accepts_encoding,
+    choose_encoding,
+    parse_accept_encoding,
+)
+
+
+def test_parse_accept_encoding():
+    # act
+    qualities = parse_accept_encoding('gzip, br;q=0.5, deflate;q=bad, ,identity;q=0')
+
+    # assert
+    assert qualities == {'gzip': 1.0, 'br': 0.5, 'deflate': 0, 'identity': 0}
+
+
+@pytest.mark.parametrize(
+    'accept_encoding, expected',
+    [
+        (None, False),
+        ('', False),
+        ('br', False),
+        ('gzip', True),
+        ('GZIP;q=0.1', True),
+        ('gzip;q=0', False),
+        ('*', True),
+        ('*;q=0, gzip', True),
+        ('gzip;q=0, *', False),
+    ],
+)
+def test_accepts_encoding(accept_encoding, expected):
+    # act && assert
+    assert accepts_encoding(accept_encoding, 'gzip') is expected
+
+
+@pytest.mark.parametrize(
+    'accept_encoding, encodings, expected',
+    [
+        (None, ('br', 'gzip'), None),
+        ('identity', ('br', 'gzip'), None),
+        ('gzip, br', ('br', 'gzip'), 'br'),
+        ('gzip, br', ('gzip',), 'gzip'),
+        ('gzip, br;q=0.5', ('br', 'gzip'), 'gzip'),
+        ('*', ('br', 'gzip'), 'br'),
+        ('br;q=0, *', ('br', 'gzip'), 'gzip'),
+    ],
+)
+def test_choose_encoding(accept_encoding, encodings, expected):
+    # act && assert
+    assert choose_encoding(accept_encoding, encodings) == expected
+
+
+def _compressed_app(response: Response) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, compressor=Compressor(minimum_size=10, gzip_level=6, brotli_quality=4))
+    app.get('/')(lambda: response)
+    return app
+
+
+async def test_compression_middleware__large_body__return_compressed_body():
+    # arrange
+    app = _compressed_app(Response(content=b'a' * 100, headers={'ETag': '"abc"'}))
+
+    # act
+    async with AsyncClient(app=app, base_url='http://test') as client:
+        resp = await client.get('/', headers={'Accept-Encoding': 'gzip'})
+
+    # assert
+    assert resp.headers['Content-Encoding'] == 'gzip'
+    assert resp.headers['ETag'] == '"abc-gzip"'
+    assert resp.headers['Vary'] == 'Accept-Encoding'
+    assert int(resp.headers['Content-Length']) < 100
+    assert resp.content == b'a' * 100
+
+
+@pytest.mark.parametrize(
+    'if_none_match, expected_etag',
+    [
+        ('"abc-gzip"', '"abc-gzip"'),
+        ('"abc"', '"abc"'),
+    ],
+)
+async def test_compression_middleware__not_modified__etag_sent_by_client_returned(if_none_match, expected_etag):
+    # arrange
+    app = _compressed_app(Response(status_code=304, headers={'ETag': '"abc"'}))
+
+    # act
+    async with AsyncClient(app=app, base_url='http://test') as client:
+        resp = await client.get('/', headers={'Accept-Encoding': 'gzip', 'If-None-Match': if_none_match})
+
+    # assert
+    assert resp.status_code == 304
+    assert resp.headers['ETag'] == expected_etag
+
+
+@pytest.mark.parametrize(
+    'response',
+    [
+        Response(content=b'a' * 5),
+        Response(content=gzip.compress(b'a' * 100), headers={'Content-Encoding': 'gzip'}),
+        StreamingResponse(iter([b'a' * 100, b'a' * 100]), media_type='text/event-stream'),
+    ],
+)
+async def test_compression_middleware__small_encoded_or_streaming_body__return_body_as_is(response):
+    # arrange
+    app = _compressed_app(response)
+
+    # act
+    async with AsyncClient(app=app, base_url='http://test') as client:
+        resp = await client.get('/', headers={'Accept-Encoding': 'gzip'})
+
+    # assert
+    assert resp.headers.get('Content-Encoding') == response.headers.get('Content-Encoding')
+    assert 'Vary' not in resp.headers
@@ -0,0 +1,51 @@
+import pytest
+
+from runtime_config.web.etag import (
+    add_etag_encoding,
+    etag_matches,
+    make_etag,
+    remove_etag_encoding,
+)
+
+
+def test_make_etag():
+    # act
+    etag = make_etag('abc', 0, 30)
+
+    # assert
+    assert etag == '"abc-0-30"'
+
+
+@pytest.mark.parametrize(
+    'if_none_match, expected',
+    [
+        (None, False),
+        ('', False),
+        ('"other"', False),
+        ('"abc"', True),
+        ('W/"abc"', True),
+        ('"other", "abc"', True),
+        ('"abc-gzip"', True),
+        ('W/"abc-br"', True),
+        ('"abc-deflate"', False),
+        ('"other-gzip"', False),
+        ('*', True),
+    ],
+)
+def test_etag_matches(if_none_match, expected):
+    # act
+    result = etag_matches(if_none_match, '"abc"')
+
+    # assert
+    assert result is expected
+
+
+@pytest.mark.parametrize('etag', ['"abc"', 'W/"abc"'])
+def test_add_etag_encoding__encoding_removed__same_etag(etag):
+    # act
+    encoded = add_etag_encoding(etag, 'gzip')
+
+    # assert
+    assert encoded == etag[:-1] + '-gzip"'
+    assert remove_etag_encoding(encoded) == etag
+    assert remove_etag_encoding(encoded.strip('"')) == etag.strip('"')
@@ -0,0 +1,133 @@
+import re
+
+import pytest
+from fastapi import FastAPI
+from httpx import AsyncClient
+from prometheus_client import REGISTRY
+
+from runtime_config.lib.db import acquire_db_conn
+from runtime_config.web.instrumentation import (
+    ConnHoldTimeMiddleware,
+    ConnHoldTimeStats,
+    MetricsMiddleware,
+    RequestTracingMiddleware,
+)
+
+
+async def test_conn_hold_time_middleware__connections_taken__stats_collected_per_route(mocker, db):
+    # arrange
+    stats = ConnHoldTimeStats()
+    app = FastAPI()
+    app.add_middleware(ConnHoldTimeMiddleware, stats=stats)
+
+    @app.get('/items/{item_id}')
+    async def get_item(item_id: int) -> dict[str, int]:
+        for _ in range(item_id):
+            async with acquire_db_conn() as conn:
+                await conn.execute('SELECT 1')
+        return {'id': item_id}
+
+    # act
+    async with AsyncClient(app=app, base_url='http://test') as client:
+        await client.get('/items/1')
+        await client.get('/items/2')
+        await client.get('/unknown')
+
+    # assert
+    assert stats.stats() == {
+        '/items/{item_id}': {
+            'requests': 2,
+            'connections': 3,
+            'total': mocker.ANY,
+            'avg_per_request': mocker.ANY,
+            'max_per_request': mocker.ANY,
+        }
+    }
+    route_stats = stats.stats()['/items/{item_id}']
+    assert 0 < route_stats['max_per_request'] <= route_stats['total']
+    assert route_stats['avg_per_request'] == route_stats['total'] / 2
+
+
+async def test_metrics_middleware__requests_handled__metrics_collected_per_route():
+    # arrange
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get('/metrics-test/{item_id}')
+    async def get_item(item_id: int) -> dict[str, int]:
+        return {'id': item_id}
+
+    def get_sample(name: str, **labels: str) -> float:
+        return REGISTRY.get_sample_value(f'runtime_config_{name}', labels) or 0
+
+    route_labels = {'method': 'GET', 'route': '/metrics-test/{item_id}'}
+    requests_before = get_sample('http_request_duration_seconds_count', status_code='200', **route_labels)
+    size_before = get_sample('http_response_size_bytes_sum', **route_labels)
+    unmatched_before = get_sample(
+        'http_request_duration_seconds_count', method='GET', route='<unmatched>', status_code='404'
+    )
+
+    # act
+    async with AsyncClient(app=app, base_url='http://test') as client:
+        await client.get('/metrics-test/1')
+        await client.get('/metrics-test/22')
+        await client.get('/unknown')
+
+    # assert
+    assert get_sample('http_request_duration_seconds_count', status_code='200', **route_labels) == requests_before + 2
+    assert get_sample('http_response_size_bytes_sum', **route_labels) == size_before + len('{"id":1}{"id":22}')
+    assert (
+        get_sample('http_request_duration_seconds_count', method='GET', route='<unmatched>', status_code='404')
+        == unmatched_before + 1
+    )
+    assert get_sample('http_requests_in_progress', method='GET') == 0
+
+
+@pytest.fixture(name='traced_app')
+def traced_app_fixture() -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(RequestTracingMiddleware)
+
+    @app.get('/items/{count}')
+    async def get_items(count: int) -> dict[str, int]:
+        async with acquire_db_conn() as conn:
+            for _ in range(count):
+                await conn.execute('SELECT pg_sleep(0.01)')
+        return {'count': count}
+
+    return app
+
+
+async def test_request_tracing_middleware__request_id_given__request_id_returned(db, traced_app: FastAPI):
+    # act
+    async with AsyncClient(app=traced_app, base_url='http://test') as client:
+        resp = await client.get('/items/0', headers={'X-Request-ID': 'req-1'})
+        resp_invalid_id = await client.get('/items/0', headers={'X-Request-ID': 'req 1;x'})
+
+    # assert
+    assert resp.headers['X-Request-ID'] == 'req-1'
+    assert resp_invalid_id.headers['X-Request-ID'] != 'req 1;x'
+
+
+async def test_request_tracing_middleware__no_request_id__request_id_generated(db, traced_app: FastAPI):
+    # act
+    async with AsyncClient(app=traced_app, base_url='http://test') as client:
+        resp1 = await client.get('/items/0')
+        resp2 = await client.get('/items/0')
+
+    # assert
+    assert re.fullmatch('[0-9a-f]{32}', resp1.headers['X-Request-ID'])
+    assert resp1.headers['X-Request-ID'] != resp2.headers['X-Request-ID']
+
+
+async def test_request_tracing_middleware__queries_made__server_timing_returned(db, traced_app: FastAPI):
+    # act
+    async with AsyncClient(app=traced_app, base_url='http://test') as client:
+        resp = await client.get('/items/3')
+        resp_no_queries = await client.get('/items/0')
+
+    # assert
+    match = re.fullmatch(r'db;desc="3 queries";dur=(\d+\.\d{2})', resp.headers['Server-Timing'])
+    assert match is not None
+    assert 30 <= float(match.group(1)) < 1000
+    assert resp_no_queries.headers['Server-Timing'] == 'db;desc="0 queries";dur=0.00'
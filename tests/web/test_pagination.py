@@ -0,0 +1,48 @@
+import datetime
+
+import pytest
+
+from runtime_config.repositories.db.entities import HistoryKey, SettingKey
+from runtime_config.web.pagination import (
+    InvalidCursor,
+    decode_cursor,
+    decode_history_cursor,
+    encode_cursor,
+    encode_history_cursor,
+)
+
+
+def test_decode_cursor__encoded_cursor__return_key():
+    # arrange
+    key = SettingKey(service_name='service-name', name='имя', id=10)
+
+    # act
+    decoded = decode_cursor(encode_cursor(key))
+
+    # assert
+    assert decoded == key
+
+
+@pytest.mark.parametrize('cursor', ['not base64!', 'WzFd', 'MQ==', 'WyJhIiwiYiIsImMiXQ=='])
+def test_decode_cursor__invalid_cursor__raise_invalid_cursor(cursor):
+    # act && assert
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor)
+
+
+def test_decode_history_cursor__encoded_cursor__return_key():
+    # arrange
+    key = HistoryKey(updated_at=datetime.datetime(2022, 1, 2, 3, 4, 5, 6), id=10)
+
+    # act
+    decoded = decode_history_cursor(encode_history_cursor(key))
+
+    # assert
+    assert decoded == key
+
+
+@pytest.mark.parametrize('cursor', ['WyJhIiwxXQ==', 'WzEsMV0='])
+def test_decode_history_cursor__invalid_cursor__raise_invalid_cursor(cursor):
+    # act && assert
+    with pytest.raises(InvalidCursor):
+        decode_history_cursor(cursor)
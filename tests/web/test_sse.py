@@ -0,0 +1,127 @@
+import asyncio
+import json
+
+import pytest
+from sqlalchemy import update
+
+from runtime_config.models import Setting
+from runtime_config.services import settings_broadcaster, settings_cache
+from runtime_config.web.sse import (
+    decode_resume_token,
+    encode_resume_token,
+    stream_setting_events,
+)
+from runtime_config.web.views import subscribe_to_settings
+from tests.db_utils import create_setting
+
+
+def test_resume_token__encode_and_decode():
+    # arrange
+    versions = {'service1': 'version1', 'service2': 'version2'}
+
+    # act
+    token = encode_resume_token(versions)
+
+    # assert
+    assert decode_resume_token(token) == versions
+
+
+@pytest.mark.parametrize('token', [None, '', 'not-base64!', encode_resume_token({}) + 'x', 'WzEsMl0='])
+def test_decode_resume_token__invalid_token__return_empty_versions(token):
+    # act && assert
+    assert decode_resume_token(token) == {}
+
+
+async def test_stream_setting_events(broadcaster, db_conn, setting_data):
+    # arrange
+    created = await create_setting(db_conn, setting_data)
+    service_name = setting_data['service_name']
+    stream = stream_setting_events(broadcaster=broadcaster, service_names=[service_name], known_versions={})
+
+    # act
+    snapshot_event = _parse_event(await anext(stream))
+    await anext(stream)
+    await db_conn.execute(update(Setting).where(Setting.id == created['id']).values(value='99'))
+    settings_cache.invalidate_service_settings(service_name)
+    broadcaster.on_setting_changed(service_name)
+    upsert_event = _parse_event(await asyncio.wait_for(anext(stream), timeout=5))
+    heartbeat_event = _parse_event(await asyncio.wait_for(anext(stream), timeout=5))
+    await stream.aclose()
+
+    # assert
+    assert snapshot_event['event'] == 'snapshot'
+    assert [setting['value'] for setting in snapshot_event['data']['settings']] == ['10']
+    assert decode_resume_token(snapshot_event['id']) == {service_name: snapshot_event['data']['version']}
+
+    assert upsert_event['event'] == 'upsert'
+    assert upsert_event['data']['setting']['value'] == '99'
+    assert decode_resume_token(upsert_event['id']) == {service_name: upsert_event['data']['version']}
+
+    assert heartbeat_event['event'] == 'heartbeat'
+    assert heartbeat_event['id'] == upsert_event['id']
+
+    with pytest.raises(KeyError):
+        broadcaster.get_snapshot(service_name)
+
+
+async def test_stream_setting_events__client_knows_current_version__snapshot_not_sent(
+    broadcaster, db_conn, setting_data
+):
+    # arrange
+    await create_setting(db_conn, setting_data)
+    service_name = setting_data['service_name']
+    snapshot = await settings_cache.get_service_snapshot(
+        acquire_db_conn=broadcaster.acquire_db_conn, service_name=service_name
+    )
+    known_versions = {service_name: snapshot.version}
+    stream = stream_setting_events(
+        broadcaster=broadcaster, service_names=[service_name], known_versions=known_versions
+    )
+
+    # act
+    event = _parse_event(await anext(stream))
+    await stream.aclose()
+
+    # assert
+    assert event['event'] == 'heartbeat'
+    assert decode_resume_token(event['id']) == known_versions
+
+
+async def test_subscribe_to_settings__response_not_sent__not_subscribed(mocker, broadcaster, db_conn, setting_data):
+    # arrange
+    await create_setting(db_conn, setting_data)
+    service_name = setting_data['service_name']
+    mocker.patch.dict(settings_broadcaster._inst, {'settings_broadcaster': broadcaster})
+    resp = await subscribe_to_settings(service_name=[service_name], resume_token=None, last_event_id=None)
+
+    # act
+    await resp.body_iterator.aclose()
+
+    # assert
+    with pytest.raises(KeyError):
+        broadcaster.get_snapshot(service_name)
+
+
+async def test_subscribe_to_settings__service_repeated__snapshot_sent_once(mocker, broadcaster, db_conn, setting_data):
+    # arrange
+    await create_setting(db_conn, setting_data)
+    service_name = setting_data['service_name']
+    mocker.patch.dict(settings_broadcaster._inst, {'settings_broadcaster': broadcaster})
+    resp = await subscribe_to_settings(
+        service_name=[service_name, service_name], resume_token=None, last_event_id=None
+    )
+
+    # act
+    events = [_parse_event(await anext(resp.body_iterator)) for _ in range(2)]
+    await resp.body_iterator.aclose()
+
+    # assert
+    assert [event['event'] for event in events] == ['snapshot', 'heartbeat']
+
+
+def _parse_event(raw_event: str) -> dict:
+    event = {}
+    for line in raw_event.strip().split('\n'):
+        field, value = line.split(': ', 1)
+        event[field] = json.loads(value) if field == 'data' else value
+    return event
@@ -1,10 +1,20 @@
+import asyncio
 import copy
+import json
 
+import psycopg2
+import pytest
 from aiopg.sa import SAConnection
 from httpx import AsyncClient
 from pytest_mock import MockerFixture
+from sqlalchemy import delete, update
 
 from runtime_config.enums.settings import ValueType
+from runtime_config.lib.exception import DatabaseUnavailable
+from runtime_config.models import Setting
+from runtime_config.repositories.db import repo as db_repo
+from runtime_config.services.setting_changes import on_setting_changed
+from runtime_config.web.instrumentation import conn_hold_time_stats
 from tests.db_utils import count_settings, create_setting, get_all_settings
 
 
@@ -92,6 +102,7 @@ async def test_edit_setting(mocker: MockerFixture, async_client: AsyncClient, db
     # arrange
     url = '/setting/edit'
     created = await create_setting(db_conn, setting_data)
+    created.pop('change_xid')
     new = {
         'id': created['id'],
         'value': '99',
@@ -127,6 +138,138 @@ async def test_edit_setting__setting_not_found__return_400(
     assert resp_data == {'status': 'error', 'message': 'Setting with the specified id was not found'}
 
 
+async def test_create_settings__batch__each_item_reported(
+    async_client: AsyncClient, db_conn: SAConnection, setting_data
+):
+    # arrange
+    await create_setting(db_conn, {**setting_data, 'name': 'taken'})
+    setting_data['value_type'] = setting_data['value_type'].value
+    setting_data.pop('created_by_db_user')
+    payload = [
+        {**setting_data, 'name': 'first'},
+        {**setting_data, 'name': 'taken'},
+        {**setting_data, 'name': 'second', 'value_type': 'str', 'value': 'text'},
+        {**setting_data, 'name': 'first', 'value': '11'},
+    ]
+
+    # act
+    resp = await async_client.post('/setting/create/batch', json=payload)
+    resp_data = resp.json()
+
+    # assert
+    assert resp.status_code == 200
+    assert [(item['status'], item['setting'] and item['setting']['name']) for item in resp_data] == [
+        ('success', 'first'),
+        ('error', None),
+        ('success', 'second'),
+        ('error', None),
+    ]
+    assert resp_data[1]['message'] == 'Variable with the same name already exists'
+    assert sorted((setting['name'], setting['value']) for setting in await get_all_settings(db_conn)) == [
+        ('first', '10'),
+        ('second', 'text'),
+        ('taken', '10'),
+    ]
+
+
+async def test_edit_settings__batch__only_given_values_changed(
+    async_client: AsyncClient, db_conn: SAConnection, setting_data
+):
+    # arrange
+    first = await create_setting(db_conn, {**setting_data, 'name': 'first'})
+    second = await create_setting(db_conn, {**setting_data, 'name': 'second', 'value_type': ValueType.str})
+    payload = [
+        {'id': first['id'], 'value': '20', 'is_disabled': True},
+        {'id': second['id'], 'value': None, 'value_type': 'null', 'name': 'renamed'},
+        {'id': 999, 'value': '1'},
+        {'id': first['id'], 'value': '30'},
+    ]
+
+    # act
+    resp = await async_client.post('/setting/edit/batch', json=payload)
+    resp_data = resp.json()
+
+    # assert
+    assert resp.status_code == 200
+    assert [(item['status'], item['message']) for item in resp_data] == [
+        ('success', None),
+        ('success', None),
+        ('error', 'Setting with the specified id was not found'),
+        ('error', 'Setting with the specified id is already edited in the batch'),
+    ]
+    settings = {setting['id']: setting for setting in await get_all_settings(db_conn)}
+    assert (settings[first['id']]['name'], settings[first['id']]['value'], settings[first['id']]['is_disabled']) == (
+        'first',
+        '20',
+        True,
+    )
+    assert (settings[second['id']]['name'], settings[second['id']]['value'], settings[second['id']]['value_type']) == (
+        'renamed',
+        None,
+        ValueType.null,
+    )
+
+
+async def test_edit_settings__name_taken__item_reported_and_others_changed(
+    async_client: AsyncClient, db_conn: SAConnection, setting_data
+):
+    # arrange
+    first = await create_setting(db_conn, {**setting_data, 'name': 'first'})
+    second = await create_setting(db_conn, {**setting_data, 'name': 'second'})
+    third = await create_setting(db_conn, {**setting_data, 'name': 'third'})
+    payload = [
+        {'id': first['id'], 'value': '20'},
+        {'id': second['id'], 'name': 'third'},
+        {'id': third['id'], 'name': 'renamed'},
+    ]
+
+    # act
+    resp = await async_client.post('/setting/edit/batch', json=payload)
+
+    # assert
+    assert resp.status_code == 200
+    assert [(item['status'], item['message']) for item in resp.json()] == [
+        ('success', None),
+        ('error', 'Variable with the same name already exists'),
+        ('success', None),
+    ]
+    assert sorted((setting['name'], setting['value']) for setting in await get_all_settings(db_conn)) == [
+        ('first', '20'),
+        ('renamed', '10'),
+        ('second', '10'),
+    ]
+
+
+async def test_delete_settings__batch__each_item_reported(
+    async_client: AsyncClient, db_conn: SAConnection, setting_data
+):
+    # arrange
+    first = await create_setting(db_conn, {**setting_data, 'name': 'first'})
+    second = await create_setting(db_conn, {**setting_data, 'name': 'second'})
+    await create_setting(db_conn, {**setting_data, 'name': 'third'})
+
+    # act
+    resp = await async_client.post('/setting/delete/batch', json=[first['id'], 999, second['id']])
+    resp_data = resp.json()
+
+    # assert
+    assert resp.status_code == 200
+    assert [(item['status'], item['setting'] and item['setting']['name']) for item in resp_data] == [
+        ('success', 'first'),
+        ('error', None),
+        ('success', 'second'),
+    ]
+    assert [setting['name'] for setting in await get_all_settings(db_conn)] == ['third']
+
+
+async def test_delete_settings__batch_too_large__return_422(async_client: AsyncClient, db_conn: SAConnection):
+    # act
+    resp = await async_client.post('/setting/delete/batch', json=list(range(1001)))
+
+    # assert
+    assert resp.status_code == 422
+
+
 async def test_get_setting(mocker: MockerFixture, async_client: AsyncClient, db_conn: SAConnection, setting_data):
     # arrange
     created = await create_setting(db_conn, setting_data)
@@ -175,6 +318,28 @@ async def test_get_setting(mocker: MockerFixture, async_client: AsyncClient, db_
     assert resp_data_with_history == expected_resp_with_history
 
 
+async def test_get_setting__follow_next_history_cursor__return_whole_history_once(
+    async_client: AsyncClient, db_conn: SAConnection, setting_data
+):
+    # arrange
+    created = await create_setting(db_conn, setting_data)
+    for value in ['1', '2', '3', '4']:
+        await db_conn.execute(update(Setting).where(Setting.id == created['id']).values(value=value))
+    url = f'/setting/get/{created["id"]}?include_history=true&history_limit=2'
+
+    # act
+    pages = []
+    resp = await async_client.get(url)
+    pages.append([i['value'] for i in resp.json()['change_history']])
+    while 'X-Next-History-Cursor' in resp.headers:
+        resp = await async_client.get(f'{url}&history_cursor={resp.headers["X-Next-History-Cursor"]}')
+        pages.append([i['value'] for i in resp.json()['change_history']])
+
+    # assert
+    assert pages == [['3', '2'], ['1', '10']]
+    assert resp.json()['setting']['value'] == '4'
+
+
 async def test_get_settings__getting_a_non_existent_setting__return_empty_resp(
     async_client: AsyncClient, db_conn: SAConnection, setting_data
 ):
@@ -220,6 +385,35 @@ async def test_search_settings(mocker: MockerFixture, async_client: AsyncClient,
     ]
 
 
+@pytest.mark.parametrize(
+    'query, expected_names',
+    [
+        ('name=time', ['db_timeout', 'timeout']),
+        ('name=time*', ['timeout']),
+        ('name=timeout&search_mode=exact', ['timeout']),
+        ('name=time&search_mode=exact', []),
+        ('name=out&search_mode=prefix', []),
+        ('name=_', ['100%_done', 'db_timeout']),
+        ('name=%25', ['100%_done']),
+        ('name=0%25*', []),
+        ('name=100%25*', ['100%_done']),
+    ],
+)
+async def test_search_settings__search_mode(
+    async_client: AsyncClient, db_conn: SAConnection, setting_data, query, expected_names
+):
+    # arrange
+    for name in ['timeout', 'db_timeout', '100%_done']:
+        await create_setting(db_conn, {**setting_data, 'name': name})
+
+    # act
+    resp = await async_client.get(f'/setting/search?{query}')
+
+    # assert
+    assert resp.status_code == 200
+    assert sorted(setting['name'] for setting in resp.json()) == expected_names
+
+
 async def test_search_settings__search_for_settings_of_a_non_existing_service__return_empty_list(
     async_client: AsyncClient, db_conn: SAConnection, setting_data
 ):
@@ -281,6 +475,38 @@ async def test_get_all_service_settings__use_custom_limit_and_offset(
     assert [i['name'] for i in resp1_data] == ['timeout2', 'timeout3']
 
 
+@pytest.mark.parametrize('url', ['/setting/all/service-name', '/setting/search?service_name=service-name'])
+async def test_get_settings_page__follow_next_cursor__return_all_settings_once(
+    async_client: AsyncClient, db_conn: SAConnection, setting_data, url
+):
+    # arrange
+    names = ['a', 'b', 'c', 'd', 'e']
+    for name in reversed(names):
+        await create_setting(db_conn, {**setting_data, 'name': name})
+    separator = '&' if '?' in url else '?'
+
+    # act
+    pages = []
+    resp = await async_client.get(f'{url}{separator}limit=2')
+    pages.append([i['name'] for i in resp.json()])
+    while 'X-Next-Cursor' in resp.headers:
+        resp = await async_client.get(f'{url}{separator}limit=2&cursor={resp.headers["X-Next-Cursor"]}')
+        pages.append([i['name'] for i in resp.json()])
+
+    # assert
+    assert pages == [['a', 'b'], ['c', 'd'], ['e']]
+
+
+@pytest.mark.parametrize('url', ['/setting/all/service-name', '/setting/search'])
+async def test_get_settings_page__invalid_cursor__return_400(async_client: AsyncClient, url):
+    # act
+    resp = await async_client.get(url, params={'cursor': 'invalid'})
+
+    # assert
+    assert resp.status_code == 400
+    assert resp.json() == {'status': 'error', 'message': 'Invalid pagination cursor'}
+
+
 async def test_get_service_settings(async_client: AsyncClient, db_conn: SAConnection, setting_data):
     # arrange
     await create_setting(db_conn, setting_data)
@@ -300,6 +526,443 @@ async def test_get_service_settings(async_client: AsyncClient, db_conn: SAConnec
     }
 
 
+async def test_get_service_settings__client_accepts_gzip__return_compressed_body(
+    async_client: AsyncClient, db_conn: SAConnection, setting_data
+):
+    # arrange
+    for i in range(20):
+        await create_setting(db_conn, {**setting_data, 'name': f'setting_{i}'})
+    url = f'/get_settings/{setting_data["service_name"]}'
+
+    # act
+    resp_gzip = await async_client.get(url, headers={'Accept-Encoding': 'gzip'})
+    resp_identity = await async_client.get(url, headers={'Accept-Encoding': 'identity'})
+
+    # assert
+    assert resp_gzip.headers['Content-Encoding'] == 'gzip'
+    assert resp_gzip.headers['Content-Type'] == 'application/json'
+    assert int(resp_gzip.headers['Content-Length']) < len(resp_identity.content)
+    assert 'Content-Encoding' not in resp_identity.headers
+    assert resp_gzip.content == resp_identity.content
+    assert resp_identity.json()[0]['name'] == 'setting_0'
+
+
+@pytest.mark.parametrize('settings_count', [0, 1, 5])
+async def test_get_service_settings__stream__return_same_settings(
+    mocker: MockerFixture, async_client: AsyncClient, db_conn: SAConnection, setting_data, settings_count
+):
+    # arrange
+    mocker.patch('runtime_config.web.views.STREAM_BATCH_SIZE', 2)
+    for i in range(settings_count):
+        await create_setting(db_conn, {**setting_data, 'name': f'setting_{i}'})
+    url = f'/get_settings/{setting_data["service_name"]}'
+
+    # act
+    resp = await async_client.get(url)
+    resp_stream = await async_client.get(f'{url}?stream=true')
+    resp_ndjson = await async_client.get(url, headers={'Accept': 'application/x-ndjson'})
+
+    # assert
+    assert resp_stream.headers['Content-Type'] == 'application/json'
+    assert resp_stream.json() == resp.json()
+    assert resp_ndjson.headers['Content-Type'] == 'application/x-ndjson'
+    assert resp_ndjson.text.count('\n') == settings_count
+    assert [json.loads(line) for line in resp_ndjson.text.splitlines()] == resp.json()
+
+
+async def test_get_settings_of_services(
+    mocker: MockerFixture, async_client: AsyncClient, db_conn: SAConnection, setting_data
+):
+    # arrange
+    await create_setting(db_conn, {**setting_data, 'service_name': 'first'})
+    await create_setting(db_conn, {**setting_data, 'service_name': 'second', 'name': 'b'})
+    await create_setting(db_conn, {**setting_data, 'service_name': 'second', 'name': 'a'})
+    await create_setting(db_conn, {**setting_data, 'service_name': 'other'})
+    read_settings = mocker.spy(db_repo, 'get_settings_of_services')
+    url = '/setting/services?service_name=second&service_name=first&service_name=missing'
+
+    # act
+    resp = await async_client.get(url)
+    resp_not_modified = await async_client.get(url, headers={'If-None-Match': resp.headers['ETag']})
+    await async_client.get(url)
+
+    # assert
+    assert resp.status_code == 200
+    resp_data = resp.json()
+    assert [(item['service_name'], [setting['name'] for setting in item['settings']]) for item in resp_data] == [
+        ('second', ['a', 'b']),
+        ('first', ['timeout']),
+        ('missing', []),
+    ]
+    assert all(item['version'] for item in resp_data)
+    assert resp_not_modified.status_code == 304
+    assert read_settings.call_count == 1
+
+
+async def test_get_settings_of_services__setting_changed__etag_changed(
+    async_client: AsyncClient, db_conn: SAConnection, setting_data
+):
+    # arrange
+    await create_setting(db_conn, {**setting_data, 'service_name': 'first'})
+    created = await create_setting(db_conn, {**setting_data, 'service_name': 'second'})
+    url = '/setting/services?service_name=first&service_name=second'
+    resp = await async_client.get(url)
+
+    # act
+    await async_client.post('/setting/edit', json={'id': created['id'], 'value': '11'})
+    resp_changed = await async_client.get(url, headers={'If-None-Match': resp.headers['ETag']})
+
+    # assert
+    assert resp_changed.status_code == 200
+    assert resp_changed.headers['ETag'] != resp.headers['ETag']
+    assert resp_changed.json()[0]['version'] == resp.json()[0]['version']
+    assert resp_changed.json()[1]['version'] != resp.json()[1]['version']
+
+
+async def test_get_service_settings__db_unavailable__return_last_known_settings(
+    mocker: MockerFixture, async_client: AsyncClient, db_conn: SAConnection, setting_data
+):
+    # arrange
+    created = await create_setting(db_conn, setting_data)
+    url = f'/get_settings/{setting_data["service_name"]}'
+    resp = await async_client.get(url)
+    await async_client.post('/setting/edit', json={'id': created['id'], 'value': '11'})
+    mocker.patch(
+        'runtime_config.services.settings_cache.db_repo.get_service_settings',
+        side_effect=psycopg2.OperationalError('connection refused'),
+    )
+
+    # act
+    resp_stale = await async_client.get(url)
+
+    # assert
+    assert 'X-Settings-Stale-Age' not in resp.headers
+    assert resp_stale.status_code == 200
+    assert resp_stale.headers['X-Settings-Stale-Age'] == '0'
+    assert resp_stale.headers['ETag'] == resp.headers['ETag']
+    assert resp_stale.json() == resp.json()
+
+
+async def test_get_service_settings__small_body__return_uncompressed_body(
+    async_client: AsyncClient, db_conn: SAConnection, setting_data
+):
+    # arrange
+    await create_setting(db_conn, setting_data)
+    url = f'/get_settings/{setting_data["service_name"]}'
+
+    # act
+    resp = await async_client.get(url, headers={'Accept-Encoding': 'gzip'})
+
+    # assert
+    assert resp.status_code == 200
+    assert 'Content-Encoding' not in resp.headers
+    assert resp.json()[0]['name'] == setting_data['name']
+
+
+async def test_search_settings__client_accepts_gzip__return_compressed_body(
+    async_client: AsyncClient, db_conn: SAConnection, setting_data
+):
+    # arrange
+    for i in range(20):
+        await create_setting(db_conn, {**setting_data, 'name': f'setting_{i}'})
+    url = '/setting/search'
+
+    # act
+    resp_gzip = await async_client.get(url, headers={'Accept-Encoding': 'gzip'})
+    resp_identity = await async_client.get(url, headers={'Accept-Encoding': 'identity'})
+
+    # assert
+    assert resp_gzip.headers['Content-Encoding'] == 'gzip'
+    assert resp_gzip.headers['Vary'] == 'Accept-Encoding'
+    assert 'Content-Encoding' not in resp_identity.headers
+    assert resp_gzip.json() == resp_identity.json()
+
+
+async def test_get_service_settings__settings_changed_bypassing_api__return_cached_settings(
+    async_client: AsyncClient, db_conn: SAConnection, setting_data
+):
+    # arrange
+    created = await create_setting(db_conn, setting_data)
+    url = f'/get_settings/{setting_data["service_name"]}'
+    await async_client.get(url)
+    await db_conn.execute(update(Setting).where(Setting.id == created['id']).values(value='99'))
+
+    # act
+    resp = await async_client.get(url)
+    resp_data = resp.json()
+
+    # assert
+    assert resp_data[0]['value'] == setting_data['value']
+    stats = (await async_client.get('/stats/settings-cache')).json()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 1
+
+
+async def test_get_service_settings__setting_changed_through_api__cache_invalidated(
+    async_client: AsyncClient, db_conn: SAConnection, setting_data
+):
+    # arrange
+    created = await create_setting(db_conn, setting_data)
+    url = f'/get_settings/{setting_data["service_name"]}'
+    await async_client.get(url)
+
+    # act
+    await async_client.post('/setting/edit', json={'id': created['id'], 'value': '99'})
+    resp_after_edit = await async_client.get(url)
+    await async_client.get(f'/setting/delete/{created["id"]}')
+    resp_after_delete = await async_client.get(url)
+
+    # assert
+    assert resp_after_edit.json()[0]['value'] == '99'
+    assert resp_after_delete.json() == []
+
+
+async def test_get_service_settings__etag_matches__return_304(
+    async_client: AsyncClient, db_conn: SAConnection, setting_data
+):
+    # arrange
+    created = await create_setting(db_conn, setting_data)
+    url = f'/get_settings/{setting_data["service_name"]}'
+    etag = (await async_client.get(url)).headers['ETag']
+
+    # act
+    resp_not_modified = await async_client.get(url, headers={'If-None-Match': etag})
+    await async_client.post('/setting/edit', json={'id': created['id'], 'value': '99'})
+    resp_modified = await async_client.get(url, headers={'If-None-Match': etag})
+
+    # assert
+    assert resp_not_modified.status_code == 304
+    assert resp_not_modified.content == b''
+    assert resp_not_modified.headers['ETag'] == etag
+
+    assert resp_modified.status_code == 200
+    assert resp_modified.headers['ETag'] != etag
+    assert resp_modified.json()[0]['value'] == '99'
+
+
+async def test_get_service_settings__compressed__etag_of_encoding_returned(
+    async_client: AsyncClient, db_conn: SAConnection, setting_data
+):
+    # arrange
+    await create_setting(db_conn, {**setting_data, 'value': 'a' * 1000})
+    url = f'/get_settings/{setting_data["service_name"]}'
+    identity_etag = (await async_client.get(url, headers={'Accept-Encoding': 'identity'})).headers['ETag']
+
+    # act
+    resp = await async_client.get(url, headers={'Accept-Encoding': 'gzip'})
+    resp_not_modified = await async_client.get(
+        url, headers={'Accept-Encoding': 'gzip', 'If-None-Match': resp.headers['ETag']}
+    )
+
+    # assert
+    assert resp.headers['Content-Encoding'] == 'gzip'
+    assert resp.headers['ETag'] == identity_etag[:-1] + '-gzip"'
+    assert resp_not_modified.status_code == 304
+    assert resp_not_modified.headers['ETag'] == resp.headers['ETag']
+
+
+async def test_get_all_service_settings__etag_matches__return_304(
+    async_client: AsyncClient, db_conn: SAConnection, setting_data
+):
+    # arrange
+    await create_setting(db_conn, setting_data)
+    url = f'/setting/all/{setting_data["service_name"]}'
+    etag = (await async_client.get(url)).headers['ETag']
+
+    # act
+    resp = await async_client.get(url, headers={'If-None-Match': etag})
+    resp_other_page = await async_client.get(f'{url}?offset=1', headers={'If-None-Match': etag})
+
+    # assert
+    assert resp.status_code == 304
+    assert resp_other_page.status_code == 200
+
+
+async def test_wait_service_settings__client_version_is_outdated__return_settings_immediately(
+    async_client: AsyncClient, db_conn: SAConnection, setting_data
+):
+    # arrange
+    await create_setting(db_conn, setting_data)
+    url = f'/setting/wait/{setting_data["service_name"]}?version=outdated&timeout=60'
+
+    # act
+    resp = await asyncio.wait_for(async_client.get(url), timeout=5)
+
+    # assert
+    assert resp.status_code == 200
+    assert [i['name'] for i in resp.json()] == [setting_data['name']]
+    assert resp.headers['ETag']
+
+
+async def test_wait_service_settings__nothing_changed__return_304_after_timeout(
+    async_client: AsyncClient, db_conn: SAConnection, setting_data
+):
+    # arrange
+    await create_setting(db_conn, setting_data)
+    etag = (await async_client.get(f'/get_settings/{setting_data["service_name"]}')).headers['ETag']
+    version = etag.strip('"')
+    url = f'/setting/wait/{setting_data["service_name"]}?version={version}&timeout=0.1'
+
+    # act
+    resp = await asyncio.wait_for(async_client.get(url), timeout=5)
+
+    # assert
+    assert resp.status_code == 304
+    assert resp.headers['ETag'] == etag
+
+
+async def test_wait_service_settings__version_of_compressed_response__return_304_after_timeout(
+    async_client: AsyncClient, db_conn: SAConnection, setting_data
+):
+    # arrange
+    await create_setting(db_conn, setting_data)
+    etag = (await async_client.get(f'/get_settings/{setting_data["service_name"]}')).headers['ETag']
+    version = etag.strip('"') + '-gzip'
+    url = f'/setting/wait/{setting_data["service_name"]}?version={version}&timeout=0.1'
+
+    # act
+    resp = await asyncio.wait_for(async_client.get(url), timeout=5)
+
+    # assert
+    assert resp.status_code == 304
+
+
+async def test_wait_service_settings__setting_changed_while_waiting__return_new_settings(
+    async_client: AsyncClient, db_conn: SAConnection, setting_data
+):
+    # arrange
+    created = await create_setting(db_conn, setting_data)
+    service_name = setting_data['service_name']
+    etag = (await async_client.get(f'/get_settings/{service_name}')).headers['ETag']
+    version = etag.strip('"')
+    url = f'/setting/wait/{service_name}?version={version}&timeout=60'
+
+    # act
+    wait_task = asyncio.create_task(async_client.get(url))
+    await asyncio.sleep(0.1)
+    waiting = not wait_task.done()
+    await db_conn.execute(update(Setting).where(Setting.id == created['id']).values(value='99'))
+    on_setting_changed(service_name)
+    resp = await asyncio.wait_for(wait_task, timeout=5)
+
+    # assert
+    assert waiting
+    assert resp.status_code == 200
+    assert resp.json()[0]['value'] == '99'
+    assert resp.headers['ETag'] != etag
+
+
+async def test_get_service_settings_changes__transaction_in_progress__changes_returned_until_it_finishes(
+    async_client: AsyncClient, db_conn: SAConnection, setting_data
+):
+    # arrange
+    service_name = setting_data['service_name']
+    url = f'/setting/changes/{service_name}'
+    xid = await db_conn.scalar('SELECT pg_current_xact_id()::text::bigint')
+    updated = await create_setting(db_conn, {**setting_data, 'name': 'updated'})
+    deleted = await create_setting(db_conn, {**setting_data, 'name': 'deleted'})
+    renamed = await create_setting(db_conn, {**setting_data, 'name': 'renamed'})
+    await create_setting(db_conn, {**setting_data, 'name': 'unchanged'})
+    await create_setting(db_conn, {**setting_data, 'service_name': 'other-service'})
+    initial_resp_data = (await async_client.get(url)).json()
+
+    # act
+    await db_conn.execute(update(Setting).where(Setting.id == updated['id']).values(value='99'))
+    await db_conn.execute(delete(Setting).where(Setting.id == deleted['id']))
+    await db_conn.execute(update(Setting).where(Setting.id == renamed['id']).values(name='new_name'))
+    resp = await async_client.get(f'{url}?since={initial_resp_data["version"]}')
+    resp_data = resp.json()
+
+    later_changes_resp_data = (await async_client.get(f'{url}?since={xid + 1}')).json()
+
+    # assert
+    assert sorted(i['name'] for i in initial_resp_data['upserted']) == ['deleted', 'renamed', 'unchanged', 'updated']
+    assert initial_resp_data['deleted'] == []
+    assert initial_resp_data['version'] == xid
+
+    # the test transaction is still in progress, so its changes are returned again
+    assert resp.status_code == 200
+    assert resp_data['version'] == xid
+    assert sorted((i['name'], i['value']) for i in resp_data['upserted']) == [
+        ('new_name', '10'),
+        ('unchanged', '10'),
+        ('updated', '99'),
+    ]
+    assert sorted(resp_data['deleted']) == ['deleted', 'renamed']
+
+    assert later_changes_resp_data == {'version': xid, 'upserted': [], 'deleted': []}
+
+
+@pytest.mark.parametrize(
+    'exc',
+    [
+        DatabaseUnavailable('Timed out waiting for a free database connection'),
+        asyncio.TimeoutError(),
+        psycopg2.OperationalError('could not connect to server'),
+    ],
+)
+async def test_search_settings__database_unavailable__return_503(
+    mocker: MockerFixture, async_client: AsyncClient, exc
+):
+    # arrange
+    mocker.patch('runtime_config.web.views.db_repo.search_settings', side_effect=exc)
+
+    # act
+    resp = await async_client.get('/setting/search')
+
+    # assert
+    assert resp.status_code == 503
+    assert resp.headers['Retry-After'] == '1'
+    assert resp.json() == {'status': 'error', 'message': 'Database is temporarily unavailable'}
+
+
+async def test_get_pool_stats(async_client: AsyncClient, db_conn: SAConnection):
+    # act
+    resp = await async_client.get('/stats/db-pool')
+
+    # assert
+    assert resp.status_code == 200
+    assert resp.json() == {'min_size': 1, 'max_size': 10, 'size': 1, 'free': 0, 'used': 1}
+
+
+async def test_get_metrics(async_client: AsyncClient, db_conn: SAConnection):
+    # arrange
+    await async_client.get('/setting/search')
+
+    # act
+    resp = await async_client.get('/metrics')
+
+    # assert
+    assert resp.status_code == 200
+    assert resp.headers['Content-Type'].startswith('text/plain')
+    assert (
+        'runtime_config_http_request_duration_seconds_count{method="GET",route="/setting/search",status_code="200"}'
+        in (resp.text)
+    )
+    assert 'runtime_config_db_query_duration_seconds_count{function="search_settings"}' in resp.text
+
+
+async def test_get_conn_hold_time_stats(mocker: MockerFixture, async_client: AsyncClient):
+    # arrange
+    conn_hold_time_stats.clear()
+
+    # act
+    await async_client.get('/setting/search')
+    resp = await async_client.get('/stats/db-conn-hold-time')
+
+    # assert
+    assert resp.status_code == 200
+    assert resp.json() == {
+        '/setting/search': {
+            'requests': 1,
+            'connections': 0,
+            'total': 0,
+            'avg_per_request': 0,
+            'max_per_request': 0,
+        }
+    }
+
+
 async def test_health_check(async_client, db, setting_data):
     # act
     resp = await async_client.get('/health-check')